@@ -0,0 +1,62 @@
+import asyncio
+
+
+# Requires Python 3.5 for `async def`; nothing else in `lr` imports this.
+
+# Wraps a Runtime or CompiledRuntime (anything with feed_all and get) so it
+# can consume an async iterator of tokens. Tokens are fed in batches of
+# `batch_size`, and control is given back to the event loop after every
+# batch, so many sessions can share one loop and one automaton.
+#
+# Cancellation is only possible at an `await`, and a batch is always fed
+# as a whole, so a cancelled runtime is consistent: tokens that arrived but
+# were not fed yet are kept, and fed first by the next feed_async() or
+# flush().
+
+class AsyncRuntime:
+    __slots__ = ('_runtime', '_batch_size', '_pending')
+
+    def __init__(self, runtime, batch_size=256):
+        assert batch_size > 0
+        self._runtime = runtime
+        self._batch_size = batch_size
+        self._pending = []
+
+    def __repr__(self):
+        return '<AsyncRuntime with %d pending for %r>' % (len(self._pending), self._runtime)
+
+    def flush(self):
+        batch = self._pending[:]
+        del self._pending[:]
+        self._runtime.feed_all(batch)
+
+    async def _drain(self):
+        batch_size = self._batch_size
+        pending = self._pending
+        while len(pending) >= batch_size:
+            batch = pending[:batch_size]
+            del pending[:batch_size]
+            self._runtime.feed_all(batch)
+            await asyncio.sleep(0)
+
+    async def feed_async(self, toks):
+        self.flush()
+        batch_size = self._batch_size
+        async for tok in toks:
+            self._pending.append(tok)
+            if len(self._pending) >= batch_size:
+                await self._drain()
+        self.flush()
+
+    async def feed_batches_async(self, batches):
+        # Like feed_async, for sources that already produce lists of tokens.
+        # Large batches are still split, so the loop is never held too long.
+        self.flush()
+        async for batch in batches:
+            self._pending.extend(batch)
+            await self._drain()
+        self.flush()
+
+    def get(self):
+        assert not self._pending
+        return self._runtime.get()
@@ -1,8 +1,9 @@
 from abc import ABCMeta, abstractmethod
+from array import array
 import weakref
 
 from .error import LoweringError
-from .grammar import Grammar, RuleId, SymbolId
+from .grammar import Grammar, RuleId, SymbolId, _hold, _unpickle_id
 
 
 class BaseAction:
@@ -30,7 +31,8 @@ class Reduce(Action):
         return 'Reduce(<rule %d>)' % (self._rule._number)
 
 # The Python implementation uses dicts for actions.
-# There is no `Error` because it is represented by the key not being found.
+# There is no `Error` because it is represented by the key not being found
+# (and the state having no default reduction).
 # There is no `Accept` because (like in C) it is implicit after $eof shifts.
 
 class Goto(BaseAction):
@@ -43,6 +45,11 @@ class Goto(BaseAction):
         return 'Goto(<state %d>)' % (self._state._number)
 
 
+def _encode(act):
+    if isinstance(act, Shift):
+        return act._state._number
+    return -1 - act._rule._number
+
 class StateId:
     __slots__ = ('_number', '_info')
 
@@ -53,31 +60,75 @@ class StateId:
     def __repr__(self):
         return '<StateId for %r>' % (self._data(),)
 
+    def __reduce__(self):
+        return (_unpickle_id, (self._info(), self._number))
+
     def _data(self):
         return self._info()._data[self._number]
 
 class StateData:
-    __slots__ = ('_id', '_actions', '_gotos', '_creator')
+    __slots__ = ('_id', '_actions', '_default', '_gotos', '_conflicts', '_creator')
 
     def __init__(self, id, creator):
         self._id = id
         self._actions = {}
+        # A Reduce used for any terminal not in _actions, or None.
+        self._default = None
         self._gotos = {}
+        # Only with keep_conflicts: terminal -> list of Shift/Reduce, for
+        # terminals that are not in _actions because they have several.
+        self._conflicts = {}
         self._creator = creator
 
     def __repr__(self):
         return '<StateData #%d with %d actions, %d gotos\n  %r>' % (self._id._number, len(self._actions), len(self._gotos), self._creator)
 
 class Automaton:
-    __slots__ = ('_data', '_grammar', '__weakref__')
+    __slots__ = ('_data', '_grammar', '_expected', '__weakref__')
 
     def __init__(self, grammar):
         self._data = []
         self._grammar = grammar
+        self._expected = None
 
     def __repr__(self):
         return '<Automaton with %d states>' % (len(self._data))
 
+    def __reduce__(self):
+        # The states as one array of numbers, each as:
+        #   default rule (or -1), then
+        #   count, then (symbol, action) per action, then
+        #   count, then (symbol, state) per goto, then
+        #   count, then (symbol, count, action...) per conflict
+        # where an action is a state to shift to, or -1 - a rule to reduce.
+        # The frontend's item sets are reduced to their kernels, as a count
+        # then (rule, index) per item, and come back as lr0.ItemSets: enough
+        # for reprs, the final state check and lr.repair, but without any
+        # lookaheads.
+        table = array('i')
+        kernels = array('i')
+        for state in self._data:
+            table.append(-1 if state._default is None else state._default._rule._number)
+            table.append(len(state._actions))
+            for sym, act in state._actions.items():
+                table.append(sym._number)
+                table.append(_encode(act))
+            table.append(len(state._gotos))
+            for sym, goto in state._gotos.items():
+                table.append(sym._number)
+                table.append(goto._state._number)
+            table.append(len(state._conflicts))
+            for sym, acts in state._conflicts.items():
+                table.append(sym._number)
+                table.append(len(acts))
+                table.extend([_encode(act) for act in acts])
+            items = [it for it in getattr(state._creator, '_items', []) if it._index or not it._rule._number]
+            kernels.append(len(items))
+            for it in items:
+                kernels.append(it._rule._number)
+                kernels.append(it._index)
+        return (_unpickle_automaton, (self._grammar, table, kernels))
+
     def add_state(self, creator):
         i = len(self._data)
         rv = StateData(StateId(i, self), creator)
@@ -87,6 +138,78 @@ class Automaton:
     def get_state0(self):
         return self._data[0]._id
 
+    def save(self, path):
+        # See lr.binary: what is saved (and loaded) is a PackedAutomaton.
+        from . import binary
+        binary.save(self, path)
+
+    @staticmethod
+    def load(path):
+        from . import binary
+        return binary.load(path)
+
+    def expected_bits(self):
+        # Per state, an int with bit t set if terminal t has an action
+        # there (or several, with keep_conflicts). A state with a default
+        # reduction has none; see Runtime.expected_bits.
+        if self._expected is None:
+            rv = []
+            for state in self._data:
+                bits = 0
+                for sym in state._actions:
+                    bits |= 1 << sym._number
+                for sym in state._conflicts:
+                    bits |= 1 << sym._number
+                rv.append(bits)
+            self._expected = rv
+        return self._expected
+
+def _unpickle_automaton(grammar, table, kernels):
+    from .lr0 import Item, ItemSet
+    self = Automaton(grammar)
+    rule_ids = [r._id for r in grammar._data]
+    it = iter(kernels)
+    for n in it:
+        if n:
+            ItemSet([Item(rule_ids[next(it)], next(it)) for i in range(n)], self)
+        else:
+            self.add_state(None)
+    symbol_ids = [d._id for d in grammar._symbols._data]
+    state_ids = [d._id for d in self._data]
+
+    def decode(code):
+        if code >= 0:
+            return Shift(state_ids[code])
+        return Reduce(rule_ids[-1 - code])
+
+    def arrive(state, act):
+        creator = act._state._data()._creator
+        if creator is not None:
+            creator._prev_states.append(state._id)
+
+    it = iter(table)
+    for state in self._data:
+        default = next(it)
+        if default >= 0:
+            state._default = Reduce(rule_ids[default])
+        for i in range(next(it)):
+            sym = symbol_ids[next(it)]
+            state._actions[sym] = act = decode(next(it))
+            if isinstance(act, Shift):
+                arrive(state, act)
+        for i in range(next(it)):
+            sym = symbol_ids[next(it)]
+            state._gotos[sym] = act = Goto(state_ids[next(it)])
+            arrive(state, act)
+        for i in range(next(it)):
+            sym = symbol_ids[next(it)]
+            state._conflicts[sym] = acts = [decode(next(it)) for j in range(next(it))]
+            for act in acts:
+                if isinstance(act, Shift):
+                    arrive(state, act)
+    # Pickled StateIds (e.g. in a Runtime's stack) keep it alive.
+    return _hold(self)
+
 class AbstractItemSet(metaclass=ABCMeta):
     __slots__ = ('_state',)
 
@@ -103,6 +226,24 @@ class AbstractItemSet(metaclass=ABCMeta):
     def is_final_state(self):
         pass # pragma: no cover
 
+def use_default_reduction(state):
+    # Like bison's `lr.default-reductions consistent`: only a state whose
+    # every action is the same reduction gets a default. Such a state can
+    # only delay error detection by reductions, never by shifts.
+    actions = list(state._actions.values())
+    if not actions or not isinstance(actions[0], Reduce):
+        return
+    rule = actions[0]._rule
+    for act in actions:
+        if not isinstance(act, Reduce) or act._rule is not rule:
+            return
+    state._default = actions[0]
+    state._actions = {}
+
+def store_conflicts(conflicts):
+    for its, symco in conflicts.items():
+        its._state._conflicts = symco
+
 def raise_conflicts(conflicts):
     if not conflicts:
         return
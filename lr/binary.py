@@ -0,0 +1,224 @@
+from array import array
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+from .grammar import SymbolsInfo, Grammar
+from .packed import PackedAutomaton
+from .error import FormatError
+
+
+# A file format for PackedAutomaton, meant to be memory-mapped:
+#
+#   header: magic, format version, flags, CRC-32 of the whole file (with
+#       this field as 0), and the number of sections
+#   directory: (offset, size in bytes) per section
+#   sections: little-endian int32 arrays, each aligned to 8 bytes, except
+#       for the names, which are UTF-8 joined by NUL
+#
+# load() checks the header and the checksum, then wraps each table section
+# in a read-only memoryview of the mapping, so nothing is copied and every
+# process that loads the same file shares its pages. The names and the
+# Grammar they make are only built when first needed (for reprs, errors
+# or Nonterminals), by a MappedAutomaton.
+#
+# What is saved is the PackedAutomaton, not the Automaton's StateData
+# graph: loading gives something to run a PackedRuntime on. Conflicts are
+# not saved, as for PackedAutomaton.
+
+_MAGIC = b'LRpk'
+_VERSION = 2
+_header = struct.Struct('<4sIIII')
+_entry = struct.Struct('<QQ')
+_FLAG_COMB = 1
+
+# Sections, in order.
+_META = 0 # num_terminals, num_states, final_state
+_NAMES = 1
+_RULE_RHS = 2 # per rule: the lhs number, then the rhs numbers
+_RULE_RHS_END = 3 # per rule: the end of its entry in _RULE_RHS
+_RULE_UNIT = 4
+_TABLES = 5 # the tables below, in this order
+_table_names = ['_action_default', '_action_base', '_action_table', '_action_check',
+        '_goto_default', '_goto_base', '_goto_table', '_goto_check']
+# The dense layout saves the two defaults, then the rows end to end.
+_NUM_DENSE = 4
+
+def _crc(header, payload):
+    magic, version, flags, crc, num_sections = header
+    return zlib.crc32(payload, zlib.crc32(_header.pack(magic, version, flags, 0, num_sections)))
+
+def _ints(values):
+    rv = array('i', values)
+    if sys.byteorder != 'little':
+        rv.byteswap() # pragma: no cover
+    return rv.tobytes()
+
+def save(automaton, path):
+    # `automaton` is an Automaton, a CompiledAutomaton or a PackedAutomaton.
+    if not isinstance(automaton, PackedAutomaton):
+        automaton = PackedAutomaton(automaton)
+    packed = automaton
+    grammar = packed._grammar
+    comb = packed._layout == 'comb'
+
+    rhs = []
+    rhs_end = []
+    for r in grammar._data:
+        rhs.append(r._lhs._number)
+        rhs.extend([s._number for s in r._rhs])
+        rhs_end.append(len(rhs))
+    sections = [
+            _ints([packed._num_terminals, packed._num_states, packed._final_state]),
+            '\0'.join([d._name for d in grammar._symbols._data]).encode('utf-8'),
+            _ints(rhs),
+            _ints(rhs_end),
+            _ints(packed._rule_unit),
+    ]
+    if comb:
+        sections.extend([_ints(getattr(packed, name)) for name in _table_names])
+    else:
+        sections.append(_ints(packed._action_default))
+        sections.append(_ints(packed._goto_default))
+        sections.append(_ints([c for row in packed._action for c in row]))
+        sections.append(_ints([c for row in packed._goto for c in row]))
+
+    offset = _header.size + _entry.size * len(sections)
+    directory = []
+    body = []
+    for data in sections:
+        pad = -offset % 8
+        body.append(b'\0' * pad)
+        offset += pad
+        directory.append(_entry.pack(offset, len(data)))
+        body.append(data)
+        offset += len(data)
+    payload = b''.join(directory + body)
+    flags = _FLAG_COMB if comb else 0
+    crc = _crc((_MAGIC, _VERSION, flags, 0, len(sections)), payload)
+    header = _header.pack(_MAGIC, _VERSION, flags, crc, len(sections))
+
+    # Write to a temporary name first, so a reader never maps a partial
+    # file, and concurrent writers of the same path each replace it whole.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def load(path, verify=True):
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise FormatError('empty: %r' % path) from None
+    view = memoryview(mapped)
+    if len(view) < _header.size:
+        raise FormatError('truncated: %r' % path)
+    header = _header.unpack_from(view)
+    magic, version, flags, crc, num_sections = header
+    if magic != _MAGIC:
+        raise FormatError('magic: %r' % path)
+    if version != _VERSION:
+        raise FormatError('version %d: %r' % (version, path))
+    if verify and _crc(header, view[_header.size:]) != crc:
+        raise FormatError('checksum: %r' % path)
+    # Without the checksum, at least keep MappedAutomaton to what it can
+    # unpack.
+    if flags & ~_FLAG_COMB:
+        raise FormatError('flags %#x: %r' % (flags, path))
+    if num_sections != _TABLES + (len(_table_names) if flags & _FLAG_COMB else _NUM_DENSE):
+        raise FormatError('%d sections: %r' % (num_sections, path))
+    if len(view) < _header.size + num_sections * _entry.size:
+        raise FormatError('truncated: %r' % path)
+
+    sections = []
+    for i in range(num_sections):
+        offset, size = _entry.unpack_from(view, _header.size + i * _entry.size)
+        if offset + size > len(view):
+            raise FormatError('truncated: %r' % path)
+        if i != _NAMES and size % 4:
+            raise FormatError('section %d: %r' % (i, path))
+        data = view[offset:offset + size]
+        if i != _NAMES:
+            if sys.byteorder == 'little':
+                data = data.cast('i')
+            else: # pragma: no cover
+                data = array('i', data)
+                data.byteswap()
+        sections.append(data)
+    return MappedAutomaton(sections, flags & _FLAG_COMB)
+
+class MappedAutomaton(PackedAutomaton):
+    # `_grammar`, `_rule_ids` and `_rule_syms` are properties here, built
+    # from the names and rule sections on first use.
+    __slots__ = ('_sections', '_lazy')
+
+    def __init__(self, sections, comb):
+        self._sections = sections
+        self._lazy = None
+        self._num_terminals, self._num_states, self._final_state = sections[_META]
+        rhs = sections[_RULE_RHS]
+        self._rule_lhs = []
+        self._rule_len = []
+        start = 0
+        for end in sections[_RULE_RHS_END]:
+            self._rule_lhs.append(rhs[start] - self._num_terminals)
+            self._rule_len.append(end - start - 1)
+            start = end
+        self._rule_unit = sections[_RULE_UNIT]
+        tables = sections[_TABLES:]
+        if comb:
+            self._layout = 'comb'
+            self._action = self._goto = None
+            for name, data in zip(_table_names, tables):
+                setattr(self, name, data)
+        else:
+            self._layout = 'dense'
+            self._action_default, self._goto_default, action, goto = tables
+            num_states = self._num_states
+            width = self._num_terminals
+            self._action = [action[i * width:(i + 1) * width] for i in range(num_states)]
+            width = len(self._goto_default)
+            self._goto = [goto[i * width:(i + 1) * width] for i in range(num_states)]
+            self._action_base = self._action_table = self._action_check = None
+            self._goto_base = self._goto_table = self._goto_check = None
+
+    def _bind(self, grammar):
+        # Use an identically numbered Grammar (e.g. the one this was
+        # built from) instead of rebuilding one from the names.
+        self._lazy = (grammar, [r._id for r in grammar._data], [r._lhs for r in grammar._data])
+
+    def _names(self):
+        if self._lazy is None:
+            sections = self._sections
+            names = bytes(sections[_NAMES]).decode('utf-8').split('\0')
+            symbols = SymbolsInfo._rebuild(names, self._num_terminals)
+            rhs = sections[_RULE_RHS]
+            rules = []
+            start = 0
+            for end in sections[_RULE_RHS_END]:
+                rules.append((rhs[start], list(rhs[start + 1:end])))
+                start = end
+            grammar = Grammar._rebuild(symbols, rules)
+            self._lazy = (grammar, [r._id for r in grammar._data], [r._lhs for r in grammar._data])
+        return self._lazy
+
+    @property
+    def _grammar(self):
+        return self._names()[0]
+
+    @property
+    def _rule_ids(self):
+        return self._names()[1]
+
+    @property
+    def _rule_syms(self):
+        return self._names()[2]
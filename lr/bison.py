@@ -101,10 +101,13 @@ def run_bison(grammar, lr_type):
         sym_bison = sym._bison()
         if '\'' in sym_bison or '"' in sym_bison:
             continue
+        if sym._name == 'error':
+            # predefined
+            continue
         p('%token ', sym_bison)
     p('%start ', grammar._data[0]._rhs[0]._data()._bison())
     p('%define lr.type ', lr_type)
-    p('%define lr.default-reductions accepting')
+    p('%define lr.default-reductions consistent')
     p('%%')
     for rule in grammar._data[1:]:
         p(rule._bison())
@@ -128,7 +131,7 @@ def make_symbol_map(grammar, bison_xml_report):
         name = t.name
         if name == '$end':
             name = '$eof'
-        if name == 'error':
+        if name == 'error' and name not in grammar._symbols._numbers:
             continue
         symbol_map[t.name] = grammar._symbols.get(name, True)
     for nt in bison_xml_report.grammar.nonterminals:
@@ -176,9 +179,7 @@ def compute_automaton(grammar, lr_type):
                 continue # pragma: no cover
             rule_id = grammar._data[reduction.rule]._id
             if reduction.symbol == '$default':
-                for key in grammar.all_terminals():
-                    if key not in actions:
-                        actions[key] = Reduce(rule_id)
+                state_map[state.number]._state._default = Reduce(rule_id)
                 continue
             key = symbol_map[reduction.symbol]
             actions[key] = Reduce(rule_id)
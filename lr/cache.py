@@ -0,0 +1,246 @@
+import collections
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+
+from . import binary, fallback, lr0, slr
+from .compiled import CompiledAutomaton
+from .error import FormatError
+from .packed import PackedAutomaton
+
+
+# Caching of computed automata, keyed by fingerprint(grammar, algorithm).
+#
+# The fingerprint is a SHA-256 of the grammar's structure: the symbol names
+# in order (terminals first), and every rule as numbers, including rule 0,
+# which names the start symbol. Two grammars with the same fingerprint
+# number everything the same way, so tables computed for one work for the
+# other. The algorithm's name is part of the key, and for bison so is its
+# `--version`, as is the binary format version.
+#
+# DiskCache keeps lr.binary files named by fingerprint in a directory. A
+# hit maps the file (see binary.load) and binds it to the caller's grammar,
+# so the names are never decoded. Files are written atomically, so
+# concurrent writers at worst compute the same tables twice; a file that
+# fails to load (truncated, corrupt, or from another format version) is
+# deleted and recomputed. Past `max_bytes`, the least recently used files
+# are deleted (a hit updates the file's mtime).
+#
+# MemoryCache keeps CompiledAutomatons in this process, least recently used
+# first out once there are more than `max_entries` of them or their tables
+# take more than about `max_bytes`. A hit returns a copy sharing the cached
+# tables but bound to the caller's grammar. Only one thread builds a given
+# key at a time: the others wait for it and share its result (or error).
+
+def _bison(lr_type):
+    # lr.bison needs lxml, so it is only imported when used.
+    def compute(grammar): # pragma: no cover
+        from . import bison
+        return bison.compute_automaton(grammar, lr_type)
+    return compute
+
+# key: algorithm name, value: function from Grammar to Automaton
+algorithms = {
+        'lr0': lr0.compute_automaton,
+        'slr': slr.compute_automaton,
+        'fallback': fallback.compute_automaton,
+        'lalr': _bison('lalr'),
+        'ielr': _bison('ielr'),
+        'canonical-lr': _bison('canonical-lr'),
+}
+
+_bison_version = None
+
+def _algorithm_version(algorithm):
+    global _bison_version
+    if algorithm not in ('lalr', 'ielr', 'canonical-lr'):
+        return ''
+    if _bison_version is None: # pragma: no cover
+        from . import bison
+        _bison_version = subprocess.check_output([bison.BISON, '--version']).decode('utf-8').split('\n')[0]
+    return _bison_version
+
+def fingerprint(grammar, algorithm):
+    if algorithm not in algorithms:
+        raise KeyError(algorithm)
+    symbols = grammar._symbols
+    parts = [
+            'lr.cache', binary._VERSION, algorithm, _algorithm_version(algorithm),
+            symbols._num_terminals, [d._name for d in symbols._data],
+            [(r._lhs._number, [s._number for s in r._rhs]) for r in grammar._data],
+    ]
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+class DiskCache:
+    __slots__ = ('_directory', '_max_bytes', '_hits', '_misses')
+
+    def __init__(self, directory, max_bytes=64 << 20):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+
+    def __repr__(self):
+        return '<DiskCache at %r with %d hits, %d misses>' % (self._directory, self._hits, self._misses)
+
+    def _path(self, key):
+        return os.path.join(self._directory, key + '.lr')
+
+    def compute_automaton(self, grammar, algorithm='fallback'):
+        # Return a PackedAutomaton for `grammar`: on a hit, a
+        # binary.MappedAutomaton; on a miss, the one just saved.
+        path = self._path(fingerprint(grammar, algorithm))
+        try:
+            rv = binary.load(path)
+        except FileNotFoundError:
+            pass
+        except (FormatError, OSError):
+            self._remove(path)
+        else:
+            self._hits += 1
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            rv._bind(grammar)
+            return rv
+
+        self._misses += 1
+        rv = PackedAutomaton(algorithms[algorithm](grammar))
+        binary.save(rv, path)
+        self._evict(keep=path)
+        return rv
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            # Already gone, or (on Windows) still mapped by someone.
+            pass
+
+    def _entries(self):
+        # (mtime, size, path) for each file, oldest first.
+        rv = []
+        for name in os.listdir(self._directory):
+            if not name.endswith('.lr'):
+                continue
+            path = os.path.join(self._directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            rv.append((st.st_mtime, st.st_size, path))
+        rv.sort()
+        return rv
+
+    def _evict(self, keep):
+        entries = self._entries()
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self._max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for mtime, size, path in self._entries():
+            self._remove(path)
+
+def _nbytes(compiled):
+    # Roughly what the tables cost; the ints themselves are mostly shared.
+    rv = 0
+    for rows in (compiled._action, compiled._goto):
+        rv += sys.getsizeof(rows)
+        for row in rows:
+            rv += sys.getsizeof(row)
+    return rv
+
+class _Flight:
+    __slots__ = ('_done', '_result', '_error')
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+class MemoryCache:
+    __slots__ = ('_max_entries', '_max_bytes', '_lock', '_entries', '_nbytes', '_flights', '_hits', '_misses', '_waits', '_evictions')
+
+    def __init__(self, max_entries=64, max_bytes=None):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key: (fingerprint, unit_bypass), value: (CompiledAutomaton, nbytes)
+        self._entries = collections.OrderedDict()
+        self._nbytes = 0
+        # key: as above, value: _Flight of the thread building it
+        self._flights = {}
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._evictions = 0
+
+    def __repr__(self):
+        return '<MemoryCache with %d entries, %d bytes, %d hits, %d misses>' % (len(self._entries), self._nbytes, self._hits, self._misses)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def compute_automaton(self, grammar, algorithm='fallback', unit_bypass=False):
+        key = (fingerprint(grammar, algorithm), unit_bypass)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]._rebound(grammar)
+            flight = self._flights.get(key)
+            building = flight is None
+            if building:
+                self._misses += 1
+                flight = self._flights[key] = _Flight()
+            else:
+                self._waits += 1
+
+        if not building:
+            flight._done.wait()
+            if flight._error is not None:
+                raise flight._error
+            return flight._result._rebound(grammar)
+
+        try:
+            rv = CompiledAutomaton(algorithms[algorithm](grammar), unit_bypass)
+        except BaseException as e:
+            flight._error = e
+            raise
+        else:
+            flight._result = rv
+            self._insert(key, rv)
+            return rv
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight._done.set()
+
+    def _insert(self, key, compiled):
+        nbytes = _nbytes(compiled)
+        with self._lock:
+            entries = self._entries
+            entries[key] = (compiled, nbytes)
+            self._nbytes += nbytes
+            # The newest entry stays, even if it alone is over max_bytes.
+            while len(entries) > 1 and (len(entries) > self._max_entries or
+                    (self._max_bytes is not None and self._nbytes > self._max_bytes)):
+                old_key, (old, old_nbytes) = entries.popitem(last=False)
+                self._nbytes -= old_nbytes
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
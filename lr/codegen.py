@@ -0,0 +1,173 @@
+from .compiled import CompiledAutomaton
+
+
+# Generate a standalone Python module that parses like CompiledRuntime,
+# but needs no import of lr at all: the tables are tuple literals, each
+# rule's goto row is already picked out by its lhs, and the parse loop
+# builds its own Terminal and Nonterminal (with the same reprs as lr's).
+#
+# The generated parse(tokens, actions=None) takes (terminal number, text)
+# pairs, ending with $eof (terminal 0); TERMINALS maps names (unquoted,
+# as in SymbolsInfo, e.g. '+') to numbers. `actions` maps rule numbers to
+# callables, as for Runtime. Errors raise the module's own ParseError,
+# with the same message as InputError. Conflicts are errors, as in the
+# CompiledRuntime tables, but are still listed as expected (EXPECTED);
+# unit bypass is not supported.
+#
+# The parse loop is the same table loop as CompiledRuntime, and runs at
+# about the same speed (slower than the flat runtime or unit bypass); what
+# it adds is a parser that can be shipped without lr.
+
+_template = '''\
+# Generated by lr.codegen; do not edit.
+#
+%(rule_comments)s
+
+# key: terminal name, value: terminal number
+TERMINALS = %(terminals)r
+SYMBOL_NAMES = %(names)r
+
+# per nonterminal: per state, the goto state (0 for none)
+GOTO = (
+%(goto)s
+)
+
+# per rule: (lhs name, alt number, rhs length, goto row of the lhs)
+RULES = (
+%(rules)s
+)
+
+# per state: per terminal, shift (+state), reduce (-rule) or error (0)
+ACTION = (
+%(action)s
+)
+
+# per state: the terminals with an action, conflicts included
+EXPECTED = (
+%(expected)s
+)
+
+FINAL_STATE = %(final_state)d
+
+
+class Terminal:
+    __slots__ = ('_sym', '_text')
+
+    def __init__(self, sym, text):
+        self._sym = sym
+        self._text = text
+
+    def __repr__(self):
+        sym = SYMBOL_NAMES[self._sym]
+        text = self._text
+        if sym == text or not text:
+            return repr(sym)
+        return '%%s(%%r)' %% (sym, text)
+
+class Nonterminal:
+    __slots__ = ('_rule', '_children')
+
+    def __init__(self, rule, children):
+        self._rule = rule
+        self._children = children
+
+    def __repr__(self):
+        if len(self._children) == 1:
+            return '.%%r' %% (self._children[0],)
+        lhs, alt = RULES[self._rule][:2]
+        children = ', '.join([repr(child) for child in self._children])
+        return '%%s%%d(%%s)' %% (lhs, alt, children)
+
+class ParseError(Exception):
+    def __init__(self, bad_key, good_keys):
+        self._bad_key = bad_key
+        self._good_keys = good_keys
+        super().__init__('got %%s; expected one of %%s' %% (bad_key, ', '.join(good_keys)))
+
+    def __reduce__(self):
+        return (ParseError, (self._bad_key, self._good_keys))
+
+def _error(state, term):
+    good_keys = [SYMBOL_NAMES[t] for t in EXPECTED[state]]
+    return ParseError(SYMBOL_NAMES[term], good_keys)
+
+def parse(tokens, actions=None):
+    fns = [None] * len(RULES)
+    for rule, fn in (actions or {}).items():
+        fns[rule] = fn
+    action = ACTION
+    rules = RULES
+    state_stack = [0]
+    value_stack = []
+    state = 0
+
+    for term, text in tokens:
+        while True:
+            code = action[state][term]
+            if code > 0:
+                value_stack.append(Terminal(term, text))
+                state_stack.append(code)
+                state = code
+                break
+            if not code:
+                raise _error(state, term)
+            rule = -code
+            lhs, alt, rule_len, goto_row = rules[rule]
+            fn = fns[rule]
+            if rule_len == 1:
+                # The common case, replacing the top in place.
+                if fn is None:
+                    value_stack[-1] = Nonterminal(rule, [value_stack[-1]])
+                else:
+                    value_stack[-1] = fn(value_stack[-1])
+                state = goto_row[state_stack[-2]]
+                state_stack[-1] = state
+                continue
+            if fn is None:
+                value_stack[-rule_len:] = (Nonterminal(rule, value_stack[-rule_len:]),)
+            else:
+                value_stack[-rule_len:] = (fn(*value_stack[-rule_len:]),)
+            del state_stack[-rule_len:]
+            state = goto_row[state_stack[-1]]
+            state_stack.append(state)
+
+    if state != FINAL_STATE or len(state_stack) != 3:
+        raise _error(state, 0)
+    return value_stack[0]
+'''
+
+def _rows(rows):
+    return '\n'.join(['    %r,' % (tuple(row),) for row in rows])
+
+def generate(automaton):
+    # `automaton` is an Automaton or a CompiledAutomaton.
+    if not isinstance(automaton, CompiledAutomaton):
+        automaton = CompiledAutomaton(automaton)
+    compiled = automaton
+    assert not any(compiled._rule_unit), 'unit bypass'
+    assert all(compiled._rule_len), 'empty rule'
+    grammar = compiled._grammar
+    symbols = grammar._symbols
+    num_terminals = symbols._num_terminals
+    names = tuple([d._name for d in symbols._data])
+
+    terminals = {name: i for i, name in enumerate(names[:num_terminals])}
+
+    conflicts = compiled._conflicts
+    expected = [[t for t, code in enumerate(row) if code or (state, t) in conflicts] for state, row in enumerate(compiled._action)]
+
+    rules = []
+    for r in grammar._data:
+        lhs = r._lhs._number
+        rules.append('    (%r, %d, %d, GOTO[%d]),' % (names[lhs], r._alt_number, len(r._rhs), lhs - num_terminals))
+
+    return _template % {
+            'rule_comments': '\n'.join(['# %d: %s' % (r._id._number, r._grammar_repr()) for r in grammar._data]),
+            'terminals': terminals,
+            'names': names,
+            'goto': _rows(zip(*compiled._goto)),
+            'rules': '\n'.join(rules),
+            'action': _rows(compiled._action),
+            'expected': _rows(expected),
+            'final_state': compiled._final_state,
+    }
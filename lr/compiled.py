@@ -0,0 +1,331 @@
+from .automaton import Automaton, Shift, Reduce
+from .value import Terminal, Nonterminal
+from .error import GrammarError, InputError
+
+
+# Encoding of the action table, as in bison's yytable:
+#   positive: shift to that state (state 0 is never a shift target)
+#   negative: reduce by that rule (rule 0 is never reduced)
+#   zero: error
+# The goto table uses 0 for "no goto", since state 0 is never a goto target.
+
+# With `unit_bypass`, rules with a single rhs symbol are never given their
+# own Nonterminal; the child value stands in for the parent. A state whose
+# only action is a default unit reduction is folded out of the tables
+# entirely: every shift or goto into it jumps straight to where that
+# reduction would have led. Unit reductions that depend on the lookahead
+# remain, but only replace the top state in place.
+
+# Conflicts kept by the frontend are left as errors (0) in the action
+# table, so the deterministic runtimes reject them; `_conflicts` maps
+# (state, terminal) to the tuple of codes for lr.glr.
+
+def _encode(act):
+    if isinstance(act, Shift):
+        return act._state._number
+    if isinstance(act, Reduce):
+        # Rule 0 is never reduced; acceptance is implicit after $eof shifts.
+        return -act._rule._number
+    assert False, 'unknown subclass' # pragma: no cover
+
+class CompiledAutomaton:
+    __slots__ = ('_grammar', '_num_terminals', '_action', '_default', '_goto', '_rule_lhs', '_rule_len', '_rule_ids', '_rule_syms', '_rule_unit', '_conflicts', '_final_state', '_expected')
+
+    def __init__(self, automaton, unit_bypass=False):
+        grammar = automaton._grammar
+        symbols = grammar._symbols
+        num_terminals = symbols._num_terminals
+        num_nonterminals = len(symbols._data) - num_terminals
+
+        self._grammar = grammar
+        self._num_terminals = num_terminals
+        self._action = []
+        self._default = []
+        self._goto = []
+        self._conflicts = {}
+
+        for state in automaton._data:
+            default = 0
+            if state._default is not None:
+                default = -state._default._rule._number
+            # Default reductions are expanded back into the dense rows,
+            # since filling a cell is cheaper than testing for it.
+            action_row = [default] * num_terminals
+            goto_row = [0] * num_nonterminals
+            for sym, act in state._actions.items():
+                action_row[sym._number] = _encode(act)
+            for sym, goto in state._gotos.items():
+                goto_row[sym._number - num_terminals] = goto._state._number
+            for sym, acts in state._conflicts.items():
+                self._conflicts[state._id._number, sym._number] = tuple([_encode(act) for act in acts])
+            self._action.append(action_row)
+            self._default.append(default)
+            self._goto.append(goto_row)
+
+        self._init_rules(grammar)
+        self._rule_unit = [unit_bypass and len(r._rhs) == 1 for r in grammar._data]
+        if unit_bypass:
+            self._fold_units(automaton)
+
+        start_sym = grammar._data[0]._rhs[0]
+        penultimate = self._goto[0][start_sym._number - num_terminals]
+        self._final_state = self._action[penultimate][0]
+        self._init_expected()
+
+    def _init_rules(self, grammar):
+        num_terminals = self._num_terminals
+        self._rule_lhs = [r._lhs._number - num_terminals for r in grammar._data]
+        self._rule_len = [len(r._rhs) for r in grammar._data]
+        self._rule_ids = [r._id for r in grammar._data]
+        self._rule_syms = [r._lhs for r in grammar._data]
+
+    def _init_expected(self):
+        # As Automaton.expected_bits; a default reduction row has none.
+        self._expected = expected = []
+        for state, (action_row, default) in enumerate(zip(self._action, self._default)):
+            bits = 0
+            if not default:
+                for t, code in enumerate(action_row):
+                    if code:
+                        bits |= 1 << t
+            expected.append(bits)
+        for state, t in self._conflicts:
+            expected[state] |= 1 << t
+
+    def __reduce__(self):
+        # Only the Grammar (see lr.grammar) and integer tables are pickled,
+        # never the Automaton.
+        return (_rebuild_compiled, (self._grammar, self._action, self._default, self._goto, self._rule_unit, self._conflicts, self._final_state))
+
+    def _rebound(self, grammar):
+        # A copy sharing the tables, but using an identically numbered
+        # Grammar (see lr.cache.fingerprint) for Nonterminals and errors.
+        rv = CompiledAutomaton.__new__(CompiledAutomaton)
+        for name in CompiledAutomaton.__slots__:
+            setattr(rv, name, getattr(self, name))
+        rv._grammar = grammar
+        rv._init_rules(grammar)
+        return rv
+
+    def _fold_units(self, automaton):
+        num_terminals = self._num_terminals
+        # key: state number, value: nonterminal index of the unit rule's lhs
+        unit_states = {}
+        for state in automaton._data:
+            default = state._default
+            if default is None or state._actions:
+                continue
+            rule = default._rule._number
+            if self._rule_unit[rule]:
+                unit_states[state._id._number] = self._rule_lhs[rule]
+
+        def chase(p, q):
+            seen = set()
+            while q in unit_states:
+                assert q not in seen, 'unit cycle'
+                seen.add(q)
+                q = self._goto[p][unit_states[q]]
+            return q
+
+        for p, (action_row, goto_row) in enumerate(zip(self._action, self._goto)):
+            for i, code in enumerate(action_row):
+                if code > 0:
+                    action_row[i] = chase(p, code)
+            for i, q in enumerate(goto_row):
+                if q:
+                    goto_row[i] = chase(p, q)
+
+    def __repr__(self):
+        return '<CompiledAutomaton with %d states, %d terminals, %d rules>' % (len(self._action), self._num_terminals, len(self._rule_len))
+
+    def _input_error(self, state, term):
+        data = self._grammar._symbols._data
+        conflicts = self._conflicts
+        good_keys = [data[t]._name for t, code in enumerate(self._action[state]) if code or (state, t) in conflicts]
+        return InputError(data[term]._name, good_keys)
+
+# `actions` is as for Runtime. Unit rules skipped by unit_bypass can never
+# run an action, so asking for one is an error.
+
+def _rule_action_table(compiled, actions):
+    rv = [None] * len(compiled._rule_len)
+    for rule, fn in (actions or {}).items():
+        if compiled._rule_unit[rule]:
+            raise GrammarError('unit: %r' % compiled._rule_ids[rule])
+        rv[rule] = fn
+    return rv
+
+def _rebuild_compiled(grammar, action, default, goto, rule_unit, conflicts, final_state):
+    self = CompiledAutomaton.__new__(CompiledAutomaton)
+    self._grammar = grammar
+    self._num_terminals = grammar._symbols._num_terminals
+    self._action = action
+    self._default = default
+    self._goto = goto
+    self._init_rules(self._grammar)
+    self._rule_unit = rule_unit
+    self._conflicts = conflicts
+    self._final_state = final_state
+    self._init_expected()
+    return self
+
+class CompiledRuntime:
+    __slots__ = ('_compiled', '_rule_actions', '_state_stack', '_value_stack', '_error_term', '_error_status', '_errors')
+
+    def __init__(self, compiled, actions=None):
+        assert all(compiled._rule_len), 'empty rule'
+        self._compiled = compiled
+        self._rule_actions = _rule_action_table(compiled, actions)
+        self._state_stack = [0]
+        self._value_stack = []
+        self._error_term = compiled._grammar._symbols._numbers.get('error')
+        self._error_status = 0
+        self._errors = []
+
+    def __repr__(self):
+        return '<CompiledRuntime in state #%d/%d with %d values>' % (self._state_stack[-1], len(self._compiled._action), len(self._value_stack))
+
+    def feed_all(self, toks):
+        # Same as calling feed() for each token, with everything hoisted.
+        compiled = self._compiled
+        action = compiled._action
+        goto = compiled._goto
+        rule_lhs = compiled._rule_lhs
+        rule_lens = compiled._rule_len
+        rule_ids = compiled._rule_ids
+        rule_syms = compiled._rule_syms
+        rule_unit = compiled._rule_unit
+        rule_actions = self._rule_actions
+        state_stack = self._state_stack
+        value_stack = self._value_stack
+        error_status = self._error_status
+
+        for tok in toks:
+            term = tok._sym._number
+            while True:
+                code = action[state_stack[-1]][term]
+                if code > 0:
+                    value_stack.append(tok)
+                    state_stack.append(code)
+                    if error_status:
+                        error_status -= 1
+                        self._error_status = error_status
+                    break
+                if not code:
+                    self._recover(term, tok, compiled._input_error(state_stack[-1], term))
+                    error_status = self._error_status
+                    break
+                rule = -code
+                if rule_unit[rule]:
+                    state_stack[-1] = goto[state_stack[-2]][rule_lhs[rule]]
+                    continue
+                rule_len = rule_lens[rule]
+                fn = rule_actions[rule]
+                if fn is None:
+                    value_stack[-rule_len:] = (Nonterminal(rule_ids[rule], value_stack[-rule_len:], rule_syms[rule]),)
+                else:
+                    value_stack[-rule_len:] = (fn(*value_stack[-rule_len:]),)
+                del state_stack[-rule_len:]
+                state_stack.append(goto[state_stack[-1]][rule_lhs[rule]])
+
+    def feed(self, tok):
+        self.feed_number(tok._sym._number, tok)
+
+    def feed_number(self, term, value):
+        compiled = self._compiled
+        action = compiled._action
+        goto = compiled._goto
+        rule_lhs = compiled._rule_lhs
+        rule_lens = compiled._rule_len
+        rule_ids = compiled._rule_ids
+        rule_syms = compiled._rule_syms
+        rule_unit = compiled._rule_unit
+        rule_actions = self._rule_actions
+        state_stack = self._state_stack
+        value_stack = self._value_stack
+
+        while True:
+            code = action[state_stack[-1]][term]
+            if code > 0:
+                value_stack.append(value)
+                state_stack.append(code)
+                if self._error_status:
+                    self._error_status -= 1
+                return
+            if not code:
+                self._recover(term, value, compiled._input_error(state_stack[-1], term))
+                return
+            rule = -code
+            if rule_unit[rule]:
+                state_stack[-1] = goto[state_stack[-2]][rule_lhs[rule]]
+                continue
+            rule_len = rule_lens[rule]
+            fn = rule_actions[rule]
+            if fn is None:
+                value_stack[-rule_len:] = (Nonterminal(rule_ids[rule], value_stack[-rule_len:], rule_syms[rule]),)
+            else:
+                value_stack[-rule_len:] = (fn(*value_stack[-rule_len:]),)
+            del state_stack[-rule_len:]
+            state_stack.append(goto[state_stack[-1]][rule_lhs[rule]])
+
+    def expected_bits(self):
+        # As Runtime.expected_bits.
+        compiled = self._compiled
+        default = compiled._default
+        goto = compiled._goto
+        rule_lhs = compiled._rule_lhs
+        rule_lens = compiled._rule_len
+        state_stack = self._state_stack
+        depth = len(state_stack)
+        pushed = []
+        state = state_stack[-1]
+        final_state = compiled._final_state
+        while default[state] and state != final_state:
+            rule = -default[state]
+            rule_len = rule_lens[rule]
+            if rule_len <= len(pushed):
+                del pushed[len(pushed) - rule_len:]
+            else:
+                depth -= rule_len - len(pushed)
+                pushed = []
+            base = pushed[-1] if pushed else state_stack[depth - 1]
+            state = goto[base][rule_lhs[rule]]
+            pushed.append(state)
+        return compiled._expected[state]
+
+    def _recover(self, term, value, e):
+        # As Runtime._recover.
+        error_term = self._error_term
+        if error_term is None:
+            raise e
+        discard = False
+        if not self._error_status:
+            self._errors.append(e)
+        elif self._error_status == 3:
+            # `term` failed right after an `error` was shifted.
+            if term == 0:
+                raise e
+            discard = True
+        self._error_status = 3
+
+        action = self._compiled._action
+        state_stack = self._state_stack
+        value_stack = self._value_stack
+        while action[state_stack[-1]][error_term] <= 0:
+            if not value_stack:
+                raise e
+            state_stack.pop()
+            value_stack.pop()
+        value_stack.append(Terminal(self._compiled._grammar._symbols._data[error_term]._id, ''))
+        state_stack.append(action[state_stack[-1]][error_term])
+        if not discard:
+            self.feed_number(term, value)
+
+    def get_errors(self):
+        return self._errors
+
+    def get(self):
+        assert len(self._state_stack) == 3
+        assert self._state_stack[-1] == self._compiled._final_state
+        assert len(self._value_stack) == 2
+        return self._value_stack[0]
@@ -12,5 +12,30 @@ class LoweringError(LrParserException):
 
 class InputError(LrParserException):
     def __init__(self, bad_key, good_keys):
+        self._bad_key = bad_key
+        self._good_keys = good_keys
         msg = 'got %s; expected one of %s' % (bad_key, ', '.join(good_keys))
         super().__init__(msg)
+
+    def __reduce__(self):
+        # The default would call InputError(msg), which has the wrong arity.
+        return (InputError, (self._bad_key, self._good_keys))
+
+class AmbiguityError(LrParserException):
+    def __init__(self, num_parses):
+        self._num_parses = num_parses
+        super().__init__('%d parses' % num_parses)
+
+    def __reduce__(self):
+        return (AmbiguityError, (self._num_parses,))
+
+class LexError(LrParserException):
+    def __init__(self, pos):
+        self._pos = pos
+        super().__init__('no token at offset %d' % pos)
+
+    def __reduce__(self):
+        return (LexError, (self._pos,))
+
+class FormatError(LrParserException):
+    pass
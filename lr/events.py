@@ -0,0 +1,62 @@
+from .compiled import CompiledAutomaton
+
+
+SHIFT = 'shift'
+REDUCE = 'reduce'
+
+
+# Like CompiledRuntime, but instead of building values it reports
+# (SHIFT, tok) and (REDUCE, rule, length) events in order, and keeps only
+# the state stack. Memory is bounded by nesting depth, not input size.
+#
+# With a unit_bypass CompiledAutomaton, unit reductions are not reported.
+
+class EventRuntime:
+    __slots__ = ('_compiled', '_state_stack')
+
+    def __init__(self, compiled):
+        assert all(compiled._rule_len), 'empty rule'
+        self._compiled = compiled
+        self._state_stack = [0]
+
+    def __repr__(self):
+        return '<EventRuntime in state #%d/%d with depth %d>' % (self._state_stack[-1], len(self._compiled._action), len(self._state_stack) - 1)
+
+    def iter_events(self, toks):
+        compiled = self._compiled
+        action = compiled._action
+        goto = compiled._goto
+        rule_lhs = compiled._rule_lhs
+        rule_lens = compiled._rule_len
+        rule_ids = compiled._rule_ids
+        rule_unit = compiled._rule_unit
+        state_stack = self._state_stack
+
+        for tok in toks:
+            term = tok._sym._number
+            while True:
+                code = action[state_stack[-1]][term]
+                if code > 0:
+                    state_stack.append(code)
+                    yield SHIFT, tok
+                    break
+                if not code:
+                    raise compiled._input_error(state_stack[-1], term)
+                rule = -code
+                if rule_unit[rule]:
+                    state_stack[-1] = goto[state_stack[-2]][rule_lhs[rule]]
+                    continue
+                rule_len = rule_lens[rule]
+                del state_stack[-rule_len:]
+                state_stack.append(goto[state_stack[-1]][rule_lhs[rule]])
+                yield REDUCE, rule_ids[rule], rule_len
+
+    def feed_all(self, toks, sink):
+        for event in self.iter_events(toks):
+            sink(event)
+
+    def feed(self, tok, sink):
+        self.feed_all([tok], sink)
+
+    def accepted(self):
+        return len(self._state_stack) == 3 and self._state_stack[-1] == self._compiled._final_state
@@ -11,19 +11,29 @@ from . import lr0, slr, lalr, lr1
 
 # Fallback would be much more complicated if I did LL parsers too.
 
-def compute_automaton(grammar):
+# With `keep_conflicts`, a grammar that none of them can handle gets the
+# last one that tried and can keep conflicts, with its conflicts kept for
+# lr.glr.
+
+def compute_automaton(grammar, keep_conflicts=False):
+    # (function, whether it takes keep_conflicts)
     funcs = [
-            lr0.compute_automaton,
-            slr.compute_automaton,
-            lalr.compute_automaton,
-            lr1.compute_automaton,
+            (lr0.compute_automaton, True),
+            (slr.compute_automaton, True),
+            (lalr.compute_automaton, False),
+            (lr1.compute_automaton, False),
     ]
 
-    for fun in funcs:
+    conflicts_fun = None
+    for fun, can_keep_conflicts in funcs:
         try:
             return fun(grammar)
         except LrParserException as e:
             last_e = e
+            if can_keep_conflicts:
+                conflicts_fun = fun
         except NotImplementedError:
             pass
+    if keep_conflicts and conflicts_fun is not None:
+        return conflicts_fun(grammar, keep_conflicts=True)
     raise last_e
@@ -0,0 +1,223 @@
+from array import array
+
+from .compiled import CompiledAutomaton
+from .value import Terminal, Nonterminal
+
+
+# A parse tree as four parallel arrays with one entry per Nonterminal, in
+# postorder (so the root is last, and every node comes right after its
+# subtree):
+#   `_rules`: rule number
+#   `_sizes`: number of Nonterminals in the subtree, itself included
+#   `_starts`, `_ends`: the span of token indices it covers
+# Terminals get no entry at all; they are just `_tokens[i]`. That is 16
+# bytes per Nonterminal instead of an object plus a list; the buffers can
+# be handed to numpy.frombuffer() without copying.
+#
+# Children are found right to left: the last rhs symbol is either the last
+# token of the span or the Nonterminal just before, and so on. A
+# Nonterminal child that unit bypass replaced with a token is told apart by
+# not ending where the next child starts.
+#
+# FlatNode is a view of one entry, with the same `_rule`, `_sym`,
+# `_children` and repr as a Nonterminal; its Terminal children are the
+# original tokens. The tokens may also be a TokenArrays (see lr.tokens),
+# in which case a Terminal is only made when a child is looked at.
+
+class FlatTree:
+    __slots__ = ('_grammar', '_rules', '_sizes', '_starts', '_ends', '_tokens')
+
+    def __init__(self, grammar):
+        self._grammar = grammar
+        self._rules = array('i')
+        self._sizes = array('i')
+        self._starts = array('i')
+        self._ends = array('i')
+        self._tokens = []
+
+    def __repr__(self):
+        return '<FlatTree with %d nonterminals, %d tokens>' % (len(self._rules), len(self._tokens))
+
+    def _nbytes(self):
+        return sum(a.itemsize * len(a) for a in [self._rules, self._sizes, self._starts, self._ends])
+
+    def root(self):
+        # The tokens may or may not include $eof.
+        if self._rules and not self._starts[-1]:
+            return FlatNode(self, len(self._rules) - 1)
+        return self._tokens[0]
+
+    def _child_slots(self, i):
+        # Yield, right to left, a node index (>= 0) or ~token index (< 0).
+        grammar_data = self._grammar._data
+        num_terminals = self._grammar._symbols._num_terminals
+        sizes = self._sizes
+        ends = self._ends
+        tok = ends[i]
+        j = i - 1
+        for sym in reversed(grammar_data[self._rules[i]]._rhs):
+            if sym._number >= num_terminals and j >= 0 and ends[j] == tok and i - j < sizes[i]:
+                yield j
+                tok = self._starts[j]
+                j -= sizes[j]
+            else:
+                tok -= 1
+                yield ~tok
+
+    def to_tree(self):
+        # Children always come before their parent, so one forward pass
+        # builds every Nonterminal with no recursion.
+        grammar_data = self._grammar._data
+        tokens = self._tokens
+        values = []
+        for i, rule in enumerate(self._rules):
+            data = grammar_data[rule]
+            children = [values[s] if s >= 0 else tokens[~s] for s in self._child_slots(i)]
+            children.reverse()
+            values.append(Nonterminal(data._id, children, data._lhs))
+        if values and not self._starts[-1]:
+            return values[-1]
+        return tokens[0]
+
+    @staticmethod
+    def from_tree(grammar, value):
+        self = FlatTree(grammar)
+        rules = self._rules
+        sizes = self._sizes
+        starts = self._starts
+        ends = self._ends
+        tokens = self._tokens
+        # (value, first node, first token, next child)
+        stack = [(value, 0, 0, 0)]
+        while stack:
+            value, first_node, first_tok, k = stack.pop()
+            if isinstance(value, Terminal):
+                tokens.append(value)
+                continue
+            if k < len(value._children):
+                stack.append((value, first_node, first_tok, k + 1))
+                stack.append((value._children[k], len(rules), len(tokens), 0))
+                continue
+            rules.append(value._rule._number)
+            sizes.append(len(rules) - first_node)
+            starts.append(first_tok)
+            ends.append(len(tokens))
+        return self
+
+class FlatNode:
+    __slots__ = ('_tree', '_index')
+
+    def __init__(self, tree, index):
+        self._tree = tree
+        self._index = index
+
+    @property
+    def _rule(self):
+        return self._tree._grammar._data[self._tree._rules[self._index]]._id
+
+    @property
+    def _sym(self):
+        return self._tree._grammar._data[self._tree._rules[self._index]]._lhs
+
+    @property
+    def _children(self):
+        tree = self._tree
+        rv = [FlatNode(tree, s) if s >= 0 else tree._tokens[~s] for s in tree._child_slots(self._index)]
+        rv.reverse()
+        return rv
+
+    def _span(self):
+        return self._tree._starts[self._index], self._tree._ends[self._index]
+
+    def _source_span(self):
+        # Only if the tree's tokens are a TokenArrays.
+        tokens = self._tree._tokens
+        start, end = self._span()
+        return tokens._starts[start], tokens._ends[end - 1]
+
+    __repr__ = Nonterminal.__repr__
+
+class FlatRuntime:
+    __slots__ = ('_compiled', '_tree', '_state_stack', '_node_stack', '_tok_stack')
+
+    def __init__(self, compiled):
+        assert all(compiled._rule_len), 'empty rule'
+        self._compiled = compiled
+        self._tree = FlatTree(compiled._grammar)
+        self._state_stack = [0]
+        # For each value on the stack: its first node and first token.
+        self._node_stack = []
+        self._tok_stack = []
+
+    def __repr__(self):
+        return '<FlatRuntime in state #%d/%d with %d values>' % (self._state_stack[-1], len(self._compiled._action), len(self._node_stack))
+
+    def feed(self, tok):
+        self.feed_all([tok])
+
+    def feed_all(self, toks):
+        toks = list(toks)
+        self._feed_numbers([tok._sym._number for tok in toks], toks)
+
+    def feed_arrays(self, tokens):
+        # Like feed_all(tokens) for a TokenArrays, but the tree's tokens
+        # are `tokens` itself, and only its terminal numbers are read.
+        assert not self._tree._tokens
+        self._tree._tokens = tokens
+        self._feed_numbers(tokens._syms, None)
+
+    def _feed_numbers(self, terms, toks):
+        # Feed terminal numbers. If `toks` is not None, it is the Terminals
+        # for `terms`, and the ones shifted are added to the tree's tokens
+        # (all at once, at the end); otherwise the tokens are already there.
+        compiled = self._compiled
+        action = compiled._action
+        goto = compiled._goto
+        rule_lhs = compiled._rule_lhs
+        rule_lens = compiled._rule_len
+        rule_unit = compiled._rule_unit
+        state_stack = self._state_stack
+        node_stack = self._node_stack
+        tok_stack = self._tok_stack
+        tree = self._tree
+        rules = tree._rules
+        sizes = tree._sizes
+        starts = tree._starts
+        ends = tree._ends
+        tokens = tree._tokens
+        first = len(tokens) if toks is not None else 0
+
+        for i, term in enumerate(terms, first):
+            while True:
+                code = action[state_stack[-1]][term]
+                if code > 0:
+                    node_stack.append(len(rules))
+                    tok_stack.append(i)
+                    state_stack.append(code)
+                    break
+                if not code:
+                    if toks is not None:
+                        tokens.extend(toks[:i - first])
+                    raise compiled._input_error(state_stack[-1], term)
+                rule = -code
+                if rule_unit[rule]:
+                    state_stack[-1] = goto[state_stack[-2]][rule_lhs[rule]]
+                    continue
+                rule_len = rule_lens[rule]
+                first_node = node_stack[-rule_len]
+                rules.append(rule)
+                sizes.append(len(rules) - first_node)
+                starts.append(tok_stack[-rule_len])
+                ends.append(i)
+                if rule_len > 1:
+                    del node_stack[1 - rule_len:]
+                    del tok_stack[1 - rule_len:]
+                del state_stack[-rule_len:]
+                state_stack.append(goto[state_stack[-1]][rule_lhs[rule]])
+        if toks is not None:
+            tokens.extend(toks)
+
+    def get(self):
+        assert len(self._state_stack) == 3
+        assert self._state_stack[-1] == self._compiled._final_state
+        return self._tree
@@ -0,0 +1,223 @@
+from .compiled import CompiledAutomaton, _rule_action_table
+from .error import AmbiguityError, InputError
+from .value import Nonterminal
+
+
+# Generalized LR over a CompiledAutomaton whose frontend was run with
+# `keep_conflicts`. The stack is a graph: every node is a state plus a list
+# of (value, parent) links, and there is one head node per live state.
+#
+# While there is a single head and every link it reduces through is the
+# only one, this is the same loop as CompiledRuntime (with nodes in place of
+# the two lists). Only a conflict cell, or a reduction over a merged node,
+# drops into _step, which runs all heads in lockstep (Tomita, with Farshi's
+# fix: a link added to a node that was already processed gets its own
+# reductions). An empty rule reduces at the node itself, so a link can
+# join two nodes of the current token; a link added to a processed node
+# then gets the reductions of every processed node whose paths go through
+# it, not just its own. Cyclic grammars (with infinitely many parses of
+# some input) are not supported.
+#
+# Values are built for each path separately, so an ambiguous input gives
+# several complete values (and every dead branch runs its actions too).
+# With `merge`, two values for the same link (same node, same parent) are
+# instead packed: `merge(old, new)` must fold `new` into `old` in place,
+# since `old` may already be a child of other values. See lr.sppf.
+
+class _Node:
+    __slots__ = ('_state', '_links')
+
+    def __init__(self, state, links):
+        self._state = state
+        self._links = links
+
+def _paths(node, n, via=None, level=None):
+    # Yield (children, base) for every path of `n` links down from `node`;
+    # with `via` (a node of `level` and one of its links), only those that
+    # go through that link.
+    if not n:
+        if via is None:
+            yield [], node
+        return
+    links = node._links
+    if via is not None:
+        if node is via[0]:
+            links = [via[1]]
+        else:
+            # Only a link within the level can lead back up to via's node.
+            links = [l for l in links if level.get(l[1]._state) is l[1]]
+    for link in links:
+        value, parent = link
+        rest = via
+        if via is not None and link is via[1]:
+            rest = None
+        for children, base in _paths(parent, n - 1, rest, level):
+            children.append(value)
+            yield children, base
+
+class GlrRuntime:
+    __slots__ = ('_compiled', '_rule_actions', '_merge', '_heads')
+
+    def __init__(self, compiled, actions=None, merge=None):
+        # Unit bypass would need to replace states in shared nodes.
+        assert not any(compiled._rule_unit)
+        self._compiled = compiled
+        self._rule_actions = _rule_action_table(compiled, actions)
+        self._merge = merge
+        self._heads = [_Node(0, [])]
+
+    def __repr__(self):
+        return '<GlrRuntime in states %s>' % (', '.join(['#%d' % h._state for h in self._heads]),)
+
+    def feed(self, tok):
+        self.feed_all([tok])
+
+    def feed_all(self, toks):
+        compiled = self._compiled
+        action = compiled._action
+        goto = compiled._goto
+        rule_lhs = compiled._rule_lhs
+        rule_lens = compiled._rule_len
+        rule_ids = compiled._rule_ids
+        rule_syms = compiled._rule_syms
+        rule_actions = self._rule_actions
+
+        for tok in toks:
+            term = tok._sym._number
+            heads = self._heads
+            if len(heads) == 1:
+                node = heads[0]
+                while True:
+                    code = action[node._state][term]
+                    if code >= 0:
+                        break
+                    rule = -code
+                    rule_len = rule_lens[rule]
+                    children = [None] * rule_len
+                    base = node
+                    for i in range(rule_len - 1, -1, -1):
+                        links = base._links
+                        if len(links) != 1:
+                            break
+                        children[i], base = links[0]
+                    else:
+                        fn = rule_actions[rule]
+                        if fn is None:
+                            value = Nonterminal(rule_ids[rule], children, rule_syms[rule])
+                        else:
+                            value = fn(*children)
+                        node = _Node(goto[base._state][rule_lhs[rule]], [(value, base)])
+                        continue
+                    # A merged node; leave it to _step.
+                    code = 0
+                    break
+                if code > 0:
+                    self._heads = [_Node(code, [(tok, node)])]
+                    continue
+                heads = [node]
+            self._heads = self._step(heads, term, tok)
+
+    def _codes(self, state, term):
+        code = self._compiled._action[state][term]
+        if code:
+            return (code,)
+        return self._compiled._conflicts.get((state, term), ())
+
+    def _step(self, heads, term, tok):
+        # key: state, value: node for the current token
+        level = {h._state: h for h in heads}
+        todo = list(heads)
+        done = []
+        shifts = []
+
+        # (rule, paths) still to reduce, last first; the paths are found
+        # when queued, and links added meanwhile queue their own.
+        reductions = []
+
+        while todo:
+            node = todo.pop()
+            done.append(node)
+            for code in self._codes(node._state, term):
+                if code > 0:
+                    shifts.append((code, node))
+                else:
+                    reductions.append((-code, list(self._rule_paths(-code, node))))
+            reductions.reverse()
+            while reductions:
+                rule, paths = reductions.pop()
+                self._reduce(rule, paths, term, level, todo, done, reductions)
+
+        if not shifts:
+            errors = [self._compiled._input_error(h._state, term) for h in heads]
+            if len(errors) == 1:
+                raise errors[0]
+            good_keys = []
+            for e in errors:
+                good_keys.extend([k for k in e._good_keys if k not in good_keys])
+            raise InputError(errors[0]._bad_key, good_keys)
+
+        # key: state, value: node for the next token
+        new_level = {}
+        for code, node in shifts:
+            target = new_level.get(code)
+            if target is None:
+                new_level[code] = _Node(code, [(tok, node)])
+            else:
+                target._links.append((tok, node))
+        return list(new_level.values())
+
+    def _rule_paths(self, rule, node, via=None, level=None):
+        return _paths(node, self._compiled._rule_len[rule], via, level)
+
+    def _reduce(self, rule, paths, term, level, todo, done, reductions):
+        compiled = self._compiled
+        goto = compiled._goto
+        lhs = compiled._rule_lhs[rule]
+        fn = self._rule_actions[rule]
+
+        for children, base in paths:
+            if fn is None:
+                value = Nonterminal(compiled._rule_ids[rule], children, compiled._rule_syms[rule])
+            else:
+                value = fn(*children)
+            state = goto[base._state][lhs]
+            link = (value, base)
+            node = level.get(state)
+            if node is None:
+                level[state] = node = _Node(state, [link])
+                todo.append(node)
+                continue
+            if self._merge is not None and self._pack(node, link):
+                continue
+            node._links.append(link)
+            if node in done:
+                for other in done:
+                    for code in self._codes(other._state, term):
+                        if code < 0:
+                            reductions.append((-code, list(self._rule_paths(-code, other, (node, link), level))))
+
+    def _pack(self, node, link):
+        value, base = link
+        for old_value, old_base in node._links:
+            if old_base is base:
+                self._merge(old_value, value)
+                return True
+        return False
+
+    def get_all(self):
+        final_state = self._compiled._final_state
+        rv = []
+        for head in self._heads:
+            if head._state != final_state:
+                continue
+            for eof, penultimate in head._links:
+                for value, root in penultimate._links:
+                    rv.append(value)
+        return rv
+
+    def get(self):
+        rv = self.get_all()
+        assert rv
+        if len(rv) != 1:
+            raise AmbiguityError(len(rv))
+        return rv[0]
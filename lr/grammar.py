@@ -1,3 +1,4 @@
+from array import array
 import string
 import weakref
 
@@ -10,6 +11,55 @@ from .error import (
 _special_eof = '$eof'
 _special_accept = '$accept'
 
+# Pickling: a SymbolsInfo is its names, a Grammar its rules as an array of
+# numbers, and a SymbolId or RuleId is its owner plus its number.
+#
+# Ids only hold weak references, so something else has to keep an
+# unpickled SymbolsInfo or Grammar alive, or a lone unpickled Terminal
+# would lose its symbol. The ids of an unpickled owner hold it strongly
+# instead (see _hold), so it lives as long as any Terminal, tree or
+# Automaton that uses it. Each owner pickled or unpickled is also
+# registered by content, and unpickling gives back the registered object
+# while it still exists (in the same process, the one last pickled).
+
+# key: (names, num_terminals) or (SymbolsInfo, rules bytes)
+_registry = weakref.WeakValueDictionary()
+
+def _hold(owner):
+    # Replace the weak references of `owner`'s ids by a strong stand-in.
+    # This makes a cycle, which the garbage collector frees as usual.
+    def info():
+        return owner
+    for d in owner._data:
+        d._id._info = info
+    return owner
+
+def _intern(key, build):
+    rv = _registry.get(key)
+    if rv is None:
+        rv = _hold(build())
+        _registry[key] = rv
+    return rv
+
+def _register(grammar):
+    # Make unpickling in this process give back `grammar` and its symbols,
+    # even if they were never pickled here (e.g. sent to a forked worker).
+    grammar._symbols.__reduce__()
+    grammar.__reduce__()
+
+def _unpickle_symbols(names, num_terminals):
+    return _intern((tuple(names), num_terminals), lambda: SymbolsInfo._rebuild(names, num_terminals))
+
+def _unpickle_grammar(symbols, rules):
+    def build():
+        it = iter(rules)
+        return Grammar._rebuild(symbols, [(lhs, [next(it) for i in range(next(it))]) for lhs in it])
+    return _intern((symbols, rules.tobytes()), build)
+
+def _unpickle_id(info, number):
+    # For SymbolId, RuleId and lr.automaton.StateId.
+    return info._data[number]._id
+
 
 class SymbolId:
     __slots__ = ('_number', '_info')
@@ -21,6 +71,9 @@ class SymbolId:
     def __repr__(self):
         return '<SymbolId for %r>' % (self._data(),)
 
+    def __reduce__(self):
+        return (_unpickle_id, (self._info(), self._number))
+
     def _data(self):
         return self._info()._data[self._number]
 
@@ -52,7 +105,11 @@ class SymbolData:
 
 def _fix_sym(sym, is_term):
     if sym == 'error':
-        raise SymbolError('other: %r' % sym) # pragma: no cover
+        # As in bison, `error` is a terminal that only the runtime produces,
+        # standing for whatever it skipped while recovering.
+        if not is_term:
+            raise SymbolError('error: %r' % sym)
+        return sym
     if is_term and len(sym) > 2:
         for q in ['\'', '"']:
             if sym[0] == q and sym[-1] == q:
@@ -81,11 +138,21 @@ class SymbolsInfo:
     __slots__ = ('_numbers', '_data', '_num_terminals', '__weakref__')
 
     def __init__(self, terminals, nonterminals):
+        self._init(_gen_symbol_iter(terminals, nonterminals))
+
+    @staticmethod
+    def _rebuild(names, num_terminals):
+        # Inverse of [d._name for d in self._data]; the names are already fixed.
+        self = SymbolsInfo.__new__(SymbolsInfo)
+        self._init((name, i < num_terminals) for i, name in enumerate(names))
+        return self
+
+    def _init(self, symbol_iter):
         self._numbers = {}
         self._data = []
         num_terminals = 0
 
-        for name, is_term in _gen_symbol_iter(terminals, nonterminals):
+        for name, is_term in symbol_iter:
             i = len(self._data)
             if name in self._numbers:
                 raise SymbolError('duplicate: %r' % name)
@@ -101,6 +168,11 @@ class SymbolsInfo:
         num_nonterminals = num_symbols - num_terminals
         return '<SymbolsInfo for %d terminals and %d nonterminals>' % (num_terminals, num_nonterminals)
 
+    def __reduce__(self):
+        names = [d._name for d in self._data]
+        _registry[tuple(names), self._num_terminals] = self
+        return (_unpickle_symbols, (names, self._num_terminals))
+
     def _grammar_repr(self):
         num_symbols = len(self._data)
         num_terminals = self._num_terminals
@@ -133,6 +205,9 @@ class RuleId:
     def __repr__(self):
         return '<RuleId for %r>' % (self._data(),)
 
+    def __reduce__(self):
+        return (_unpickle_id, (self._info(), self._number))
+
     def _data(self):
         return self._info()._data[self._number]
 
@@ -169,6 +244,23 @@ class Grammar:
     __slots__ = ('_symbols', '_data', '_by_symbol_lhs', '_by_symbol_rhs', '__weakref__')
 
     def __init__(self, symbols, data, start):
+        self._init(symbols, (
+                (symbols.get(lhs, False), [symbols.get(r, True) for r in rhs])
+                for (lhs, rhs) in _gen_rule_iter(data, start)
+        ))
+
+    @staticmethod
+    def _rebuild(symbols, rules):
+        # `rules` is a list of (lhs number, [rhs numbers]), including rule 0.
+        self = Grammar.__new__(Grammar)
+        symbol_data = symbols._data
+        self._init(symbols, (
+                (symbol_data[lhs]._id, [symbol_data[r]._id for r in rhs])
+                for (lhs, rhs) in rules
+        ))
+        return self
+
+    def _init(self, symbols, sym_rules):
         self._symbols = symbols
         self._data = []
         self._by_symbol_lhs = {}
@@ -176,14 +268,12 @@ class Grammar:
 
         prev = None
 
-        for (lhs, rhs) in _gen_rule_iter(data, start):
+        for (lhs_sym, rhs_syms) in sym_rules:
             i = len(self._data)
-            lhs_sym = symbols.get(lhs, False)
-            rhs_syms = [symbols.get(r, True) for r in rhs]
             if lhs_sym != prev:
                 for_this_sym = []
                 if lhs_sym in self._by_symbol_lhs:
-                    raise GrammarError('nonadjacent: %r' % lhs)
+                    raise GrammarError('nonadjacent: %r' % lhs_sym._data()._name)
                 self._by_symbol_lhs[lhs_sym] = for_this_sym
             prev = lhs_sym
             datum = RuleData(RuleId(i, self), lhs_sym, len(for_this_sym), rhs_syms)
@@ -193,6 +283,16 @@ class Grammar:
                 bsr = self._by_symbol_rhs.setdefault(rhs_sym, [])
                 bsr.append((datum._id, i))
 
+    def __reduce__(self):
+        # Per rule: the lhs number, the rhs length, then the rhs numbers.
+        rules = array('i')
+        for r in self._data:
+            rules.append(r._lhs._number)
+            rules.append(len(r._rhs))
+            rules.extend([s._number for s in r._rhs])
+        _registry[self._symbols, rules.tobytes()] = self
+        return (_unpickle_grammar, (self._symbols, rules))
+
     def __repr__(self):
         rule_strs = [x._grammar_repr() for x in self._data]
         return '<Grammar with %d rules, %s\n  %s\n>' % (len(rule_strs), self._symbols._grammar_repr(), '\n  '.join(rule_strs))
@@ -0,0 +1,142 @@
+from .compiled import CompiledAutomaton
+from .value import Terminal, Nonterminal
+
+
+# Incremental reparsing with subtree reuse.
+#
+# Every node built here records the state that was on top of the stack
+# when its first token was shifted, and how many tokens it spans. A parse
+# of a subtree depends only on that state, its own tokens, and the token
+# right after it (the lookahead for its last reduction). So after an edit,
+# any old subtree that lies outside the edit, and whose following token
+# does too, can be pushed back with a single goto if the parser reaches
+# the same state in front of it. Everything else is broken down into its
+# children. The work done is the size of the edit times the tree depth,
+# plus whatever spine has to be rebuilt over it: for a left-recursive list
+# that is one reduction (and one separator) per later item, but the items
+# themselves are never reparsed.
+
+class IncrementalNonterminal(Nonterminal):
+    __slots__ = ('_state', '_num_tokens')
+
+    def __init__(self, rule, children, sym, state, num_tokens):
+        super().__init__(rule, children, sym)
+        self._state = state
+        self._num_tokens = num_tokens
+
+def _num_tokens(value):
+    if isinstance(value, IncrementalNonterminal):
+        return value._num_tokens
+    assert isinstance(value, Terminal)
+    return 1
+
+def _first_terminal(value):
+    while not isinstance(value, Terminal):
+        value = value._children[0]
+    return value
+
+class _Parse:
+    __slots__ = ('_compiled', '_state_stack', '_value_stack', '_shifted')
+
+    def __init__(self, compiled):
+        self._compiled = compiled
+        self._state_stack = [0]
+        self._value_stack = []
+        self._shifted = 0
+
+    def reduce_for(self, term):
+        # Do every reduction `term` triggers as lookahead; return the
+        # shift (or error) that would come next.
+        compiled = self._compiled
+        state_stack = self._state_stack
+        value_stack = self._value_stack
+        while True:
+            code = compiled._action[state_stack[-1]][term]
+            if code >= 0:
+                return code
+            rule = -code
+            rule_len = compiled._rule_len[rule]
+            children = value_stack[-rule_len:]
+            num_tokens = sum(_num_tokens(c) for c in children)
+            state = state_stack[-rule_len - 1]
+            new_value = IncrementalNonterminal(compiled._rule_ids[rule], children, compiled._rule_syms[rule], state, num_tokens)
+            value_stack[-rule_len:] = (new_value,)
+            del state_stack[-rule_len:]
+            state_stack.append(compiled._goto[state_stack[-1]][compiled._rule_lhs[rule]])
+
+    def feed(self, tok):
+        term = tok._sym._number
+        code = self.reduce_for(term)
+        if not code:
+            raise self._compiled._input_error(self._state_stack[-1], term)
+        self._state_stack.append(code)
+        self._value_stack.append(tok)
+        self._shifted += 1
+
+    def try_reuse(self, node):
+        self.reduce_for(_first_terminal(node)._sym._number)
+        if self._state_stack[-1] != node._state:
+            return False
+        compiled = self._compiled
+        lhs = node._sym._number - compiled._num_terminals
+        self._state_stack.append(compiled._goto[node._state][lhs])
+        self._value_stack.append(node)
+        return True
+
+    def get(self):
+        assert len(self._state_stack) == 3
+        assert self._state_stack[-1] == self._compiled._final_state
+        return self._value_stack[0]
+
+class IncrementalParser:
+    __slots__ = ('_compiled', '_last_shifted')
+
+    def __init__(self, compiled):
+        # Unit bypass would leave nodes without annotations.
+        assert not any(compiled._rule_unit)
+        assert all(compiled._rule_len), 'empty rule'
+        self._compiled = compiled
+        self._last_shifted = 0
+
+    def __repr__(self):
+        return '<IncrementalParser for %r>' % (self._compiled,)
+
+    def parse(self, toks):
+        # Like Runtime.feed_all + get, so `toks` must end with $eof.
+        parse = _Parse(self._compiled)
+        for tok in toks:
+            parse.feed(tok)
+        self._last_shifted = parse._shifted
+        return parse.get()
+
+    def reparse(self, tree, start, end, new_toks):
+        # `tree` is from parse() or reparse(); its tokens [start, end) are
+        # replaced by `new_toks` (which do not include $eof).
+        parse = _Parse(self._compiled)
+        pending = [tree]
+        pos = 0
+        inserted = False
+
+        while pending:
+            node = pending.pop()
+            if not inserted and pos >= start:
+                for tok in new_toks:
+                    parse.feed(tok)
+                inserted = True
+            node_end = pos + _num_tokens(node)
+            if isinstance(node, Terminal):
+                if not start <= pos < end:
+                    parse.feed(node)
+                pos = node_end
+                continue
+            if (node_end < start or pos >= end) and parse.try_reuse(node):
+                pos = node_end
+                continue
+            pending.extend(reversed(node._children))
+        if not inserted:
+            for tok in new_toks:
+                parse.feed(tok)
+        symbol_data = self._compiled._grammar._symbols._data
+        parse.feed(Terminal(symbol_data[0]._id, ''))
+        self._last_shifted = parse._shifted
+        return parse.get()
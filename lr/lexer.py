@@ -0,0 +1,491 @@
+from array import array
+import bisect
+
+from .error import GrammarError, LexError
+from .tokens import TokenArrays, _slice
+from .value import Terminal
+
+
+# A lexer generator: one DFA for all of a grammar's terminals.
+#
+# `definitions` maps terminal names to regexes (or Literal). Every other
+# terminal (except $eof and `error`) is a literal of its own name, so `'+'`
+# and keywords like `if` need no definition. Matching is longest-first;
+# among matches of the same length, literals beat regexes (so a keyword is
+# not an identifier, but `iffy` still is), and otherwise the earlier
+# definition wins. `skip` (e.g. whitespace and comments) is matched the same
+# way but produces no token.
+#
+# The regex syntax is the common subset: literal characters, `\` escapes
+# (including \d \w \s and their negations, \n \t \r \f \v, \xHH, \uHHHH),
+# `.` (anything but a newline), `[...]` and `[^...]` classes with ranges,
+# `(...)`, `|`, and the `*` `+` `?` quantifiers.
+#
+# The DFA runs over code units: the bytes of a bytes source, or the code
+# points of a str (offsets are then in code points too). With bytes, a
+# pattern character stands for that byte value, so only ASCII ones are
+# useful (a negated class like [^\s] still matches UTF-8 bytes). Each state
+# has a dense row for units below 256; larger units go through a bisect over
+# the character class boundaries. Output is a TokenArrays, ending with $eof.
+
+_MAX = 0x10ffff
+
+class Literal:
+    __slots__ = ('_text',)
+
+    def __init__(self, text):
+        self._text = text
+
+    def __repr__(self):
+        return 'Literal(%r)' % (self._text,)
+
+def _negate(ranges):
+    rv = []
+    lo = 0
+    for a, b in ranges:
+        if a > lo:
+            rv.append((lo, a - 1))
+        lo = b + 1
+    if lo <= _MAX:
+        rv.append((lo, _MAX))
+    return rv
+
+def _normalize(ranges):
+    rv = []
+    for a, b in sorted(ranges):
+        if rv and a <= rv[-1][1] + 1:
+            rv[-1] = (rv[-1][0], max(rv[-1][1], b))
+        else:
+            rv.append((a, b))
+    return rv
+
+_digit = [(0x30, 0x39)]
+_word = _normalize([(0x30, 0x39), (0x41, 0x5a), (0x5f, 0x5f), (0x61, 0x7a)])
+_space = _normalize([(0x09, 0x0d), (0x20, 0x20)])
+_class_escapes = {
+        'd': _digit, 'D': _negate(_digit),
+        'w': _word, 'W': _negate(_word),
+        's': _space, 'S': _negate(_space),
+}
+_char_escapes = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v', '0': '\0'}
+
+class _Nfa:
+    __slots__ = ('_eps', '_edges', '_accept')
+
+    def __init__(self):
+        # per state: list of states
+        self._eps = []
+        # per state: list of (ranges, state)
+        self._edges = []
+        # key: state, value: (priority, token)
+        self._accept = {}
+
+    def state(self):
+        self._eps.append([])
+        self._edges.append([])
+        return len(self._eps) - 1
+
+class _RegexParser:
+    # Builds NFA fragments (start, end) by recursive descent.
+    __slots__ = ('_nfa', '_pattern', '_pos')
+
+    def __init__(self, nfa, pattern):
+        self._nfa = nfa
+        self._pattern = pattern
+        self._pos = 0
+
+    def _error(self):
+        return GrammarError('regex: %r at %d' % (self._pattern, self._pos))
+
+    def _peek(self):
+        if self._pos < len(self._pattern):
+            return self._pattern[self._pos]
+        return None
+
+    def _next(self):
+        c = self._peek()
+        if c is None:
+            raise self._error()
+        self._pos += 1
+        return c
+
+    def parse(self):
+        rv = self._alt()
+        if self._peek() is not None:
+            raise self._error()
+        return rv
+
+    def _alt(self):
+        nfa = self._nfa
+        frags = [self._concat()]
+        while self._peek() == '|':
+            self._pos += 1
+            frags.append(self._concat())
+        if len(frags) == 1:
+            return frags[0]
+        start = nfa.state()
+        end = nfa.state()
+        for a, b in frags:
+            nfa._eps[start].append(a)
+            nfa._eps[b].append(end)
+        return start, end
+
+    def _concat(self):
+        nfa = self._nfa
+        start = end = nfa.state()
+        while self._peek() not in (None, '|', ')'):
+            a, b = self._repeat()
+            nfa._eps[end].append(a)
+            end = b
+        return start, end
+
+    def _repeat(self):
+        nfa = self._nfa
+        a, b = self._atom()
+        while self._peek() in ('*', '+', '?'):
+            op = self._next()
+            start = nfa.state()
+            end = nfa.state()
+            nfa._eps[start].append(a)
+            nfa._eps[b].append(end)
+            if op != '+':
+                nfa._eps[start].append(end)
+            if op != '?':
+                nfa._eps[b].append(a)
+            a, b = start, end
+        return a, b
+
+    def _atom(self):
+        c = self._next()
+        if c == '(':
+            rv = self._alt()
+            # _alt() only stops at ')' or the end, where _next() raises.
+            if self._next() != ')':
+                raise self._error() # pragma: no cover
+            return rv
+        if c in ('*', '+', '?', ')', '{', '}'):
+            raise self._error()
+        if c == '[':
+            ranges = self._class()
+        elif c == '.':
+            ranges = _negate([(10, 10)])
+        elif c == '\\':
+            ranges = self._escape()
+        else:
+            ranges = [(ord(c), ord(c))]
+        return self._edge(ranges)
+
+    def _edge(self, ranges):
+        nfa = self._nfa
+        start = nfa.state()
+        end = nfa.state()
+        nfa._edges[start].append((ranges, end))
+        return start, end
+
+    def _escape(self):
+        c = self._next()
+        if c in _class_escapes:
+            return _class_escapes[c]
+        if c in _char_escapes:
+            c = _char_escapes[c]
+        elif c in ('x', 'u'):
+            digits = self._pattern[self._pos:self._pos + (2 if c == 'x' else 4)]
+            try:
+                c = chr(int(digits, 16))
+            except ValueError:
+                raise self._error() from None
+            self._pos += len(digits)
+        elif c.isalnum():
+            raise self._error()
+        return [(ord(c), ord(c))]
+
+    def _class(self):
+        negate = self._peek() == '^'
+        if negate:
+            self._pos += 1
+        ranges = []
+        first = True
+        while True:
+            c = self._next()
+            if c == ']' and not first:
+                break
+            first = False
+            if c == '\\':
+                r = self._escape()
+                if len(r) != 1 or r[0][0] != r[0][1]:
+                    ranges.extend(r)
+                    continue
+                lo = r[0][0]
+            else:
+                lo = ord(c)
+            hi = lo
+            if self._peek() == '-' and self._pattern[self._pos + 1:self._pos + 2] not in ('', ']'):
+                self._pos += 1
+                c = self._next()
+                hi = self._escape()[0][0] if c == '\\' else ord(c)
+                if hi < lo:
+                    raise self._error()
+            ranges.append((lo, hi))
+        ranges = _normalize(ranges)
+        if negate:
+            ranges = _negate(ranges)
+        return ranges
+
+def _closure(nfa, states):
+    stack = list(states)
+    rv = set(states)
+    while stack:
+        for t in nfa._eps[stack.pop()]:
+            if t not in rv:
+                rv.add(t)
+                stack.append(t)
+    return frozenset(rv)
+
+# Token numbers for DFA accept states, besides terminal numbers.
+_NONE = -1
+_SKIP = -2
+
+class _Dfa:
+    __slots__ = ('_rows', '_bounds', '_class_rows', '_accept')
+
+    def __init__(self, patterns):
+        # `patterns` is a list of (token, regex or Literal), best first.
+        nfa = _Nfa()
+        start = nfa.state()
+        for priority, (token, pattern) in enumerate(patterns):
+            if isinstance(pattern, Literal):
+                a = end = nfa.state()
+                for c in pattern._text:
+                    b = nfa.state()
+                    nfa._edges[end].append(([(ord(c), ord(c))], b))
+                    end = b
+            else:
+                a, end = _RegexParser(nfa, pattern).parse()
+            nfa._eps[start].append(a)
+            nfa._accept[end] = (priority, token)
+        self._build(nfa, start)
+
+    def _build(self, nfa, nfa_start):
+        # Character classes are the intervals between all edge boundaries.
+        bounds = {0}
+        for edges in nfa._edges:
+            for ranges, t in edges:
+                for lo, hi in ranges:
+                    bounds.add(lo)
+                    bounds.add(hi + 1)
+        bounds = sorted(b for b in bounds if b <= _MAX)
+        self._bounds = bounds
+
+        start = _closure(nfa, [nfa_start])
+        dfa_states = {start: 0}
+        todo = [start]
+        # per DFA state: list per class of target state, or -1
+        class_rows = []
+        accept = []
+        while todo:
+            states = todo.pop(0)
+            targets = {}
+            for s in states:
+                for ranges, t in nfa._edges[s]:
+                    for lo, hi in ranges:
+                        for k in range(bisect.bisect_right(bounds, lo) - 1, bisect.bisect_right(bounds, hi)):
+                            targets.setdefault(k, set()).add(t)
+            row = [-1] * len(bounds)
+            for k, ts in targets.items():
+                ts = _closure(nfa, ts)
+                target = dfa_states.get(ts)
+                if target is None:
+                    target = dfa_states[ts] = len(dfa_states)
+                    todo.append(ts)
+                row[k] = target
+            class_rows.append(row)
+            best = None
+            for s in states:
+                if s in nfa._accept and (best is None or nfa._accept[s] < best):
+                    best = nfa._accept[s]
+            accept.append(_NONE if best is None else best[1])
+        self._class_rows = class_rows
+        self._accept = accept
+        small = [bisect.bisect_right(bounds, c) - 1 for c in range(256)]
+        self._rows = [[row[k] for k in small] for row in class_rows]
+
+    def _scan(self, units, pos, limit, syms, starts, ends):
+        # Append the tokens that start before `limit`; the last one may
+        # run past it. Return where the next token starts.
+        #
+        # The DFA runs over the units until it gets stuck, and only then
+        # checks that its state accepts: if so, that is the longest match,
+        # and the stuck unit starts the next token. Otherwise (the longest
+        # match is shorter, or there is none), and for a unit beyond the
+        # dense rows, _match redoes the current token.
+        rows = self._rows
+        row0 = rows[0]
+        accept = self._accept
+        n = len(units)
+
+        while pos < limit:
+            state = 0
+            row = row0
+            i = pos
+            try:
+                for c in units[pos:]:
+                    target = row[c]
+                    if target < 0:
+                        token = accept[state]
+                        if token == _NONE:
+                            break
+                        if token != _SKIP:
+                            syms.append(token)
+                            starts.append(pos)
+                            ends.append(i)
+                        pos = i
+                        if pos >= limit:
+                            return pos
+                        target = row0[c]
+                        if target < 0:
+                            break
+                    state = target
+                    row = rows[target]
+                    i += 1
+                else:
+                    token = accept[state]
+                    if token != _NONE:
+                        if token != _SKIP:
+                            syms.append(token)
+                            starts.append(pos)
+                            ends.append(n)
+                        return n
+            except IndexError:
+                pass
+            token, end = self._match(units, pos)
+            if token == _NONE:
+                raise LexError(pos)
+            if token != _SKIP:
+                syms.append(token)
+                starts.append(pos)
+                ends.append(end)
+            pos = end
+        return pos
+
+    def _match(self, units, pos):
+        # The longest match at `pos`, as (token, end); token may be _NONE.
+        rows = self._rows
+        accept = self._accept
+        n = len(units)
+        state = 0
+        token = _NONE
+        end = pos
+        while pos < n:
+            c = units[pos]
+            if c < 256:
+                state = rows[state][c]
+            else:
+                state = self._class_rows[state][bisect.bisect_right(self._bounds, c) - 1]
+            if state < 0:
+                break
+            pos += 1
+            t = accept[state]
+            if t != _NONE:
+                token = t
+                end = pos
+        return token, end
+
+# context(): instead of lexing everything up front, each token is matched
+# when the runtime asks for it, with a DFA for only the terminals that its
+# expected_bits() allows (plus `skip`). So a keyword that is not valid at
+# that point is lexed as whatever else matches, e.g. an identifier, and
+# fewer patterns are tried. The DFAs are built on first use and cached by
+# bitset. If nothing allowed matches, the full DFA is tried, so that the
+# runtime reports the unexpected token as usual.
+
+class Lexer:
+    __slots__ = ('_symbols', '_patterns', '_dfa', '_restricted')
+
+    def __init__(self, symbols, definitions, skip=None):
+        self._symbols = symbols
+        # Keys are spelled as in the grammar, e.g. "'+'".
+        patterns = {symbols.get(name, True)._number: pattern for name, pattern in definitions.items()}
+        literals = []
+        regexes = []
+        for data in symbols._data[:symbols._num_terminals]:
+            name = data._name
+            if name.startswith('$') or name == 'error':
+                continue
+            pattern = patterns.get(data._id._number, Literal(name))
+            if isinstance(pattern, Literal):
+                literals.append((data._id._number, pattern))
+            else:
+                regexes.append((data._id._number, pattern))
+        if skip is not None:
+            regexes.append((_SKIP, skip))
+        self._patterns = literals + regexes
+        self._dfa = _Dfa(self._patterns)
+        # key: bitset of terminals, value: _Dfa
+        self._restricted = {}
+
+    def __repr__(self):
+        return '<Lexer with %d states, %d classes>' % (len(self._dfa._rows), len(self._dfa._bounds))
+
+    def _units(self, source):
+        if isinstance(source, str):
+            return memoryview(source.encode('utf-32-le')).cast('I')
+        return memoryview(source)
+
+    def tokenize(self, source):
+        units = self._units(source)
+        syms = array('i')
+        starts = array('i')
+        ends = array('i')
+        n = len(units)
+        self._dfa._scan(units, 0, n, syms, starts, ends)
+        syms.append(0)
+        starts.append(n)
+        ends.append(n)
+        return TokenArrays(self._symbols, syms, starts, ends, source)
+
+    def stream(self, source, chunk_size=1 << 20):
+        # For a bytes-like source (e.g. an mmap), yield one TokenArrays per
+        # `chunk_size` bytes, each covering the tokens that start in that
+        # chunk; only the last one ends with $eof. Offsets are into the
+        # whole source, which the batches share, so nothing is copied
+        # until a token's text is looked at (see TokenArrays.spans).
+        units = memoryview(source)
+        n = len(units)
+        pos = 0
+        while True:
+            syms = array('i')
+            starts = array('i')
+            ends = array('i')
+            pos = self._dfa._scan(units, pos, min(pos + chunk_size, n), syms, starts, ends)
+            if pos == n:
+                syms.append(0)
+                starts.append(n)
+                ends.append(n)
+            yield TokenArrays(self._symbols, syms, starts, ends, source)
+            if pos == n:
+                return
+
+    def _restricted_dfa(self, bits):
+        dfa = self._restricted.get(bits)
+        if dfa is None:
+            patterns = [(token, pattern) for token, pattern in self._patterns if token < 0 or bits >> token & 1]
+            dfa = self._restricted[bits] = _Dfa(patterns)
+        return dfa
+
+    def context(self, runtime, source, encoding='utf-8'):
+        # Yield Terminals for runtime.feed_all (of a Runtime or a
+        # CompiledRuntime), each lexed in the state the runtime is in.
+        data = self._symbols._data
+        units = self._units(source)
+        n = len(units)
+        pos = 0
+        while pos < n:
+            token, end = self._restricted_dfa(runtime.expected_bits())._match(units, pos)
+            if token == _NONE:
+                token, end = self._dfa._match(units, pos)
+                if token == _NONE:
+                    raise LexError(pos)
+            if token != _SKIP:
+                yield Terminal(data[token]._id, _slice(source, pos, end, encoding))
+            pos = end
+        yield Terminal(data[0]._id, '')
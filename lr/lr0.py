@@ -1,5 +1,5 @@
 from .grammar import Grammar, RuleId, SymbolId
-from .automaton import Automaton, Shift, Reduce, Goto, AbstractItemSet, StateId, raise_conflicts
+from .automaton import Automaton, Shift, Reduce, Goto, AbstractItemSet, StateId, raise_conflicts, store_conflicts, use_default_reduction
 from .conflict import ConflictMap
 
 
@@ -180,13 +180,18 @@ def _do_state(istate, junk):
     istate._state._actions, rv = actions.finish()
     if rv:
         conflicts[istate] = rv
+    else:
+        use_default_reduction(istate._state)
 
-def compute_automaton(grammar):
+def compute_automaton(grammar, keep_conflicts=False):
     junk = Lr0Junk(grammar)
 
     root_item = Item(grammar._data[0]._id, 0)
     istate0 = ItemSet([root_item], junk.automaton)
 
     _do_state(istate0, junk)
-    raise_conflicts(junk.conflicts)
+    if keep_conflicts:
+        store_conflicts(junk.conflicts)
+    else:
+        raise_conflicts(junk.conflicts)
     return junk.automaton
@@ -0,0 +1,295 @@
+from array import array
+
+from .compiled import CompiledAutomaton, _rule_action_table
+from .value import Nonterminal
+from .error import InputError
+
+
+# CompiledAutomaton's tables, packed as in bison's yypact/yytable/yycheck.
+#
+# For the action table, each state's row keeps a default (its most common
+# reduction, or 0 for error) and stores only the cells that differ from it,
+# at `_action_base[state] + terminal` in the shared `_action_table`. A cell
+# belongs to the row if `_action_check` there holds the terminal. Rows are
+# placed first-fit, largest first, so their holes interleave like the teeth
+# of a comb; identical rows share a base, and otherwise bases are unique so
+# that a check can never match another row's cell. The goto table is packed
+# the same way by nonterminal, indexed by state, with the most common
+# target as each column's default.
+#
+# Unlike bison's, the defaults never stand in for errors: a row whose
+# default is a reduction stores its error cells explicitly, so errors are
+# detected exactly where CompiledRuntime detects them.
+#
+# With layout=None, the comb is used if it is at most half the size of the
+# dense tables; small or very dense tables stay dense (one array per state
+# and per nonterminal), which is faster to index. Either way, everything is
+# in array('i') buffers. compression_ratio() compares the dense size with
+# the chosen layout.
+#
+# Conflicts are dropped (they are errors in the tables anyway).
+
+def _pack(rows, width):
+    # `rows` is a list of dicts {column: value}; return (bases, table, check).
+    bases = [-width] * len(rows)
+    table = array('i')
+    check = array('i')
+    used = set()
+    # key: tuple of sorted items, value: base
+    shared = {}
+    # Every cell below this is taken, as bison's `lowzero`.
+    low = 0
+    order = sorted(range(len(rows)), key=lambda r: -len(rows[r]))
+    for r in order:
+        row = rows[r]
+        if not row:
+            continue
+        key = tuple(sorted(row.items()))
+        base = shared.get(key)
+        if base is None:
+            cols = [c for c, v in key]
+            first = cols[0]
+            base = low - first
+            size = len(check)
+            while True:
+                # The first column alone rules out most bases cheaply.
+                if (base + first >= size or check[base + first] < 0) and base not in used:
+                    for c in cols:
+                        if base + c < size and check[base + c] >= 0:
+                            break
+                    else:
+                        break
+                base += 1
+            used.add(base)
+            shared[key] = base
+            end = base + cols[-1] + 1
+            if end > len(check):
+                table.extend([0] * (end - len(check)))
+                check.extend([-1] * (end - len(check)))
+            for c, v in key:
+                table[base + c] = v
+                check[base + c] = c
+            while low < len(check) and check[low] >= 0:
+                low += 1
+        bases[r] = base
+    return array('i', bases), table, check
+
+def _default(values):
+    # The most common nonzero value (lowest on a tie), or 0.
+    counts = {}
+    for v in values:
+        if v:
+            counts[v] = counts.get(v, 0) + 1
+    if not counts:
+        return 0
+    return min(counts, key=lambda v: (-counts[v], v))
+
+class PackedAutomaton:
+    __slots__ = ('_grammar', '_num_terminals', '_num_states', '_layout',
+            '_action', '_goto',
+            '_action_default', '_action_base', '_action_table', '_action_check',
+            '_goto_default', '_goto_base', '_goto_table', '_goto_check',
+            '_rule_lhs', '_rule_len', '_rule_ids', '_rule_syms', '_rule_unit', '_final_state')
+
+    def __init__(self, automaton, layout=None):
+        # `automaton` is an Automaton or a CompiledAutomaton.
+        assert layout in (None, 'dense', 'comb')
+        if not isinstance(automaton, CompiledAutomaton):
+            automaton = CompiledAutomaton(automaton)
+        compiled = automaton
+        num_terminals = compiled._num_terminals
+        num_states = len(compiled._action)
+        self._grammar = compiled._grammar
+        self._num_terminals = num_terminals
+        self._num_states = num_states
+        self._rule_lhs = compiled._rule_lhs
+        self._rule_len = compiled._rule_len
+        self._rule_ids = compiled._rule_ids
+        self._rule_syms = compiled._rule_syms
+        self._rule_unit = compiled._rule_unit
+        self._final_state = compiled._final_state
+
+        action_rows = []
+        self._action_default = array('i')
+        for row in compiled._action:
+            default = _default(c for c in row if c < 0)
+            self._action_default.append(default)
+            action_rows.append({t: c for t, c in enumerate(row) if c != default})
+        self._action_base, self._action_table, self._action_check = _pack(action_rows, num_terminals)
+
+        goto_columns = []
+        self._goto_default = array('i')
+        for column in zip(*compiled._goto):
+            default = _default(column)
+            self._goto_default.append(default)
+            goto_columns.append({s: g for s, g in enumerate(column) if g and g != default})
+        self._goto_base, self._goto_table, self._goto_check = _pack(goto_columns, num_states)
+
+        self._action = [array('i', row) for row in compiled._action]
+        self._goto = [array('i', row) for row in compiled._goto]
+        if layout is None:
+            layout = 'comb' if self._comb_nbytes() * 2 <= self._dense_nbytes() else 'dense'
+        self._layout = layout
+        if layout == 'comb':
+            self._action = self._goto = None
+        else:
+            self._action_base = self._action_table = self._action_check = None
+            self._goto_base = self._goto_table = self._goto_check = None
+
+    def __repr__(self):
+        return '<PackedAutomaton with %d states, %s layout, %.1fx smaller>' % (self._num_states, self._layout, self.compression_ratio())
+
+    def _dense_nbytes(self):
+        num_nonterminals = len(self._goto_default)
+        return 4 * self._num_states * (self._num_terminals + num_nonterminals)
+
+    def _comb_nbytes(self):
+        arrays = [self._action_default, self._action_base, self._action_table, self._action_check,
+                self._goto_default, self._goto_base, self._goto_table, self._goto_check]
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    def compression_ratio(self):
+        if self._layout == 'dense':
+            return 1.0
+        return self._dense_nbytes() / self._comb_nbytes()
+
+    def action(self, state, term):
+        if self._action is not None:
+            return self._action[state][term]
+        i = self._action_base[state] + term
+        if 0 <= i < len(self._action_check) and self._action_check[i] == term:
+            return self._action_table[i]
+        return self._action_default[state]
+
+    def goto(self, state, nonterminal):
+        # `nonterminal` is the index among nonterminals, as in _rule_lhs.
+        if self._goto is not None:
+            return self._goto[state][nonterminal]
+        i = self._goto_base[nonterminal] + state
+        if 0 <= i < len(self._goto_check) and self._goto_check[i] == state:
+            return self._goto_table[i]
+        return self._goto_default[nonterminal]
+
+    def _input_error(self, state, term):
+        data = self._grammar._symbols._data
+        good_keys = [data[t]._name for t in range(self._num_terminals) if self.action(state, t)]
+        return InputError(data[term]._name, good_keys)
+
+# `actions` is as for CompiledRuntime. There is no error recovery.
+
+class PackedRuntime:
+    __slots__ = ('_packed', '_rule_actions', '_state_stack', '_value_stack')
+
+    def __init__(self, packed, actions=None):
+        assert all(packed._rule_len), 'empty rule'
+        self._packed = packed
+        self._rule_actions = _rule_action_table(packed, actions)
+        self._state_stack = [0]
+        self._value_stack = []
+
+    def __repr__(self):
+        return '<PackedRuntime in state #%d/%d with %d values>' % (self._state_stack[-1], self._packed._num_states, len(self._value_stack))
+
+    def feed(self, tok):
+        self.feed_all([tok])
+
+    def feed_all(self, toks):
+        packed = self._packed
+        if packed._action is not None:
+            return self._feed_dense(toks)
+        action_default = packed._action_default
+        action_base = packed._action_base
+        action_table = packed._action_table
+        action_check = packed._action_check
+        num_action = len(action_check)
+        goto_default = packed._goto_default
+        goto_base = packed._goto_base
+        goto_table = packed._goto_table
+        goto_check = packed._goto_check
+        num_goto = len(goto_check)
+        rule_lhs = packed._rule_lhs
+        rule_lens = packed._rule_len
+        rule_ids = packed._rule_ids
+        rule_syms = packed._rule_syms
+        rule_unit = packed._rule_unit
+        rule_actions = self._rule_actions
+        state_stack = self._state_stack
+        value_stack = self._value_stack
+
+        for tok in toks:
+            term = tok._sym._number
+            while True:
+                state = state_stack[-1]
+                i = action_base[state] + term
+                if 0 <= i < num_action and action_check[i] == term:
+                    code = action_table[i]
+                else:
+                    code = action_default[state]
+                if code > 0:
+                    value_stack.append(tok)
+                    state_stack.append(code)
+                    break
+                if not code:
+                    raise packed._input_error(state, term)
+                rule = -code
+                lhs = rule_lhs[rule]
+                if rule_unit[rule]:
+                    rule_len = 1
+                else:
+                    rule_len = rule_lens[rule]
+                    fn = rule_actions[rule]
+                    if fn is None:
+                        value_stack[-rule_len:] = (Nonterminal(rule_ids[rule], value_stack[-rule_len:], rule_syms[rule]),)
+                    else:
+                        value_stack[-rule_len:] = (fn(*value_stack[-rule_len:]),)
+                    if rule_len > 1:
+                        del state_stack[1 - rule_len:]
+                # The top entry is replaced by the goto.
+                state = state_stack[-2]
+                i = goto_base[lhs] + state
+                if 0 <= i < num_goto and goto_check[i] == state:
+                    state_stack[-1] = goto_table[i]
+                else:
+                    state_stack[-1] = goto_default[lhs]
+
+    def _feed_dense(self, toks):
+        packed = self._packed
+        action = packed._action
+        goto = packed._goto
+        rule_lhs = packed._rule_lhs
+        rule_lens = packed._rule_len
+        rule_ids = packed._rule_ids
+        rule_syms = packed._rule_syms
+        rule_unit = packed._rule_unit
+        rule_actions = self._rule_actions
+        state_stack = self._state_stack
+        value_stack = self._value_stack
+
+        for tok in toks:
+            term = tok._sym._number
+            while True:
+                code = action[state_stack[-1]][term]
+                if code > 0:
+                    value_stack.append(tok)
+                    state_stack.append(code)
+                    break
+                if not code:
+                    raise packed._input_error(state_stack[-1], term)
+                rule = -code
+                if rule_unit[rule]:
+                    state_stack[-1] = goto[state_stack[-2]][rule_lhs[rule]]
+                    continue
+                rule_len = rule_lens[rule]
+                fn = rule_actions[rule]
+                if fn is None:
+                    value_stack[-rule_len:] = (Nonterminal(rule_ids[rule], value_stack[-rule_len:], rule_syms[rule]),)
+                else:
+                    value_stack[-rule_len:] = (fn(*value_stack[-rule_len:]),)
+                del state_stack[-rule_len:]
+                state_stack.append(goto[state_stack[-1]][rule_lhs[rule]])
+
+    def get(self):
+        assert len(self._state_stack) == 3
+        assert self._state_stack[-1] == self._packed._final_state
+        assert len(self._value_stack) == 2
+        return self._value_stack[0]
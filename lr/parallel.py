@@ -0,0 +1,117 @@
+from array import array
+import multiprocessing
+
+from .error import InputError
+from .compiled import CompiledAutomaton, CompiledRuntime
+from .grammar import _register
+from .value import Terminal
+
+
+# What parse_many returns for each input:
+#   TREE: the same tree CompiledRuntime would build
+#   SUMMARY: an array of how many times each rule was reduced
+#   VALUE: the result of the semantic `actions` (which must be picklable)
+TREE = 'tree'
+SUMMARY = 'summary'
+VALUE = 'value'
+
+# Workers receive the CompiledAutomaton once, through the pool initializer;
+# its pickle is just names and integer tables. Each task then carries only
+# an array of terminal numbers (plus the texts, for TREE and VALUE).
+#
+# For TREE, the worker builds the tree and sends it back in the compact
+# pickle of lr.value, so the tree is built in parallel too. Its Terminals
+# are new ones, but they and its rules belong to the caller's grammar.
+
+_worker_compiled = None
+_worker_actions = None
+
+
+def _init_worker(compiled, actions):
+    global _worker_compiled, _worker_actions
+    _worker_compiled = compiled
+    _worker_actions = actions
+
+def _check_end(compiled, state):
+    if state != compiled._final_state:
+        # The input ended before its $eof.
+        raise InputError('end of input', compiled._input_error(state, 0)._good_keys)
+
+def _summary(compiled, syms):
+    action = compiled._action
+    goto = compiled._goto
+    rule_lhs = compiled._rule_lhs
+    rule_lens = compiled._rule_len
+    rule_unit = compiled._rule_unit
+    state_stack = [0]
+    counts = array('l', [0] * len(rule_lens))
+
+    for term in syms:
+        while True:
+            code = action[state_stack[-1]][term]
+            if code > 0:
+                state_stack.append(code)
+                break
+            if not code:
+                raise compiled._input_error(state_stack[-1], term)
+            rule = -code
+            if rule_unit[rule]:
+                state_stack[-1] = goto[state_stack[-2]][rule_lhs[rule]]
+                continue
+            del state_stack[-rule_lens[rule]:]
+            state_stack.append(goto[state_stack[-1]][rule_lhs[rule]])
+            counts[rule] += 1
+    _check_end(compiled, state_stack[-1])
+    return counts
+
+def _work(job):
+    mode, syms, texts = job
+    compiled = _worker_compiled
+    try:
+        if mode == SUMMARY:
+            return _summary(compiled, syms)
+        symbol_data = compiled._grammar._symbols._data
+        runtime = CompiledRuntime(compiled, _worker_actions)
+        runtime.feed_all([Terminal(symbol_data[s]._id, t) for s, t in zip(syms, texts)])
+        _check_end(compiled, runtime._state_stack[-1])
+        return runtime.get()
+    except InputError as e:
+        return e
+
+def iter_parse_many(automaton, inputs, workers=None, mode=TREE, actions=None, chunksize=16, return_errors=False):
+    # `automaton` is an Automaton or CompiledAutomaton; `inputs` is an
+    # iterable of token sequences, each ending with $eof as for Runtime.
+    # Results come back in input order. With workers=0 everything runs in
+    # this process, which is mostly useful as a baseline.
+    if not isinstance(automaton, CompiledAutomaton):
+        automaton = CompiledAutomaton(automaton)
+    assert all(automaton._rule_len), 'empty rule'
+    assert mode in (TREE, SUMMARY, VALUE)
+    assert (actions is not None) == (mode == VALUE)
+
+    def jobs():
+        for toks in inputs:
+            toks = list(toks)
+            syms = array('i', [tok._sym._number for tok in toks])
+            texts = None if mode == SUMMARY else [tok._text for tok in toks]
+            yield mode, syms, texts
+
+    def results(it):
+        for result in it:
+            if isinstance(result, InputError) and not return_errors:
+                raise result
+            yield result
+
+    if workers == 0:
+        _init_worker(automaton, actions)
+        try:
+            yield from results(map(_work, jobs()))
+        finally:
+            _init_worker(None, None)
+        return
+    _register(automaton._grammar)
+    with multiprocessing.Pool(workers, _init_worker, (automaton, actions)) as pool:
+        yield from results(pool.imap(_work, jobs(), chunksize))
+
+def parse_many(automaton, inputs, workers=None, mode=TREE, actions=None, chunksize=16, return_errors=False):
+    return list(iter_parse_many(automaton, inputs, workers, mode, actions, chunksize, return_errors))
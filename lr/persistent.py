@@ -0,0 +1,92 @@
+from .compiled import CompiledAutomaton, _rule_action_table
+from .value import Nonterminal
+
+
+# Like CompiledRuntime, but the state and value stacks are a single
+# immutable linked stack of (state, value, parent) cells, rooted at
+# (0, None, None). Nothing is ever mutated in place, so a snapshot is just
+# the top cell: taking one, restoring one, and forking a runtime are all
+# O(1), and any number of forks share their common prefix.
+
+class PersistentRuntime:
+    __slots__ = ('_compiled', '_rule_actions', '_top')
+
+    def __init__(self, compiled, actions=None):
+        self._compiled = compiled
+        self._rule_actions = _rule_action_table(compiled, actions)
+        self._top = (0, None, None)
+
+    def __repr__(self):
+        return '<PersistentRuntime in state #%d/%d with %d values>' % (self._top[0], len(self._compiled._action), self._depth())
+
+    def _depth(self):
+        depth = 0
+        cell = self._top[2]
+        while cell is not None:
+            depth += 1
+            cell = cell[2]
+        return depth
+
+    def snapshot(self):
+        return self._top
+
+    def restore(self, snapshot):
+        self._top = snapshot
+
+    def fork(self):
+        rv = PersistentRuntime.__new__(PersistentRuntime)
+        rv._compiled = self._compiled
+        rv._rule_actions = self._rule_actions
+        rv._top = self._top
+        return rv
+
+    def feed(self, tok):
+        self.feed_all([tok])
+
+    def feed_all(self, toks):
+        compiled = self._compiled
+        action = compiled._action
+        goto = compiled._goto
+        rule_lhs = compiled._rule_lhs
+        rule_lens = compiled._rule_len
+        rule_ids = compiled._rule_ids
+        rule_syms = compiled._rule_syms
+        rule_unit = compiled._rule_unit
+        rule_actions = self._rule_actions
+        top = self._top
+
+        for tok in toks:
+            term = tok._sym._number
+            before = top
+            while True:
+                code = action[top[0]][term]
+                if code > 0:
+                    top = (code, tok, top)
+                    break
+                if not code:
+                    # Tokens before the bad one stay fed, but reductions
+                    # made with it as lookahead are undone.
+                    self._top = before
+                    raise compiled._input_error(top[0], term)
+                rule = -code
+                if rule_unit[rule]:
+                    below = top[2]
+                    top = (goto[below[0]][rule_lhs[rule]], top[1], below)
+                    continue
+                rule_len = rule_lens[rule]
+                children = [None] * rule_len
+                for i in range(rule_len - 1, -1, -1):
+                    children[i] = top[1]
+                    top = top[2]
+                fn = rule_actions[rule]
+                if fn is None:
+                    value = Nonterminal(rule_ids[rule], children, rule_syms[rule])
+                else:
+                    value = fn(*children)
+                top = (goto[top[0]][rule_lhs[rule]], value, top)
+        self._top = top
+
+    def get(self):
+        assert self._depth() == 2
+        assert self._top[0] == self._compiled._final_state
+        return self._top[2][1]
@@ -0,0 +1,154 @@
+import heapq
+
+from .compiled import CompiledAutomaton
+from .error import InputError
+from .persistent import PersistentRuntime
+from .value import Terminal
+
+
+INSERT = 'insert'
+DELETE = 'delete'
+REPLACE = 'replace'
+
+# Minimal-cost error repair, in the style of Burke-Fisher and CPCT+.
+#
+# When a token fails, a uniform-cost search runs over (stack, input
+# position) pairs. Shifting the next real token is free; deleting it,
+# inserting a terminal before it, or replacing it costs 1. The search stops
+# at the cheapest sequence of edits after which `resync` real tokens shift
+# in a row (or the input is accepted). Stacks are PersistentRuntime cells,
+# so every branch is an O(1) fork.
+#
+# Two tables, precomputed per state, keep the branching down:
+#   `_acceptable`: the terminals that the state does not reject, which are
+#       the only ones worth inserting;
+#   `_completion`: the shortest terminal string that finishes one of the
+#       state's items, which at $eof is inserted as a single edit of its
+#       own length (so a missing `) ) )` costs 3, not a search of depth 3).
+#
+# An edit is (kind, position, old token, new token), with positions in the
+# original input and None for whichever token does not apply.
+
+def _min_yields(grammar):
+    # key: symbol number, value: shortest list of terminal numbers it derives
+    symbols = grammar._symbols
+    rv = {t: [t] for t in range(symbols._num_terminals)}
+    changed = True
+    while changed:
+        changed = False
+        for rule in grammar._data:
+            parts = [rv.get(r._number) for r in rule._rhs]
+            if None in parts:
+                continue
+            candidate = [t for part in parts for t in part]
+            lhs = rule._lhs._number
+            old = rv.get(lhs)
+            if old is None or len(candidate) < len(old):
+                rv[lhs] = candidate
+                changed = True
+    return rv
+
+def _completions(automaton, min_yields):
+    rv = []
+    for state in automaton._data:
+        best = None
+        for item in state._creator._items:
+            rhs = item._rule._data()._rhs
+            if not item._index and item._rule._number:
+                continue
+            rest = [t for r in rhs[item._index:] for t in min_yields[r._number] if t]
+            if rest and (best is None or len(rest) < len(best)):
+                best = rest
+        rv.append(best or [])
+    return rv
+
+class Repairer:
+    __slots__ = ('_compiled', '_rule_actions', '_make_token', '_max_cost', '_max_nodes', '_resync', '_acceptable', '_completion')
+
+    def __init__(self, automaton, actions=None, make_token=None, max_cost=3, max_nodes=10000, resync=3):
+        self._compiled = compiled = CompiledAutomaton(automaton)
+        self._rule_actions = actions
+        symbol_data = automaton._grammar._symbols._data
+        if make_token is None:
+            make_token = lambda sym: Terminal(sym, '')
+        self._make_token = make_token
+        self._max_cost = max_cost
+        self._max_nodes = max_nodes
+        self._resync = resync
+        # Never insert $eof or `error`.
+        skip = {0, automaton._grammar._symbols._numbers.get('error')}
+        self._acceptable = [[symbol_data[t]._id for t, code in enumerate(row) if code and t not in skip] for row in compiled._action]
+        self._completion = [[symbol_data[t]._id for t in c] for c in _completions(automaton, _min_yields(automaton._grammar))]
+
+    def __repr__(self):
+        return '<Repairer for %r>' % (self._compiled,)
+
+    def parse(self, toks):
+        # `toks` must end with $eof. Returns (value, edits).
+        runtime = PersistentRuntime(self._compiled, self._rule_actions)
+        edits = []
+        i = 0
+        while i < len(toks):
+            try:
+                runtime.feed(toks[i])
+            except InputError as e:
+                top, i, fix = self._repair(runtime, toks, i, e)
+                runtime.restore(top)
+                edits.extend(fix)
+                continue
+            i += 1
+        return runtime.get(), edits
+
+    def _repair(self, runtime, toks, pos, e):
+        scratch = runtime.fork()
+        make_token = self._make_token
+        max_cost = self._max_cost
+        resync = self._resync
+        acceptable = self._acceptable
+        completion = self._completion
+        end = len(toks)
+
+        def feed(top, new_toks):
+            scratch.restore(top)
+            try:
+                scratch.feed_all(new_toks)
+            except InputError:
+                return None
+            return scratch.snapshot()
+
+        counter = 0
+        heap = [(0, counter, runtime.snapshot(), pos, (), 0)]
+        for i in range(self._max_nodes):
+            if not heap:
+                break
+            cost, _, top, pos, edits, shifted = heapq.heappop(heap)
+            if edits and (shifted >= resync or pos == end):
+                return top, pos, list(edits)
+            tok = toks[pos]
+            at_eof = not tok._sym._number
+            children = []
+
+            new = feed(top, [tok])
+            if new is not None:
+                children.append((cost, new, pos + 1, edits, shifted + 1))
+            if cost < max_cost:
+                if not at_eof:
+                    children.append((cost + 1, top, pos + 1, edits + ((DELETE, pos, tok, None),), 0))
+                for sym in acceptable[top[0]]:
+                    new_tok = make_token(sym)
+                    new = feed(top, [new_tok])
+                    if new is None:
+                        continue
+                    children.append((cost + 1, new, pos, edits + ((INSERT, pos, None, new_tok),), 0))
+                    if not at_eof and sym is not tok._sym:
+                        children.append((cost + 1, new, pos + 1, edits + ((REPLACE, pos, tok, new_tok),), 0))
+            if at_eof and completion[top[0]]:
+                new_toks = [make_token(sym) for sym in completion[top[0]]]
+                new = feed(top, new_toks)
+                if new is not None:
+                    children.append((cost + len(new_toks), new, pos, edits + tuple([(INSERT, pos, None, t) for t in new_toks]), 0))
+
+            for child in children:
+                counter += 1
+                heapq.heappush(heap, (child[0], counter) + child[1:])
+        raise e
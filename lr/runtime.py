@@ -3,20 +3,85 @@ from .value import Value, Terminal, Nonterminal
 from .error import InputError
 
 
+# `actions` optionally maps rule numbers to callables, which are called
+# with the child values at reduce time (like bison's actions); the result
+# becomes the value on the stack. Other rules build a Nonterminal.
+
+# If the grammar has the `error` terminal, a bad token does not raise;
+# instead, as in bison, the runtime pops states until one can shift
+# `error`, shifts it (as a Terminal with empty text), and retries the token.
+# A token that fails again right after that is discarded (popping back to
+# an `error` shift again), until one fits. Only the first error of a run is
+# recorded in get_errors(); another is only recorded after 3 tokens have
+# been shifted normally. If no state on the stack can shift `error`, or
+# $eof does not fit, the InputError is raised after all.
+
 class Runtime:
-    __slots__ = ('_automaton', '_state_stack', '_value_stack')
+    __slots__ = ('_automaton', '_rule_actions', '_state_stack', '_value_stack', '_error_sym', '_error_status', '_errors')
 
-    def __init__(self, automaton):
+    def __init__(self, automaton, actions=None):
         self._automaton = automaton
+        self._rule_actions = dict(actions or {})
         self._state_stack = [automaton.get_state0()]
         self._value_stack = []
+        symbols = automaton._grammar._symbols
+        self._error_sym = None
+        if 'error' in symbols._numbers:
+            self._error_sym = symbols.get('error', True)
+        # Number of shifts before another error is recorded, like yyerrstatus.
+        self._error_status = 0
+        self._errors = []
 
     def __repr__(self):
         return '<Runtime in state #%d/%d with %d values>' % (self._state_stack[-1]._number, len(self._automaton._data), len(self._value_stack))
 
     def feed_all(self, toks):
+        # Same as calling feed() for each token, but with everything hoisted
+        # out of the loop and without re-checking the stack invariant.
+        state_stack = self._state_stack
+        value_stack = self._value_stack
+        rule_actions = self._rule_actions
+        error_status = self._error_status
+        # key: Reduce, value: (RuleId, rhs length, lhs SymbolId, action)
+        reductions = {}
+
         for tok in toks:
-            self.feed(tok)
+            sym = tok._sym
+            while True:
+                current_state = state_stack[-1]._data()
+                action = current_state._actions.get(sym) or current_state._default
+                if action is None:
+                    self._recover(tok, InputError(sym._data()._name, [a._data()._name for a in current_state._actions]))
+                    error_status = self._error_status
+                    break
+                if action.__class__ is Shift:
+                    value_stack.append(tok)
+                    state_stack.append(action._state)
+                    if error_status:
+                        error_status -= 1
+                        self._error_status = error_status
+                    break
+                try:
+                    rule, rule_len, lhs, fn = reductions[action]
+                except KeyError:
+                    assert isinstance(action, Reduce), 'unknown subclass'
+                    rule = action._rule
+                    rule_data = rule._data()
+                    rule_len = len(rule_data._rhs)
+                    # As in feed(); the slices below need a nonempty rule.
+                    assert len(value_stack) >= rule_len > 0
+                    lhs = rule_data._lhs
+                    fn = rule_actions.get(rule._number)
+                    reductions[action] = rule, rule_len, lhs, fn
+                # The slice is the only copy; assigning the new value over
+                # the same range replaces the del + append pair.
+                if fn is None:
+                    new_value = Nonterminal(rule, value_stack[-rule_len:], lhs)
+                else:
+                    new_value = fn(*value_stack[-rule_len:])
+                value_stack[-rule_len:] = (new_value,)
+                del state_stack[-rule_len:]
+                state_stack.append(state_stack[-1]._data()._gotos[lhs]._state)
 
     def feed(self, tok):
         while True:
@@ -25,16 +90,25 @@ class Runtime:
             try:
                 action = current_state._actions[tok._sym]
             except KeyError:
-                raise InputError(tok._sym._data()._name, [a._data()._name for a in current_state._actions]) from None
+                action = current_state._default
+                if action is None:
+                    self._recover(tok, InputError(tok._sym._data()._name, [a._data()._name for a in current_state._actions]))
+                    return
             if isinstance(action, Shift):
                 self._value_stack.append(tok)
                 self._state_stack.append(action._state)
+                if self._error_status:
+                    self._error_status -= 1
                 return
             if isinstance(action, Reduce):
                 rule = action._rule
                 rule_len = len(rule._data()._rhs)
                 assert len(self._value_stack) >= rule_len > 0
-                new_value = Nonterminal(rule, self._value_stack[-rule_len:])
+                fn = self._rule_actions.get(rule._number)
+                if fn is None:
+                    new_value = Nonterminal(rule, self._value_stack[-rule_len:])
+                else:
+                    new_value = fn(*self._value_stack[-rule_len:])
                 del self._state_stack[-rule_len:]
                 del self._value_stack[-rule_len:]
                 trampoline_state = self._state_stack[-1]
@@ -47,6 +121,62 @@ class Runtime:
                 continue
             assert False, 'unknown subclass' # pragma: no cover
 
+    def expected_bits(self):
+        # The terminals the next token may be, as a bitset (bit t for
+        # terminal t). Default reductions do not depend on the token, so
+        # they are followed first, on a scratch copy of the stack top; but
+        # not the accepting one (rule 0), which LR(0) tables have as the
+        # default of the final state.
+        automaton = self._automaton
+        state_stack = self._state_stack
+        depth = len(state_stack)
+        pushed = []
+        state = state_stack[-1]._data()
+        while state._default is not None and state._default._rule._number != 0:
+            rule_data = state._default._rule._data()
+            rule_len = len(rule_data._rhs)
+            if rule_len <= len(pushed):
+                del pushed[len(pushed) - rule_len:]
+            else:
+                depth -= rule_len - len(pushed)
+                pushed = []
+            base = pushed[-1] if pushed else state_stack[depth - 1]
+            state = base._data()._gotos[rule_data._lhs]._state._data()
+            pushed.append(state._id)
+        return automaton.expected_bits()[state._id._number]
+
+    def _recover(self, tok, e):
+        error_sym = self._error_sym
+        if error_sym is None:
+            raise e from None
+        discard = False
+        if not self._error_status:
+            self._errors.append(e)
+        elif self._error_status == 3:
+            # `tok` failed right after an `error` was shifted.
+            if tok._sym._number == 0:
+                raise e from None
+            discard = True
+        self._error_status = 3
+
+        state_stack = self._state_stack
+        value_stack = self._value_stack
+        while True:
+            action = state_stack[-1]._data()._actions.get(error_sym)
+            if isinstance(action, Shift):
+                break
+            if not value_stack:
+                raise e from None
+            state_stack.pop()
+            value_stack.pop()
+        value_stack.append(Terminal(error_sym, ''))
+        state_stack.append(action._state)
+        if not discard:
+            self.feed(tok)
+
+    def get_errors(self):
+        return self._errors
+
     def get(self):
         assert len(self._state_stack) == 3
         assert self._state_stack[-1]._data()._creator.is_final_state()
@@ -0,0 +1,180 @@
+from .error import AmbiguityError
+from .glr import GlrRuntime
+from .value import Value, Terminal, Nonterminal
+
+
+# Shared packed parse forest.
+#
+# Every reduction under SppfRuntime yields a SymbolNode, whose `_families`
+# are the alternative derivations, each an ordinary Nonterminal whose
+# children are SymbolNodes or Terminals. Where the GLR runtime finds two
+# derivations of the same symbol over the same tokens (from the same stack
+# node), the second is packed into the first SymbolNode instead of getting
+# a stack link of its own, and anything built on top of that node shares
+# it. So the forest has at most one family per (rule, split) for each
+# SymbolNode, and its size is polynomial in the input even when the number
+# of trees is exponential.
+#
+# All the functions here memoize on node identity, so shared subtrees are
+# visited once.
+
+class SymbolNode(Value):
+    __slots__ = ('_families',)
+
+    def __init__(self, sym, families):
+        self._sym = sym
+        self._families = families
+
+    def __repr__(self):
+        if len(self._families) == 1:
+            return repr(self._families[0])
+        return '{%s}' % ' | '.join([repr(f) for f in self._families])
+
+def _builder(rule_id, sym):
+    def build(*children):
+        return SymbolNode(sym, [Nonterminal(rule_id, list(children), sym)])
+    return build
+
+def _pack(old, new):
+    old._families.extend(new._families)
+
+class SppfRuntime(GlrRuntime):
+    __slots__ = ()
+
+    def __init__(self, compiled):
+        actions = {rule: _builder(compiled._rule_ids[rule], compiled._rule_syms[rule]) for rule in range(1, len(compiled._rule_len))}
+        super().__init__(compiled, actions, _pack)
+
+    def __repr__(self):
+        return '<SppfRuntime in states %s>' % (', '.join(['#%d' % h._state for h in self._heads]),)
+
+def count_trees(node, memo=None):
+    if isinstance(node, Terminal):
+        return 1
+    if memo is None:
+        memo = {}
+    # Postorder with an explicit stack, since forests can be deep: a node
+    # is counted once all of its children are.
+    stack = [node]
+    while stack:
+        top = stack[-1]
+        if id(top) in memo:
+            stack.pop()
+            continue
+        pending = [c for f in top._families for c in f._children if not isinstance(c, Terminal) and id(c) not in memo]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        rv = 0
+        for family in top._families:
+            product = 1
+            for child in family._children:
+                if not isinstance(child, Terminal):
+                    product *= memo[id(child)]
+            rv += product
+        memo[id(top)] = rv
+    return memo[id(node)]
+
+def is_ambiguous(node):
+    return count_trees(node) != 1
+
+def iter_trees(node):
+    # Lazily yield every tree as plain Nonterminals; the first one comes
+    # after a single descent, however many there are in total.
+    #
+    # A tree is given by the family chosen at each SymbolNode it visits, in
+    # preorder. The next tree advances the last choice that can be, and
+    # descends again with the choices before it kept.
+    if isinstance(node, Terminal):
+        yield node
+        return
+    choices = []
+    while True:
+        tree, counts = _build_tree(node, choices)
+        yield tree
+        k = len(counts) - 1
+        while k >= 0 and choices[k] + 1 == counts[k]:
+            k -= 1
+        if k < 0:
+            return
+        choices[k] += 1
+        del choices[k + 1:]
+
+def _build_tree(node, choices):
+    # Return the tree for `choices` (extended with 0 where it runs out), and
+    # the number of families at each choice.
+    counts = []
+    # (family, children built so far) for each Nonterminal being built
+    frames = []
+    while True:
+        if isinstance(node, Terminal):
+            built = node
+        else:
+            k = len(counts)
+            if k == len(choices):
+                choices.append(0)
+            counts.append(len(node._families))
+            family = node._families[choices[k]]
+            if family._children:
+                frames.append((family, []))
+                node = family._children[0]
+                continue
+            built = Nonterminal(family._rule, [], family._sym)
+        while frames:
+            family, children = frames[-1]
+            children.append(built)
+            if len(children) < len(family._children):
+                node = family._children[len(children)]
+                break
+            frames.pop()
+            built = Nonterminal(family._rule, children, family._sym)
+        else:
+            return built, counts
+
+def disambiguate(node, choose, memo=None):
+    # `choose(node)` is called for every SymbolNode with more than one
+    # family, and returns the (nonempty) list of families to keep. The
+    # forest is pruned in place; the return value is `node`.
+    if memo is None:
+        memo = set()
+    stack = [node]
+    while stack:
+        top = stack.pop()
+        if isinstance(top, Terminal) or id(top) in memo:
+            continue
+        memo.add(id(top))
+        if len(top._families) > 1:
+            families = choose(top)
+            assert families
+            top._families = list(families)
+        # Preorder, first child first.
+        for family in reversed(top._families):
+            stack.extend(reversed(family._children))
+    return node
+
+def collapse(node):
+    # The plain Nonterminal tree, if there is exactly one; shared subtrees
+    # stay shared.
+    num_trees = count_trees(node)
+    if num_trees != 1:
+        raise AmbiguityError(num_trees)
+    if isinstance(node, Terminal):
+        return node
+    memo = {}
+    # Postorder, as in count_trees.
+    stack = [node]
+    while stack:
+        top = stack[-1]
+        if id(top) in memo:
+            stack.pop()
+            continue
+        [family] = top._families
+        pending = [c for c in family._children if not isinstance(c, Terminal) and id(c) not in memo]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        children = [c if isinstance(c, Terminal) else memo[id(c)] for c in family._children]
+        memo[id(top)] = Nonterminal(family._rule, children, family._sym)
+    return memo[id(node)]
@@ -0,0 +1,110 @@
+import re
+import sys
+import time
+
+from lr.lexer import Lexer
+from lr.tokens import TokenArrays
+
+from .grammar_examples import grammar_parse
+
+
+# Run with: python -m lr.tests.bench_lexer [num_tokens]
+
+grammar = grammar_parse('''
+        Stmts: Stmts Stmt;
+        Stmts: Stmt;
+        Stmt: if Expr then Stmt else Stmt;
+        Stmt: while Expr do Stmt;
+        Stmt: id '=' Expr ';';
+        Expr: Expr '+' Term;
+        Expr: Expr '-' Term;
+        Expr: Expr '==' Term;
+        Expr: Term;
+        Term: Term '*' Atom;
+        Term: Atom;
+        Atom: id;
+        Atom: int;
+        Atom: str;
+        Atom: '(' Expr ')';
+''')
+
+definitions = {
+        'id': '[A-Za-z_][A-Za-z0-9_]*',
+        'int': '[0-9]+',
+        'str': r'"([^"\\]|\\.)*"',
+}
+skip = r'\s+|#[^\n]*'
+
+def source(num_tokens):
+    unit = 'while count_1 == 10 do if x then total = (total + 4096) * y; else name = "a \\"b\\" c" ; # done\n'
+    return unit * max(1, num_tokens // 24)
+
+def dfa(symbols, text):
+    return Lexer(symbols, definitions, skip).tokenize(text)
+
+def re_alternation(symbols, text):
+    # What a hand-written tokenizer does: one alternation of named groups,
+    # run with finditer. The first alternative that matches wins, so the
+    # literals are tried longest first, and the keywords are looked up
+    # after matching `id`.
+    keywords = {}
+    literals = []
+    parts = [('skip', skip)]
+    for data in symbols._data[1:symbols._num_terminals]:
+        number = data._id._number
+        if data._name in definitions:
+            parts.append(('t%d' % number, definitions[data._name]))
+        elif re.match('(%s)$' % definitions['id'], data._name):
+            keywords[data._name] = number
+        else:
+            literals.append((-len(data._name), number, data._name))
+    parts += [('t%d' % number, re.escape(name)) for length, number, name in sorted(literals)]
+    pattern = '|'.join('(?P<%s>%s)' % part for part in parts)
+    if not isinstance(text, str):
+        pattern = pattern.encode()
+        keywords = {k.encode(): v for k, v in keywords.items()}
+    regex = re.compile(pattern)
+    id_number = symbols._numbers['id']
+
+    def matches():
+        pos = 0
+        for m in regex.finditer(text):
+            start, end = m.span()
+            if start != pos:
+                raise ValueError(pos)
+            pos = end
+            name = m.lastgroup
+            if name == 'skip':
+                continue
+            sym = int(name[1:])
+            if sym == id_number:
+                sym = keywords.get(m.group(), sym)
+            yield sym, start, end
+        if pos != len(text):
+            raise ValueError(pos)
+    return TokenArrays.from_matches(symbols, text, matches())
+
+def bench(fun, symbols, text, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        tokens = fun(symbols, text)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return len(tokens), len(text) / best
+
+def main(argv):
+    num_tokens = int(argv[1]) if len(argv) > 1 else 1000000
+    symbols = grammar._symbols
+    text = source(num_tokens)
+    funs = [re_alternation, dfa]
+    assert list(dfa(symbols, text[:1000])._syms) == list(re_alternation(symbols, text[:1000])._syms)
+    print('%-8s %10s %10s %s %8s' % ('input', 'chars', 'tokens', ' '.join('%20s' % f.__name__ for f in funs), 'ratio'))
+    for name, data in [('str', text), ('bytes', text.encode())]:
+        results = [bench(f, symbols, data) for f in funs]
+        rates = [r for n, r in results]
+        print('%-8s %10d %10d %s %7.2fx' % (name, len(data), results[0][0], ' '.join('%13.0f char/s' % r for r in rates), rates[1] / rates[0]))
+
+if __name__ == '__main__':
+    main(sys.argv)
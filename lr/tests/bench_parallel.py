@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+
+from lr.fallback import compute_automaton
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.parallel import parse_many, TREE, SUMMARY
+
+from . import grammar_examples
+from .grammar_examples import input_split
+
+
+# Run with: python -m lr.tests.bench_parallel [num_inputs] [tokens_per_input]
+
+def corpus(num_inputs, tokens_per_input):
+    ex = grammar_examples.slr.example
+    unit = '( int:0 ) + + int:1 * id:a'
+    count = max(1, tokens_per_input // 10)
+    source = ' + '.join([unit] * count)
+    toks = input_split(ex.grammar, source, ':')
+    return ex.grammar, [toks] * num_inputs
+
+def sequential(compiled, inputs):
+    for toks in inputs:
+        runtime = CompiledRuntime(compiled)
+        runtime.feed_all(toks)
+        runtime.get()
+
+def main(argv):
+    num_inputs = int(argv[1]) if len(argv) > 1 else 200
+    tokens_per_input = int(argv[2]) if len(argv) > 2 else 5000
+    grammar, inputs = corpus(num_inputs, tokens_per_input)
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    total = sum(len(toks) for toks in inputs)
+
+    start = time.perf_counter()
+    sequential(compiled, inputs)
+    base = total / (time.perf_counter() - start)
+    print('%-22s %12.0f tok/s' % ('sequential', base))
+
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, cpus})
+    for mode in [SUMMARY, TREE]:
+        for workers in worker_counts:
+            start = time.perf_counter()
+            parse_many(compiled, inputs, workers, mode)
+            rate = total / (time.perf_counter() - start)
+            print('%-22s %12.0f tok/s  %5.2fx' % ('%s, %d workers' % (mode, workers), rate, rate / base))
+
+if __name__ == '__main__':
+    main(sys.argv)
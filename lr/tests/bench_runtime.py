@@ -0,0 +1,91 @@
+import sys
+import time
+
+from lr.fallback import compute_automaton
+from lr.runtime import Runtime
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.glr import GlrRuntime
+from lr.flat import FlatRuntime
+from lr.codegen import generate
+from lr.packed import PackedAutomaton, PackedRuntime
+
+from . import grammar_examples
+from .grammar_examples import input_split
+
+
+# Run with: python -m lr.tests.bench_runtime [num_tokens]
+
+def _repeat(ex, unit, sep, split, num_tokens):
+    unit_len = len(unit.split()) + len(sep.split())
+    count = max(1, num_tokens // unit_len)
+    source = (' %s ' % sep).join([unit] * count)
+    return input_split(ex.grammar, source, split)
+
+def inputs(num_tokens):
+    yield 'slr.example', grammar_examples.slr.example, _repeat(grammar_examples.slr.example, '( int:0 ) + + int:1 * id:a', '+', ':', num_tokens)
+    yield 'slr.ex1', grammar_examples.slr.ex1, _repeat(grammar_examples.slr.ex1, 't', '', None, num_tokens)
+
+def feed_each(automaton, toks):
+    runtime = Runtime(automaton)
+    for tok in toks:
+        runtime.feed(tok)
+    return runtime.get()
+
+def feed_all(automaton, toks):
+    runtime = Runtime(automaton)
+    runtime.feed_all(toks)
+    return runtime.get()
+
+def compiled_feed_all(automaton, toks):
+    runtime = CompiledRuntime(CompiledAutomaton(automaton))
+    runtime.feed_all(toks)
+    return runtime.get()
+
+def compiled_unit_bypass(automaton, toks):
+    runtime = CompiledRuntime(CompiledAutomaton(automaton, unit_bypass=True))
+    runtime.feed_all(toks)
+    return runtime.get()
+
+def glr_feed_all(automaton, toks):
+    runtime = GlrRuntime(CompiledAutomaton(automaton))
+    runtime.feed_all(toks)
+    return runtime.get()
+
+def flat_feed_all(automaton, toks):
+    runtime = FlatRuntime(CompiledAutomaton(automaton))
+    runtime.feed_all(toks)
+    return runtime.get()
+
+def packed_feed_all(automaton, toks):
+    runtime = PackedRuntime(PackedAutomaton(automaton, 'comb'))
+    runtime.feed_all(toks)
+    return runtime.get()
+
+def generated_parse(automaton, toks):
+    # Generating the module is setup, but making the (number, text) pairs
+    # it takes is counted, since the others get ready-made Terminals.
+    namespace = {}
+    exec(compile(generate(automaton), 'generated', 'exec'), namespace)
+    return namespace['parse']([(tok._sym._number, tok._text) for tok in toks])
+
+def bench(fun, automaton, toks, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        fun(automaton, toks)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return len(toks) / best
+
+def main(argv):
+    num_tokens = int(argv[1]) if len(argv) > 1 else 1000000
+    funs = [feed_each, feed_all, compiled_feed_all, compiled_unit_bypass, glr_feed_all, flat_feed_all, packed_feed_all, generated_parse]
+    print('%-12s %10s %s' % ('grammar', 'tokens', ' '.join('%18s' % f.__name__ for f in funs)))
+    for name, ex, toks in inputs(num_tokens):
+        automaton = compute_automaton(ex.grammar)
+        rates = [bench(f, automaton, toks) for f in funs]
+        print('%-12s %10d %s' % (name, len(toks), ' '.join('%13.0f tok/s' % r for r in rates)))
+
+if __name__ == '__main__':
+    main(sys.argv)
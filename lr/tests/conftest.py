@@ -0,0 +1,7 @@
+import sys
+
+
+# lr.aio and its tests use `async def`.
+collect_ignore = []
+if sys.version_info < (3, 5):
+    collect_ignore.append('test_aio.py')
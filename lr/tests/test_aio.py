@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from lr.aio import AsyncRuntime
+from lr.error import InputError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.fallback import compute_automaton
+from lr.runtime import Runtime
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import input_split
+
+
+class _AsyncIter:
+    # Not an async generator, which would need Python 3.6. Yields to the
+    # loop before each item if `pause`, and never ends if `hang`.
+    def __init__(self, items, pause=True, hang=False):
+        self._items = iter(items)
+        self._pause = pause
+        self._hang = hang
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        for item in self._items:
+            if self._pause:
+                await asyncio.sleep(0)
+            return item
+        if self._hang:
+            await asyncio.sleep(3600)
+        raise StopAsyncIteration
+
+def _aiter(toks, batch=None):
+    if batch is None:
+        return _AsyncIter(toks)
+    return _AsyncIter([toks[i:i + batch] for i in range(0, len(toks), batch)])
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+@parm_tests(grammar_examples.slr)
+def test_aio_slr(grammar_and_inputs):
+    grammar = grammar_and_inputs.grammar
+    automaton = compute_automaton(grammar)
+
+    async def parse(input):
+        runtime = AsyncRuntime(Runtime(automaton), batch_size=2)
+        await runtime.feed_async(_aiter(input))
+        return runtime.get()
+
+    async def parse_bad(input):
+        runtime = AsyncRuntime(CompiledRuntime(CompiledAutomaton(automaton)), batch_size=2)
+        await runtime.feed_batches_async(_aiter(input, 3))
+
+    for input, output in grammar_and_inputs.good_inputs:
+        assert repr(_run(parse(input))) == output
+
+    for input in grammar_and_inputs.bad_inputs:
+        with pytest.raises(InputError):
+            _run(parse_bad(input))
+
+def test_aio_concurrent():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    inputs = [input_split(grammar, ' + '.join(['int:%d' % i] * (i + 1)), ':') for i in range(50)]
+
+    async def parse(input):
+        runtime = AsyncRuntime(CompiledRuntime(compiled), batch_size=4)
+        await runtime.feed_batches_async(_aiter(input, 16))
+        return runtime.get()
+
+    async def main():
+        return await asyncio.gather(*[parse(input) for input in inputs])
+
+    trees = _run(main())
+    assert repr(trees[0]) == "...int('0')"
+    assert repr(trees[1]) == "Sums0(...int('1'), '+', ..int('1'))"
+
+def test_aio_cancel():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    toks = input_split(grammar, ' + '.join(['int:1'] * 10), ':')
+    runtime = AsyncRuntime(CompiledRuntime(compiled), batch_size=4)
+    assert repr(runtime) == '<AsyncRuntime with 0 pending for <CompiledRuntime in state #0/16 with 0 values>>'
+
+    async def main():
+        task = asyncio.ensure_future(runtime.feed_async(_AsyncIter(toks[:7], pause=False, hang=True)))
+        for i in range(10):
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    _run(main())
+    assert len(runtime._pending) == 3
+    _run(runtime.feed_async(_aiter(toks[7:])))
+    assert repr(runtime.get()).startswith('Sums0(')
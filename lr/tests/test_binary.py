@@ -0,0 +1,114 @@
+import os
+import struct
+
+import pytest
+
+from lr.automaton import Automaton
+from lr.error import FormatError, InputError
+from lr.compiled import CompiledAutomaton
+from lr.fallback import compute_automaton
+from lr.packed import PackedAutomaton, PackedRuntime
+from lr.binary import save, load, MappedAutomaton
+
+from ._util import parm_tests
+from . import grammar_examples
+
+
+def _check(grammar_and_inputs, path):
+    grammar = grammar_and_inputs.grammar
+    automaton = compute_automaton(grammar)
+
+    for unit_bypass in [False, True]:
+        for layout in ['dense', 'comb']:
+            packed = PackedAutomaton(CompiledAutomaton(automaton, unit_bypass), layout)
+            save(packed, path)
+            loaded = load(path)
+            assert repr(loaded) == repr(packed)
+            for state in range(packed._num_states):
+                assert [loaded.action(state, t) for t in range(packed._num_terminals)] == [packed.action(state, t) for t in range(packed._num_terminals)]
+            for input, output in grammar_and_inputs.good_inputs:
+                expected = PackedRuntime(packed)
+                expected.feed_all(input)
+                runtime = PackedRuntime(loaded)
+                runtime.feed_all(input)
+                assert repr(runtime.get()) == repr(expected.get())
+            for input in grammar_and_inputs.bad_inputs:
+                runtime = PackedRuntime(loaded)
+                with pytest.raises(InputError):
+                    runtime.feed_all(input)
+
+@parm_tests(grammar_examples.lr0)
+def test_binary_lr0(grammar_and_inputs, tmpdir):
+    _check(grammar_and_inputs, str(tmpdir.join('automaton.lr')))
+
+@parm_tests(grammar_examples.slr)
+def test_binary_slr(grammar_and_inputs, tmpdir):
+    _check(grammar_and_inputs, str(tmpdir.join('automaton.lr')))
+
+def test_binary_mapped(tmpdir):
+    ex = grammar_examples.slr.example
+    path = str(tmpdir.join('example.lr'))
+    automaton = compute_automaton(ex.grammar)
+    automaton.save(path)
+    loaded = Automaton.load(path)
+    assert isinstance(loaded, MappedAutomaton)
+    assert loaded._layout == 'comb'
+
+    # The tables are views of the read-only mapping, and the names are
+    # not looked at until needed.
+    assert isinstance(loaded._action_table, memoryview)
+    assert loaded._action_table.readonly
+    assert loaded._lazy is None
+    runtime = PackedRuntime(loaded)
+    runtime.feed_all(ex.good_inputs[0][0])
+    assert repr(runtime.get()) == ex.good_inputs[0][1]
+    assert loaded._grammar._symbols._data[1]._name == '+'
+    assert loaded._rule_ids[1]._data()._alt_number == 0
+
+def test_binary_bad_files(tmpdir):
+    path = tmpdir.join('bad.lr')
+    save(compute_automaton(grammar_examples.slr.ex1.grammar), str(path))
+    good = path.read_binary()
+
+    def check(data, message):
+        path.write_binary(data)
+        with pytest.raises(FormatError) as e:
+            load(str(path))
+        assert str(e.value).startswith(message)
+
+    check(b'', 'empty')
+    check(good[:10], 'truncated')
+    check(b'XXXX' + good[4:], 'magic')
+    check(good[:4] + b'\x63' + good[5:], 'version 99')
+    check(good[:-1] + bytes([good[-1] ^ 1]), 'checksum')
+    # The checksum covers the header too: flags, the checksum itself,
+    # and the number of sections.
+    for i in [8, 12, 16]:
+        check(good[:i] + bytes([good[i] ^ 1]) + good[i + 1:], 'checksum')
+
+    path.write_binary(good[:-1] + bytes([good[-1] ^ 1]))
+    assert load(str(path), verify=False)._num_states == 6
+
+    # Without the checksum, the header is still checked...
+    def check_unverified(data, message):
+        path.write_binary(data)
+        with pytest.raises(FormatError) as e:
+            load(str(path), verify=False)
+        assert str(e.value).startswith(message)
+
+    check_unverified(good[:8] + b'\x03' + good[9:], 'flags 0x3')
+    check_unverified(good[:8] + b'\x01' + good[9:], '9 sections')
+    check_unverified(good[:16] + b'\x63' + good[17:], '99 sections')
+    check_unverified(good[:60], 'truncated')
+    # ... and so are the sections: one past the end, or not of int32s.
+    check_unverified(good[:28] + struct.pack('<Q', len(good)) + good[36:], 'truncated')
+    check_unverified(good[:28] + struct.pack('<Q', 2) + good[36:], 'section 0')
+
+def test_binary_save_fails(tmpdir, monkeypatch):
+    def fail(src, dst):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        save(compute_automaton(grammar_examples.slr.ex1.grammar), str(tmpdir.join('a.lr')))
+    # The temporary file is gone too.
+    assert os.listdir(str(tmpdir)) == []
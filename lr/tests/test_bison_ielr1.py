@@ -97,13 +97,13 @@ def test_bison_ielr1_repr_automaton_lr0():
   <bison.ItemSet #0, size 2
     < $accept → • Root $eof ∥ >
     < Root → • term ∥ >
->>, <StateData #1 with 1 actions, 0 gotos
+>>, <StateData #1 with 0 actions, 0 gotos
   <bison.ItemSet #1, size 1
-    < Root → term • ∥ { $eof } >
+    < Root → term • ∥ >
 >>, <StateData #2 with 1 actions, 0 gotos
   <bison.ItemSet #2, size 1
     < $accept → Root • $eof ∥ >
->>, <StateData #3 with 2 actions, 0 gotos
+>>, <StateData #3 with 0 actions, 0 gotos
   <bison.ItemSet #3, size 1
     < $accept → Root $eof • ∥ >
 >>]
@@ -116,8 +116,10 @@ def test_bison_ielr1_repr_automaton_lr0():
 >>>
 '''.strip().replace('•', _mdot).replace('∥', _parallel)
     assert repr(next(iter(automaton._data[0]._actions.values()))) == 'Shift(<state 1>)'
-    assert repr(next(iter(automaton._data[1]._actions.values()))) == 'Reduce(<rule 1>)'
+    assert automaton._data[1]._actions == {}
+    assert repr(automaton._data[1]._default) == 'Reduce(<rule 1>)'
     assert repr(next(iter(automaton._data[0]._gotos.values()))) == 'Goto(<state 2>)'
+    assert repr(automaton._data[3]._default) == 'Reduce(<rule 0>)'
 
 def test_bison_ielr1_repr_automaton_lalr():
     ex = grammar_examples.lalr.ex1
@@ -160,27 +162,27 @@ def test_bison_ielr1_repr_automaton_lalr():
 >>, <StateData #6 with 1 actions, 0 gotos
   <bison.ItemSet #6, size 1
     < S → b D • c ∥ >
->>, <StateData #7 with 1 actions, 0 gotos
+>>, <StateData #7 with 0 actions, 0 gotos
   <bison.ItemSet #7, size 1
-    < S → d c • ∥ { $eof } >
->>, <StateData #8 with 6 actions, 0 gotos
+    < S → d c • ∥ >
+>>, <StateData #8 with 0 actions, 0 gotos
   <bison.ItemSet #8, size 1
     < $accept → S $eof • ∥ >
->>, <StateData #9 with 1 actions, 0 gotos
+>>, <StateData #9 with 0 actions, 0 gotos
   <bison.ItemSet #9, size 1
-    < A → a • ∥ { $eof } >
->>, <StateData #10 with 1 actions, 0 gotos
+    < A → a • ∥ >
+>>, <StateData #10 with 0 actions, 0 gotos
   <bison.ItemSet #10, size 1
-    < A → e • ∥ { $eof } >
->>, <StateData #11 with 1 actions, 0 gotos
+    < A → e • ∥ >
+>>, <StateData #11 with 0 actions, 0 gotos
   <bison.ItemSet #11, size 1
-    < S → D A • ∥ { $eof } >
->>, <StateData #12 with 1 actions, 0 gotos
+    < S → D A • ∥ >
+>>, <StateData #12 with 0 actions, 0 gotos
   <bison.ItemSet #12, size 1
-    < S → b d A • ∥ { $eof } >
->>, <StateData #13 with 1 actions, 0 gotos
+    < S → b d A • ∥ >
+>>, <StateData #13 with 0 actions, 0 gotos
   <bison.ItemSet #13, size 1
-    < S → b D c • ∥ { $eof } >
+    < S → b D c • ∥ >
 >>]
     '''.strip().replace('•', _mdot).replace('∥', _parallel)
     assert repr(automaton._data[0]._id) == '''
@@ -240,21 +242,21 @@ def test_bison_ielr1_repr_automaton_lr1():
 >>, <StateData #8 with 1 actions, 0 gotos
   <bison.ItemSet #8, size 1
     < S → b F • c ∥ >
->>, <StateData #9 with 6 actions, 0 gotos
+>>, <StateData #9 with 0 actions, 0 gotos
   <bison.ItemSet #9, size 1
     < $accept → S $eof • ∥ >
->>, <StateData #10 with 1 actions, 0 gotos
+>>, <StateData #10 with 0 actions, 0 gotos
   <bison.ItemSet #10, size 1
-    < S → a E c • ∥ { $eof } >
->>, <StateData #11 with 1 actions, 0 gotos
+    < S → a E c • ∥ >
+>>, <StateData #11 with 0 actions, 0 gotos
   <bison.ItemSet #11, size 1
-    < S → a F d • ∥ { $eof } >
->>, <StateData #12 with 1 actions, 0 gotos
+    < S → a F d • ∥ >
+>>, <StateData #12 with 0 actions, 0 gotos
   <bison.ItemSet #12, size 1
-    < S → b E d • ∥ { $eof } >
->>, <StateData #13 with 1 actions, 0 gotos
+    < S → b E d • ∥ >
+>>, <StateData #13 with 0 actions, 0 gotos
   <bison.ItemSet #13, size 1
-    < S → b F c • ∥ { $eof } >
+    < S → b F c • ∥ >
 >>, <StateData #14 with 2 actions, 0 gotos
   <bison.ItemSet #14, size 2
     < E → e • ∥ { d } >
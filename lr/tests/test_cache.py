@@ -0,0 +1,238 @@
+import os
+import threading
+import time
+
+import pytest
+
+from lr import cache as cache_mod
+from lr.binary import MappedAutomaton
+from lr.cache import DiskCache, MemoryCache, fingerprint, algorithms as cache_algorithms
+from lr.compiled import CompiledRuntime
+from lr.error import GrammarError
+from lr.fallback import compute_automaton
+from lr.packed import PackedRuntime
+from lr.value import Terminal
+
+from . import grammar_examples
+from .grammar_examples import grammar_parse
+
+
+_sums = '''
+        Sums: Sums '+' Products;
+        Sums: Products;
+        Products: Products '*' Value;
+        Products: Value;
+        Value: '+' Value;
+        Value: int;
+        Value: id;
+        Value: '(' Sums ')';
+'''
+
+def test_fingerprint(monkeypatch):
+    grammar = grammar_parse(_sums)
+    key = fingerprint(grammar, 'slr')
+    assert len(key) == 64
+    assert fingerprint(grammar_parse(_sums), 'slr') == key
+    assert fingerprint(grammar, 'fallback') != key
+    assert fingerprint(grammar_parse(_sums.replace('Value: id;\n', '')), 'slr') != key
+    assert fingerprint(grammar_parse(_sums.replace("'*'", "'/'")), 'slr') != key
+    with pytest.raises(KeyError):
+        fingerprint(grammar, 'lr7')
+
+    # For bison, its version is part of the key (running bison needs lxml).
+    monkeypatch.setattr(cache_mod, '_bison_version', 'bison (GNU Bison) 3.0.4')
+    key = fingerprint(grammar, 'lalr')
+    assert fingerprint(grammar, 'ielr') != key
+    monkeypatch.setattr(cache_mod, '_bison_version', 'bison (GNU Bison) 3.8.2')
+    assert fingerprint(grammar, 'lalr') != key
+
+def test_disk_cache(tmpdir):
+    ex = grammar_examples.slr.example
+    cache = DiskCache(str(tmpdir))
+    for i in range(2):
+        grammar = grammar_parse(_sums)
+        packed = cache.compute_automaton(grammar, 'slr')
+        assert packed._grammar is grammar
+        runtime = PackedRuntime(packed)
+        runtime.feed_all(ex.good_inputs[0][0])
+        assert repr(runtime.get()) == ex.good_inputs[0][1]
+    assert isinstance(packed, MappedAutomaton)
+    assert (cache._hits, cache._misses) == (1, 1)
+    assert repr(cache) == '<DiskCache at %r with 1 hits, 1 misses>' % str(tmpdir)
+    assert os.listdir(str(tmpdir)) == [fingerprint(grammar, 'slr') + '.lr']
+
+    # A bad entry is replaced.
+    path = tmpdir.join(os.listdir(str(tmpdir))[0])
+    path.write_binary(path.read_binary()[:-3])
+    packed = cache.compute_automaton(grammar, 'slr')
+    assert not isinstance(packed, MappedAutomaton)
+    assert (cache._hits, cache._misses) == (1, 2)
+    assert isinstance(cache.compute_automaton(grammar, 'slr'), MappedAutomaton)
+
+    # So is one with a corrupt header (flags, checksum or section count).
+    for i in [8, 12, 16]:
+        good = path.read_binary()
+        path.write_binary(good[:i] + bytes([good[i] ^ 1]) + good[i + 1:])
+        assert not isinstance(cache.compute_automaton(grammar, 'slr'), MappedAutomaton)
+        assert path.read_binary() == good
+    assert (cache._hits, cache._misses) == (2, 5)
+
+    cache.clear()
+    assert os.listdir(str(tmpdir)) == []
+
+def test_disk_cache_eviction(tmpdir):
+    grammars = [grammar_parse(_sums.replace('int', name)) for name in ['a', 'b', 'c']]
+    cache = DiskCache(str(tmpdir))
+    paths = []
+    for i, grammar in enumerate(grammars[:2]):
+        cache.compute_automaton(grammar, 'slr')
+        paths.append(str(tmpdir.join(fingerprint(grammar, 'slr') + '.lr')))
+        os.utime(paths[-1], (1000 + i, 1000 + i))
+    size = os.path.getsize(paths[0])
+
+    # Using `a` makes `b` the least recently used.
+    cache.compute_automaton(grammars[0], 'slr')
+    cache._max_bytes = 2 * size
+    cache.compute_automaton(grammars[2], 'slr')
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])
+    assert len(os.listdir(str(tmpdir))) == 2
+
+def test_disk_cache_races(tmpdir, monkeypatch):
+    # Other processes may remove or replace any file at any time.
+    grammars = [grammar_parse(_sums.replace('int', name)) for name in ['a', 'b']]
+    cache = DiskCache(str(tmpdir))
+    tmpdir.join('notes.txt').write('not an entry')
+    cache.compute_automaton(grammars[0], 'slr')
+    paths = [str(tmpdir.join(fingerprint(g, 'slr') + '.lr')) for g in grammars]
+
+    # A listed entry that is gone by the time it is looked at.
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: listdir(path) + ['gone.lr'])
+    assert [path for mtime, size, path in cache._entries()] == paths[:1]
+    cache._remove(str(tmpdir.join('gone.lr')))
+    monkeypatch.undo()
+
+    # A hit whose file cannot be touched still counts.
+    def fail(path, times=None):
+        raise PermissionError(path)
+    monkeypatch.setattr(os, 'utime', fail)
+    assert isinstance(cache.compute_automaton(grammars[0], 'slr'), MappedAutomaton)
+    assert cache._hits == 1
+    monkeypatch.undo()
+
+    # The entry just written is kept, even if it looks the oldest.
+    os.utime(paths[0], (4e9, 4e9))
+    cache._max_bytes = 1
+    cache.compute_automaton(grammars[1], 'slr')
+    assert sorted(os.listdir(str(tmpdir))) == sorted([os.path.basename(paths[1]), 'notes.txt'])
+    cache.clear()
+    assert os.listdir(str(tmpdir)) == ['notes.txt']
+
+def test_disk_cache_threads(tmpdir):
+    ex = grammar_examples.slr.example
+    results = []
+
+    def work():
+        cache = DiskCache(str(tmpdir))
+        for i in range(5):
+            results.append(cache.compute_automaton(grammar_parse(_sums), 'fallback' if i % 2 else 'slr'))
+
+    threads = [threading.Thread(target=work) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 20
+    assert sorted(os.listdir(str(tmpdir))) == sorted(fingerprint(ex.grammar, a) + '.lr' for a in ['fallback', 'slr'])
+
+def test_memory_cache():
+    ex = grammar_examples.slr.example
+    cache = MemoryCache(max_entries=2)
+    for i in range(2):
+        grammar = grammar_parse(_sums)
+        compiled = cache.compute_automaton(grammar, 'slr')
+        assert compiled._grammar is grammar
+        # Tokens from the caller's grammar give the caller's Nonterminals.
+        toks = [Terminal(grammar._symbols._data[t._sym._number]._id, t._text) for t in ex.good_inputs[0][0]]
+        runtime = CompiledRuntime(compiled)
+        runtime.feed_all(toks)
+        tree = runtime.get()
+        assert repr(tree) == ex.good_inputs[0][1]
+        assert tree._rule._info() is grammar
+    assert (cache._hits, cache._misses) == (1, 1)
+    assert repr(cache) == '<MemoryCache with 1 entries, %d bytes, 1 hits, 1 misses>' % cache._nbytes
+
+    first = cache.compute_automaton(grammar, 'slr')
+    assert cache.compute_automaton(grammar, 'slr', unit_bypass=True)._rule_unit != first._rule_unit
+    cache.compute_automaton(grammar, 'fallback')
+    assert len(cache) == 2
+    assert cache._evictions == 1
+    # The slr entry was the least recently used.
+    cache.compute_automaton(grammar, 'slr')
+    assert cache._misses == 4
+
+    cache = MemoryCache(max_bytes=1)
+    cache.compute_automaton(grammar, 'slr')
+    cache.compute_automaton(grammar, 'fallback')
+    assert len(cache) == 1
+    cache.clear()
+    assert (len(cache), cache._nbytes) == (0, 0)
+
+def test_memory_cache_single_flight(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def slow(grammar):
+        calls.append(grammar)
+        release.wait()
+        if len(grammar._data) < 4:
+            raise GrammarError('too small')
+        return compute_automaton(grammar)
+    monkeypatch.setitem(cache_algorithms, 'slow', slow)
+
+    cache = MemoryCache()
+    grammars = [grammar_parse(_sums) for i in range(8)]
+    results = [None] * len(grammars)
+
+    def work(i):
+        results[i] = cache.compute_automaton(grammars[i], 'slow')
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(len(grammars))]
+    for t in threads:
+        t.start()
+    while cache._waits + cache._misses < len(grammars):
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert (cache._misses, cache._waits) == (1, 7)
+    assert [r._grammar for r in results] == grammars
+    assert len({id(r._action) for r in results}) == 1
+
+    # A failed build is not cached, and its waiters see the error.
+    release.clear()
+    errors = [None] * 4
+
+    def fail(i):
+        try:
+            cache.compute_automaton(grammar_parse('A: a;'), 'slow')
+        except GrammarError as e:
+            errors[i] = e
+    threads = [threading.Thread(target=fail, args=(i,)) for i in range(len(errors))]
+    for t in threads:
+        t.start()
+    while cache._waits + cache._misses < len(grammars) + len(errors):
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 2
+    assert (cache._misses, cache._waits) == (2, 10)
+    assert all(e is errors[0] for e in errors)
+    assert str(errors[0]) == 'too small'
+
+    with pytest.raises(GrammarError):
+        cache.compute_automaton(grammar_parse('A: a;'), 'slow')
+    assert len(calls) == 3
+    assert cache._flights == {}
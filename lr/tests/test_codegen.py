@@ -0,0 +1,95 @@
+import subprocess
+import sys
+
+import pytest
+
+from lr.error import InputError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.fallback import compute_automaton
+from lr.codegen import generate
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import input_split
+
+
+def _load(source):
+    namespace = {'__name__': 'generated'}
+    exec(compile(source, 'generated', 'exec'), namespace)
+    return namespace
+
+def _pairs(toks):
+    return [(tok._sym._number, tok._text) for tok in toks]
+
+def _check(grammar_and_inputs):
+    grammar = grammar_and_inputs.grammar
+    automaton = compute_automaton(grammar)
+    generated = _load(generate(automaton))
+    assert generate(CompiledAutomaton(automaton)) == generate(automaton)
+
+    for input, output in grammar_and_inputs.good_inputs:
+        assert repr(generated['parse'](_pairs(input))) == output
+
+    for input in grammar_and_inputs.bad_inputs:
+        runtime = CompiledRuntime(CompiledAutomaton(automaton))
+        with pytest.raises(InputError) as expected:
+            runtime.feed_all(input)
+        with pytest.raises(generated['ParseError']) as e:
+            generated['parse'](_pairs(input))
+        assert str(e.value) == str(expected.value)
+
+@parm_tests(grammar_examples.lr0)
+def test_codegen_lr0(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+@parm_tests(grammar_examples.slr)
+def test_codegen_slr(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+def test_codegen_conflicts():
+    grammar = grammar_examples.ambiguous.evil1_grammar
+    compiled = CompiledAutomaton(compute_automaton(grammar, keep_conflicts=True))
+    generated = _load(generate(compiled))
+    toks = input_split(grammar, 'term', None)
+
+    # The conflict is an error, but still listed as expected.
+    runtime = CompiledRuntime(compiled)
+    with pytest.raises(InputError) as expected:
+        runtime.feed_all(toks)
+    with pytest.raises(generated['ParseError']) as e:
+        generated['parse'](_pairs(toks))
+    assert str(e.value) == str(expected.value) == 'got $eof; expected one of $eof'
+
+def test_codegen_actions():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    generated = _load(generate(compute_automaton(grammar)))
+    terminals = generated['TERMINALS']
+    assert terminals['+'] == grammar._symbols.get("'+'", True)._number
+
+    actions = {
+            1: lambda a, op, b: a + b,
+            2: lambda a: a,
+            3: lambda a, op, b: a * b,
+            4: lambda a: a,
+            5: lambda op, a: a,
+            6: lambda tok: int(tok._text),
+            8: lambda l, a, r: a,
+    }
+    toks = input_split(grammar, '( int:2 + int:3 ) * int:4 + + int:1', ':')
+    assert generated['parse'](_pairs(toks), actions) == 21
+
+def test_codegen_standalone(tmpdir):
+    grammar = grammar_examples.slr.example.grammar
+    tmpdir.join('sums_parser.py').write(generate(compute_automaton(grammar)))
+    script = '''if 1:
+        import sys
+        sys.path.insert(0, '.')
+        import sums_parser as p
+        t = p.TERMINALS
+        print(p.parse([(t['int'], '1'), (t['+'], '+'), (t['id'], 'x'), (t['$eof'], '')]))
+        assert not any(m == 'lr' or m.startswith('lr.') for m in sys.modules)
+    '''
+    # -E -s rather than -I, which needs 3.4.
+    out = subprocess.check_output([sys.executable, '-E', '-s', '-c', script], cwd=str(tmpdir))
+    assert out.decode() == "Sums0(...int('1'), '+', ..id('x'))\n"
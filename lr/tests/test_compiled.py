@@ -0,0 +1,160 @@
+import pytest
+
+from lr.error import GrammarError, InputError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.fallback import compute_automaton
+from lr.runtime import Runtime
+from lr.value import Nonterminal
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import input_split
+from .test_runtime import calc_actions, nested_grammar, stmts_grammar
+
+
+def _collapse_units(value):
+    if not isinstance(value, Nonterminal):
+        return value
+    if len(value._children) == 1:
+        return _collapse_units(value._children[0])
+    return Nonterminal(value._rule, [_collapse_units(c) for c in value._children])
+
+def _check(grammar_and_inputs, unit_bypass=False):
+    grammar = grammar_and_inputs.grammar
+    automaton = compute_automaton(grammar)
+    compiled = CompiledAutomaton(automaton, unit_bypass)
+
+    for input, output in grammar_and_inputs.good_inputs:
+        runtime = CompiledRuntime(compiled)
+        runtime.feed_all(input)
+        if unit_bypass:
+            reference = Runtime(automaton)
+            reference.feed_all(input)
+            output = repr(_collapse_units(reference.get()))
+        assert repr(runtime.get()) == output
+
+        runtime = CompiledRuntime(compiled)
+        for tok in input:
+            runtime.feed(tok)
+        assert repr(runtime.get()) == output
+
+    for input in grammar_and_inputs.bad_inputs:
+        runtime = CompiledRuntime(compiled)
+        runtime.feed_all(input[:-1])
+        with pytest.raises(InputError):
+            runtime.feed(input[-1])
+
+@parm_tests(grammar_examples.lr0)
+def test_compiled_lr0(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+@parm_tests(grammar_examples.slr)
+def test_compiled_slr(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+@parm_tests(grammar_examples.lr0)
+def test_compiled_unit_bypass_lr0(grammar_and_inputs):
+    _check(grammar_and_inputs, True)
+
+@parm_tests(grammar_examples.slr)
+def test_compiled_unit_bypass_slr(grammar_and_inputs):
+    _check(grammar_and_inputs, True)
+
+def test_compiled_unit_bypass_tables():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    input, output = ex.good_inputs[0]
+
+    compiled = CompiledAutomaton(compute_automaton(grammar), True)
+    assert compiled._rule_unit == [False, False, True, False, True, False, True, True, False]
+    runtime = CompiledRuntime(compiled)
+    runtime.feed_all(input)
+    assert repr(runtime.get()) == "Sums0(Value3('(', int('0'), ')'), '+', Products0(Value0('+', int('1')), '*', id('a')))"
+
+def test_compiled_tables():
+    ex = grammar_examples.lr0.ex_minimal1
+    grammar = ex.grammar
+
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    assert repr(compiled) == '<CompiledAutomaton with 4 states, 2 terminals, 2 rules>'
+    assert compiled._action == [[0, 1], [-1, -1], [3, 0], [0, 0]]
+    assert compiled._goto == [[0, 2], [0, 0], [0, 0], [0, 0]]
+    assert compiled._rule_lhs == [0, 1]
+    assert compiled._rule_len == [2, 1]
+    assert compiled._final_state == 3
+
+def test_compiled_repr_runtime():
+    ex = grammar_examples.lr0.ex_minimal1
+    grammar = ex.grammar
+    input, output = ex.good_inputs[0]
+
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    runtime = CompiledRuntime(compiled)
+    assert repr(runtime) == '<CompiledRuntime in state #0/4 with 0 values>'
+    runtime.feed(input[0])
+    assert repr(runtime) == '<CompiledRuntime in state #1/4 with 1 values>'
+    runtime.feed(input[1])
+    assert repr(runtime) == '<CompiledRuntime in state #3/4 with 2 values>'
+
+def test_compiled_error_message():
+    ex = grammar_examples.lr0.ex_kern
+    grammar = ex.grammar
+
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    runtime = CompiledRuntime(compiled)
+    runtime.feed(ex.good_inputs[0][0][0])
+    with pytest.raises(InputError) as e:
+        runtime.feed(ex.good_inputs[0][0][0])
+    assert str(e.value) == 'got a; expected one of c'
+
+def test_compiled_actions():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    automaton = compute_automaton(grammar)
+    toks = input_split(grammar, '( int:2 ) + + int:3 * id:a * ( int:1 + int:1 )', ':')
+
+    runtime = CompiledRuntime(CompiledAutomaton(automaton), calc_actions)
+    runtime.feed_all(toks)
+    assert runtime.get() == 44
+
+    runtime = CompiledRuntime(CompiledAutomaton(automaton), calc_actions)
+    for tok in toks:
+        runtime.feed(tok)
+    assert runtime.get() == 44
+
+    with pytest.raises(GrammarError):
+        CompiledRuntime(CompiledAutomaton(automaton, True), calc_actions)
+    runtime = CompiledRuntime(CompiledAutomaton(automaton, True), {8: calc_actions[8]})
+    runtime.feed_all(input_split(grammar, '( int:2 ) + + int:3 * ( int:1 + int:1 )', ':'))
+    assert repr(runtime.get()) == "Sums0(int('2'), '+', Products0(Value0('+', int('3')), '*', Sums0(int('1'), '+', int('1'))))"
+
+@pytest.mark.parametrize('unit_bypass', [False, True])
+def test_compiled_error_recovery(unit_bypass):
+    grammar = stmts_grammar
+    automaton = compute_automaton(grammar)
+    compiled = CompiledAutomaton(automaton, unit_bypass)
+
+    for source in ['x ; x x = ; x = x ; = = ; x ;', 'x x ; = ; x ;']:
+        toks = input_split(grammar, source, None)
+        expected = Runtime(automaton)
+        expected.feed_all(toks)
+
+        runtime = CompiledRuntime(compiled)
+        runtime.feed_all(toks)
+        assert repr(_collapse_units(runtime.get())) == repr(_collapse_units(expected.get()))
+        assert [str(e) for e in runtime.get_errors()] == [str(e) for e in expected.get_errors()]
+
+        runtime = CompiledRuntime(compiled)
+        for tok in toks:
+            runtime.feed(tok)
+        assert repr(_collapse_units(runtime.get())) == repr(_collapse_units(expected.get()))
+
+    runtime = CompiledRuntime(compiled)
+    with pytest.raises(InputError):
+        runtime.feed_all(input_split(grammar, 'x ; x', None))
+
+    runtime = CompiledRuntime(CompiledAutomaton(compute_automaton(nested_grammar), unit_bypass))
+    with pytest.raises(InputError) as e:
+        runtime.feed_all(input_split(nested_grammar, ') x', None))
+    assert str(e.value) == "got ); expected one of ("
+    assert runtime.get_errors() == [e.value]
@@ -0,0 +1,77 @@
+import pytest
+
+from lr.error import InputError
+from lr.compiled import CompiledAutomaton
+from lr.events import EventRuntime, SHIFT, REDUCE
+from lr.fallback import compute_automaton
+from lr.value import Nonterminal
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import input_split
+
+
+def _replay(events):
+    stack = []
+    for event in events:
+        if event[0] == SHIFT:
+            stack.append(event[1])
+            continue
+        assert event[0] == REDUCE
+        rule, rule_len = event[1:]
+        children = stack[-rule_len:]
+        del stack[-rule_len:]
+        stack.append(Nonterminal(rule, children))
+    assert len(stack) == 2
+    return stack[0]
+
+def _check(grammar_and_inputs):
+    grammar = grammar_and_inputs.grammar
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+
+    for input, output in grammar_and_inputs.good_inputs:
+        runtime = EventRuntime(compiled)
+        events = list(runtime.iter_events(input))
+        assert runtime.accepted()
+        assert repr(_replay(events)) == output
+
+    for input in grammar_and_inputs.bad_inputs:
+        runtime = EventRuntime(compiled)
+        runtime.feed_all(input[:-1], lambda event: None)
+        assert not runtime.accepted()
+        with pytest.raises(InputError):
+            runtime.feed(input[-1], lambda event: None)
+
+@parm_tests(grammar_examples.lr0)
+def test_events_lr0(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+@parm_tests(grammar_examples.slr)
+def test_events_slr(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+def test_events_bounded():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    toks = input_split(grammar, ' + '.join(['int:1 * ( id:a )'] * 1000), ':')
+
+    runtime = EventRuntime(CompiledAutomaton(compute_automaton(grammar)))
+    depth = 0
+    counts = {SHIFT: 0, REDUCE: 0}
+    for event in runtime.iter_events(toks):
+        counts[event[0]] += 1
+        depth = max(depth, len(runtime._state_stack))
+    assert runtime.accepted()
+    assert counts[SHIFT] == len(toks)
+    assert depth < 10
+
+def test_events_unit_bypass():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    input, output = ex.good_inputs[0]
+
+    runtime = EventRuntime(CompiledAutomaton(compute_automaton(grammar), True))
+    events = []
+    runtime.feed_all(input, events.append)
+    assert repr(runtime) == '<EventRuntime in state #15/16 with depth 2>'
+    assert repr(_replay(events)) == "Sums0(Value3('(', int('0'), ')'), '+', Products0(Value0('+', int('1')), '*', id('a')))"
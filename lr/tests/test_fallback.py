@@ -4,6 +4,7 @@ from lr.error import InputError, LoweringError
 from lr.grammar import Grammar
 from lr.runtime import Runtime
 from lr.fallback import compute_automaton
+from lr import lalr, lr1
 
 from ._util import parm_tests
 from . import grammar_examples
@@ -87,3 +88,16 @@ def test_fallback_ambiguous(grammar_and_inputs):
     grammar = grammar_and_inputs
     with pytest.raises(LoweringError):
         automaton = compute_automaton(grammar)
+
+def test_fallback_keep_conflicts(monkeypatch):
+    # Frontends that cannot keep conflicts are never asked to.
+    def fail(grammar):
+        raise LoweringError('no')
+    monkeypatch.setattr(lalr, 'compute_automaton', fail)
+    monkeypatch.setattr(lr1, 'compute_automaton', fail)
+    grammar = grammar_examples.ambiguous.evil1_grammar
+    with pytest.raises(LoweringError) as e:
+        compute_automaton(grammar)
+    assert str(e.value) == 'no'
+    automaton = compute_automaton(grammar, keep_conflicts=True)
+    assert any(s._conflicts for s in automaton._data)
@@ -0,0 +1,108 @@
+import tracemalloc
+
+import pytest
+
+from lr.error import InputError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.fallback import compute_automaton
+from lr.flat import FlatTree, FlatNode, FlatRuntime
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import input_split
+
+
+def _check(grammar_and_inputs):
+    grammar = grammar_and_inputs.grammar
+    automaton = compute_automaton(grammar)
+
+    for unit_bypass in [False, True]:
+        compiled = CompiledAutomaton(automaton, unit_bypass)
+        for input, output in grammar_and_inputs.good_inputs:
+            expected = CompiledRuntime(compiled)
+            expected.feed_all(input)
+            expected = repr(expected.get())
+            if not unit_bypass:
+                assert expected == output
+
+            runtime = FlatRuntime(compiled)
+            runtime.feed_all(input)
+            tree = runtime.get()
+            assert repr(tree.root()) == expected
+            assert repr(tree.to_tree()) == expected
+            clone = FlatTree.from_tree(grammar, tree.to_tree())
+            assert repr(clone.root()) == expected
+            assert clone._rules == tree._rules
+            assert clone._sizes == tree._sizes
+            assert clone._starts == tree._starts
+            assert clone._ends == tree._ends
+
+        for input in grammar_and_inputs.bad_inputs:
+            runtime = FlatRuntime(compiled)
+            runtime.feed_all(input[:-1])
+            with pytest.raises(InputError):
+                runtime.feed(input[-1])
+            # Only the tokens before the bad one are in the tree.
+            runtime = FlatRuntime(compiled)
+            with pytest.raises(InputError):
+                runtime.feed_all(input)
+            assert runtime._tree._tokens == input[:-1]
+
+@parm_tests(grammar_examples.lr0)
+def test_flat_lr0(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+@parm_tests(grammar_examples.slr)
+def test_flat_slr(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+def test_flat_navigation():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    runtime = FlatRuntime(CompiledAutomaton(compute_automaton(grammar)))
+    toks = input_split(grammar, '( int:2 ) + + int:3 * id:a', ':')
+    runtime.feed_all(toks[:2])
+    assert repr(runtime) == '<FlatRuntime in state #2/16 with 2 values>'
+    runtime.feed_all(toks[2:])
+    tree = runtime.get()
+    assert repr(tree) == '<FlatTree with 12 nonterminals, 9 tokens>'
+
+    root = tree.root()
+    assert isinstance(root, FlatNode)
+    assert root._sym._data()._name == 'Sums'
+    assert root._rule._number == 1
+    assert root._span() == (0, 8)
+    left, plus, right = root._children
+    assert plus is toks[3]
+    assert left._span() == (0, 3)
+    assert right._span() == (4, 8)
+    assert right._children[2]._children[0] is toks[7]
+
+def test_flat_memory():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    toks = input_split(grammar, ' + '.join(['( int:2 ) * id:a'] * 2000), ':')
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        runtime = CompiledRuntime(compiled)
+        runtime.feed_all(toks)
+        objects = runtime.get()
+        object_bytes = tracemalloc.get_traced_memory()[0] - before
+        del runtime
+
+        before = tracemalloc.get_traced_memory()[0]
+        runtime = FlatRuntime(compiled)
+        runtime.feed_all(toks)
+        flat = runtime.get()
+        flat_bytes = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    # The flat tree still has a list of (shared) tokens.
+    assert flat_bytes * 5 < object_bytes
+    assert flat._nbytes() * 7 < object_bytes
+    clone = FlatTree.from_tree(grammar, objects)
+    assert clone._rules == flat._rules
+    assert clone._ends == flat._ends
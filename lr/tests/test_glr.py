@@ -0,0 +1,218 @@
+import pickle
+
+import pytest
+
+from lr.error import AmbiguityError, InputError, LoweringError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr import fallback, lr0, slr
+from lr.glr import GlrRuntime
+from lr.value import Nonterminal
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import input_split, grammar_parse
+from .test_runtime import calc_actions
+
+
+def _check(grammar_and_inputs, compute_automaton):
+    grammar = grammar_and_inputs.grammar
+    compiled = CompiledAutomaton(compute_automaton(grammar, keep_conflicts=True))
+
+    for input, output in grammar_and_inputs.good_inputs:
+        runtime = GlrRuntime(compiled)
+        runtime.feed_all(input)
+        assert repr(runtime.get()) == output
+
+    for input in grammar_and_inputs.bad_inputs:
+        runtime = GlrRuntime(compiled)
+        runtime.feed_all(input[:-1])
+        with pytest.raises(InputError):
+            runtime.feed(input[-1])
+
+@parm_tests(grammar_examples.lr0)
+def test_glr_lr0(grammar_and_inputs):
+    _check(grammar_and_inputs, lr0.compute_automaton)
+
+@parm_tests(grammar_examples.slr)
+def test_glr_slr(grammar_and_inputs):
+    _check(grammar_and_inputs, lr0.compute_automaton)
+    _check(grammar_and_inputs, slr.compute_automaton)
+
+@parm_tests(grammar_examples.lalr)
+def test_glr_lalr(grammar_and_inputs):
+    _check(grammar_and_inputs, slr.compute_automaton)
+
+@parm_tests(grammar_examples.lr1)
+def test_glr_lr1(grammar_and_inputs):
+    _check(grammar_and_inputs, fallback.compute_automaton)
+
+@parm_tests(grammar_examples.lr2)
+def test_glr_lr2(grammar_and_inputs):
+    _check(grammar_and_inputs, fallback.compute_automaton)
+
+def test_glr_keep_conflicts():
+    grammar = grammar_examples.ambiguous.evil1_grammar
+    with pytest.raises(LoweringError):
+        fallback.compute_automaton(grammar)
+    automaton = fallback.compute_automaton(grammar, keep_conflicts=True)
+    conflicts = [s._conflicts for s in automaton._data if s._conflicts]
+    assert len(conflicts) == 1
+    [(sym, acts)] = conflicts[0].items()
+    assert sym._data()._name == '$eof'
+    assert repr(acts) == '[Reduce(<rule 3>), Reduce(<rule 4>)]'
+
+    compiled = CompiledAutomaton(automaton)
+    assert list(compiled._conflicts.values()) == [(-3, -4)]
+    clone = pickle.loads(pickle.dumps(compiled))
+    assert clone._conflicts == compiled._conflicts
+
+    # The deterministic runtimes treat a conflict as an error.
+    toks = input_split(grammar, 'term', None)
+    runtime = CompiledRuntime(compiled)
+    runtime.feed(toks[0])
+    with pytest.raises(InputError) as e:
+        runtime.feed(toks[1])
+    assert str(e.value) == 'got $eof; expected one of $eof'
+
+    runtime = GlrRuntime(compiled)
+    runtime.feed_all(toks)
+    assert [repr(v) for v in runtime.get_all()] == ["..'term'", "..'term'"]
+    assert sorted(v._children[0]._sym._data()._name for v in runtime.get_all()) == ['A', 'B']
+    with pytest.raises(AmbiguityError) as e:
+        runtime.get()
+    assert str(e.value) == '2 parses'
+    e = pickle.loads(pickle.dumps(e.value))
+    assert str(e) == '2 parses'
+
+def test_glr_ambiguous():
+    grammar = grammar_examples.ambiguous.evil2_grammar
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+    runtime = GlrRuntime(compiled)
+    runtime.feed_all(input_split(grammar, "Val + Val * Val", None))
+    assert sorted(repr(v) for v in runtime.get_all()) == [
+        "Expr0(Expr1('Val', '+', .'Val'), '*', 'Val')",
+        "Expr1('Val', '+', Expr0(.'Val', '*', 'Val'))",
+    ]
+
+    runtime = GlrRuntime(compiled)
+    runtime.feed_all(input_split(grammar, "Val + Val + Val * Val * Val", None))
+    # Each parse picks an order to take the 2 `+` and 2 `*` from the ends.
+    assert len(runtime.get_all()) == 6
+
+    runtime = GlrRuntime(compiled)
+    with pytest.raises(InputError) as e:
+        runtime.feed_all(input_split(grammar, "Val + Val * *", None))
+    assert str(e.value) == 'got *; expected one of Val'
+
+def test_glr_dangling_else():
+    grammar = grammar_parse('''
+        S: if c S;
+        S: if c S else S;
+        S: x;
+    ''')
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+    assert len(compiled._conflicts) == 1
+    runtime = GlrRuntime(compiled)
+    runtime.feed_all(input_split(grammar, 'if c if c x else x', None))
+    assert sorted(repr(v) for v in runtime.get_all()) == [
+        "S0('if', 'c', S1('if', 'c', .'x', 'else', .'x'))",
+        "S1('if', 'c', S0('if', 'c', .'x'), 'else', .'x')",
+    ]
+    # Lengthy deterministic stretches stay on the fast path.
+    runtime = GlrRuntime(compiled)
+    runtime.feed_all(input_split(grammar, ' '.join(['if c'] * 100 + ['x']), None))
+    assert repr(runtime) == '<GlrRuntime in states #%d>' % compiled._final_state
+    assert len(runtime.get_all()) == 1
+
+def test_glr_actions():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    compiled = CompiledAutomaton(slr.compute_automaton(grammar, keep_conflicts=True))
+    runtime = GlrRuntime(compiled, calc_actions)
+    runtime.feed_all(input_split(grammar, '( int:2 ) + + int:3 * id:a', ':'))
+    assert runtime.get() == 23
+
+def test_glr_split_heads():
+    grammar = grammar_parse('''
+        S: A x y;
+        S: B x z;
+        A: a;
+        B: a;
+    ''')
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+    toks = input_split(grammar, 'a x z', None)
+    runtime = GlrRuntime(compiled)
+    runtime.feed_all(toks[:2])
+    assert len(runtime._heads) == 2
+    assert runtime.get_all() == []
+    runtime.feed_all(toks[2:])
+    assert repr(runtime.get()) == "S1(.'a', 'x', 'z')"
+
+    # Each head expects something else.
+    runtime = GlrRuntime(compiled)
+    runtime.feed_all(toks[:2])
+    with pytest.raises(InputError) as e:
+        runtime.feed(toks[1])
+    assert str(e.value) == 'got x; expected one of z, y'
+
+def test_glr_empty_rules():
+    def parse(source, text):
+        grammar = grammar_parse(source)
+        runtime = GlrRuntime(CompiledAutomaton(lr0.compute_automaton(grammar, keep_conflicts=True)))
+        runtime.feed_all(input_split(grammar, text, None))
+        return sorted(repr(v) for v in runtime.get_all())
+
+    # On the single-head fast path.
+    assert parse('''
+        A: A x;
+        A: ;
+    ''', 'x x') == ["A0(A0(A1(), 'x'), 'x')"]
+
+    # An empty reduction in a conflict, before a shift...
+    opt = '''
+        S: Opt a;
+        S: Opt b;
+        Opt: ;
+        Opt: a;
+    '''
+    assert parse(opt, 'a') == ["S0(Opt0(), 'a')"]
+    assert parse(opt, 'a b') == ["S1(.'a', 'b')"]
+    # ... or two of them.
+    assert parse('''
+        S: A a;
+        S: B a;
+        A: ;
+        B: ;
+    ''', 'a') == ["S0(A0(), 'a')", "S1(B0(), 'a')"]
+
+    # Paths through several empty links, and links added to nodes that
+    # were already processed.
+    assert parse('''
+        S: E E E x;
+        S: F x;
+        E: ;
+        F: ;
+        F: E E;
+    ''', 'x') == ["S0(E0(), E0(), E0(), 'x')", "S1(F0(), 'x')", "S1(F1(E0(), E0()), 'x')"]
+
+def test_glr_deep():
+    grammar = grammar_parse('''
+        L: x L;
+        L: x;
+        L: y y;
+        L: y;
+        L: y L;
+    ''')
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+    runtime = GlrRuntime(compiled)
+    # Both parses of the tail reduce all the way down in _step, which must
+    # not recurse on the depth of the stack.
+    runtime.feed_all(input_split(grammar, ' '.join(['x'] * 3000 + ['y', 'y']), None))
+    values = runtime.get_all()
+    assert len(values) == 2
+    for value in values:
+        depth = 0
+        while isinstance(value._children[-1], Nonterminal):
+            depth += 1
+            value = value._children[-1]
+        assert depth in (3000, 3001)
@@ -89,6 +89,15 @@ def test_symbol_contents():
         '''.split(), '''
             a--b
         '''.split())
+    symbols = SymbolsInfo('''
+        error
+    '''.split(), '''
+    '''.split())
+    with pytest.raises(SymbolError):
+        symbols = SymbolsInfo('''
+        '''.split(), '''
+            error
+        '''.split())
 
 def test_symbol_sets():
     with pytest.raises(SymbolError):
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from lr.error import InputError
+from lr.compiled import CompiledAutomaton
+from lr.fallback import compute_automaton
+from lr.incremental import IncrementalParser, IncrementalNonterminal
+from lr.runtime import Runtime
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import input_split
+
+
+def _full(automaton, toks):
+    runtime = Runtime(automaton)
+    runtime.feed_all(toks)
+    return runtime.get()
+
+@parm_tests(grammar_examples.slr)
+def test_incremental_slr(grammar_and_inputs):
+    grammar = grammar_and_inputs.grammar
+    parser = IncrementalParser(CompiledAutomaton(compute_automaton(grammar)))
+
+    for input, output in grammar_and_inputs.good_inputs:
+        tree = parser.parse(input)
+        assert repr(tree) == output
+        assert parser._last_shifted == len(input)
+
+    for input in grammar_and_inputs.bad_inputs:
+        with pytest.raises(InputError):
+            parser.parse(input)
+
+def test_incremental_edits():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    automaton = compute_automaton(grammar)
+    parser = IncrementalParser(CompiledAutomaton(automaton))
+    rng = random.Random(42)
+    operands = ['int:1', 'id:a', '( int:2 * id:b )', '+ int:3', '( ( id:c ) )']
+    operators = ['+', '*']
+
+    def gen(n):
+        words = [rng.choice(operands)]
+        for i in range(n):
+            words.append(rng.choice(operators))
+            words.append(rng.choice(operands))
+        return ' '.join(words)
+
+    source = gen(30)
+    toks = input_split(grammar, source, ':')
+    tree = parser.parse(toks)
+    assert isinstance(tree, IncrementalNonterminal)
+    assert tree._num_tokens == len(toks) - 1
+
+    for i in range(50):
+        # Replace one operand (keeping operators) by another expression.
+        words = source.split(' ')
+        op_positions = [j for j, w in enumerate(words) if w in operators and words[j - 1] != '(']
+        j = rng.choice(op_positions)
+        k = j + 1
+        depth = 0
+        while True:
+            depth += words[k].count('(') - words[k].count(')')
+            if depth == 0 and words[k] not in ('+',):
+                break
+            k += 1
+        replacement = gen(rng.randrange(3))
+        new_words = words[:j + 1] + replacement.split(' ') + words[k + 1:]
+        new_toks = input_split(grammar, ' '.join(new_words), ':')
+        tree = parser.reparse(tree, j + 1, k + 1, new_toks[j + 1:j + 1 + len(replacement.split(' '))])
+        assert repr(tree) == repr(_full(automaton, new_toks))
+        source = ' '.join(new_words)
+
+def test_incremental_reuse():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    parser = IncrementalParser(CompiledAutomaton(compute_automaton(grammar)))
+    assert repr(parser) == '<IncrementalParser for <CompiledAutomaton with 16 states, 7 terminals, 9 rules>>'
+    toks = input_split(grammar, ' + '.join(['( int:1 * id:a )'] * 100), ':')
+    tree = parser.parse(toks)
+    assert parser._last_shifted == len(toks)
+
+    # Replace `id:a` in the middle group by `int:7`.
+    middle = 50 * 6 + 3
+    assert toks[middle]._text == 'a'
+    new_tok = input_split(grammar, 'int:7', ':')[0]
+    new_tree = parser.reparse(tree, middle, middle + 1, [new_tok])
+    # Every other group is reused whole; only the edited group and the `+`
+    # tokens along the left-recursive spine get shifted again.
+    assert parser._last_shifted < len(toks) // 5
+    new_toks = toks[:middle] + [new_tok] + toks[middle + 1:]
+    assert repr(new_tree) == repr(parser.parse(new_toks))
+
+    # Pure insertion and deletion at the end.
+    tail = input_split(grammar, '* int:2', ':')[:-1]
+    grown = parser.reparse(new_tree, len(toks) - 1, len(toks) - 1, tail)
+    assert repr(grown) == repr(parser.parse(new_toks[:-1] + tail + new_toks[-1:]))
+    shrunk = parser.reparse(grown, len(toks) - 1, len(toks) + 1, [])
+    assert repr(shrunk) == repr(new_tree)
+
+    with pytest.raises(InputError):
+        parser.reparse(new_tree, 0, 1, [])
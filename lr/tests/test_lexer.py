@@ -0,0 +1,252 @@
+import mmap
+import pickle
+
+import pytest
+
+from lr.error import GrammarError, InputError, LexError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr import lr0
+from lr.fallback import compute_automaton
+from lr.flat import FlatRuntime
+from lr.lexer import Lexer, Literal
+from lr.runtime import Runtime
+from lr.tokens import SpanTerminal
+
+from . import grammar_examples
+from .grammar_examples import grammar_parse
+
+
+def _names(tokens):
+    return [repr(t) for t in tokens]
+
+def test_lexer_example():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    lexer = Lexer(grammar._symbols, {'int': '[0-9]+', 'id': '[a-z]+'}, skip=r'\s+')
+    assert repr(lexer) == '<Lexer with 8 states, 14 classes>'
+    expected = ex.good_inputs[0][1]
+
+    for source in ['(0) + +1 * a', b'(0)++1*a ']:
+        tokens = lexer.tokenize(source)
+        assert _names(tokens) == ["'('", "int('0')", "')'", "'+'", "'+'", "int('1')", "'*'", "id('a')", "'$eof'"]
+        runtime = Runtime(compute_automaton(grammar))
+        runtime.feed_all(tokens)
+        assert repr(runtime.get()) == expected
+
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    runtime = FlatRuntime(compiled)
+    tokens = lexer.tokenize('(0) + +1 * a')
+    runtime.feed_arrays(tokens)
+    assert runtime.get().root()._source_span() == (0, 12)
+
+    with pytest.raises(LexError) as e:
+        lexer.tokenize('1 + 2 - 3')
+    assert str(e.value) == 'no token at offset 6'
+    assert str(pickle.loads(pickle.dumps(e.value))) == str(e.value)
+
+def test_lexer_keywords():
+    grammar = grammar_parse('''
+            Stmt: if Expr then Stmt;
+            Stmt: id '=' Expr;
+            Stmt: id ':=' Expr;
+            Expr: id '==' id;
+            Expr: num;
+    ''')
+    symbols = grammar._symbols
+    lexer = Lexer(symbols, {
+            'id': r'[a-zA-Z_]\w*',
+            'num': r'-?[0-9]+(\.[0-9]*)?|0x[0-9a-f]+',
+            "':='": Literal('<-'),
+    }, skip=r'([ \t\n]|#[^\n]*)+')
+
+    tokens = lexer.tokenize('if iffy==if_ then then_<-0x1f # if\nelse=-1.5')
+    assert _names(tokens) == [
+            "'if'", "id('iffy')", "'=='", "id('if_')", "'then'",
+            "id('then_')", ":=('<-')", "num('0x1f')",
+            "id('else')", "'='", "num('-1.5')", "'$eof'",
+    ]
+    assert list(tokens._starts) == [0, 3, 7, 9, 13, 18, 23, 25, 35, 39, 40, 44]
+
+    runtime = CompiledRuntime(CompiledAutomaton(compute_automaton(grammar)))
+    runtime.feed_all(lexer.tokenize('if a == b then if c==d then x := 1'.replace(':=', '<-')))
+    assert repr(runtime.get()) == "Stmt0('if', Expr0(id('a'), '==', id('b')), 'then', Stmt0('if', Expr0(id('c'), '==', id('d')), 'then', Stmt2(id('x'), :=('<-'), .num('1'))))"
+
+    with pytest.raises(LexError) as e:
+        lexer.tokenize('x = .5')
+    assert e.value._pos == 4
+
+def test_lexer_regex():
+    grammar = grammar_parse('''
+            Words: Words word;
+            Words: word;
+    ''')
+    assert repr(Literal('<-')) == "Literal('<-')"
+    lexer = Lexer(grammar._symbols, {'word': r'\x3c.\u00bb'}, skip=r'\n')
+    tokens = lexer.tokenize('<a»<»»\n<\t»')
+    assert _names(tokens) == ["word('<a»')", "word('<»»')", "word('<\\t»')", "'$eof'"]
+    with pytest.raises(LexError):
+        lexer.tokenize('<\n»')
+
+def test_lexer_unicode():
+    grammar = grammar_parse('''
+            Words: Words word;
+            Words: word;
+    ''')
+    lexer = Lexer(grammar._symbols, {'word': r'[^\s,.]+|«[^»]*»'}, skip=r'[\s,.—]+')
+    source = 'Grüße, «a b» — 日本語.'
+    tokens = lexer.tokenize(source)
+    assert _names(tokens) == ["word('Grüße')", "word('«a b»')", "word('日本語')", "'$eof'"]
+    assert list(tokens._ends) == [5, 12, 18, 19]
+
+def test_lexer_stream():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    lexer = Lexer(grammar._symbols, {'int': '[0-9]+', 'id': '[a-z]+'}, skip=r'\s+')
+    source = b' + '.join([b'(10) * abc'] * 20)
+    expected = lexer.tokenize(source)
+
+    for chunk_size in [1, 3, 7, 1000]:
+        batches = list(lexer.stream(memoryview(source), chunk_size))
+        assert all(b._source.obj is source for b in batches)
+        syms = [s for b in batches for s in b._syms]
+        starts = [s for b in batches for s in b._starts]
+        ends = [s for b in batches for s in b._ends]
+        assert syms == list(expected._syms)
+        assert starts == list(expected._starts)
+        assert ends == list(expected._ends)
+        assert [b._syms[-1] for b in batches if len(b)].count(0) == 1
+
+    assert list(lexer.stream(b'', 10))[0]._syms.tolist() == [0]
+
+    # Tokens can keep offsets into the source instead of their text.
+    runtime = Runtime(compute_automaton(grammar))
+    for batch in lexer.stream(source, 16):
+        runtime.feed_all(batch.spans())
+    tree = runtime.get()
+    tok = tree._children[2]._children[2]._children[0]
+    assert isinstance(tok, SpanTerminal)
+    assert (tok._start, tok._end, tok._text) == (len(source) - 3, len(source), 'abc')
+    assert repr(tok) == "id('abc')"
+
+def test_lexer_stream_mmap(tmpdir):
+    # New in 3.4.
+    tracemalloc = pytest.importorskip('tracemalloc')
+    grammar = grammar_parse('''
+            Lines: Lines Line;
+            Lines: Line;
+            Line: key '=' value nl;
+    ''')
+    lexer = Lexer(grammar._symbols, {'key': r'[a-z.]+', 'value': r'"[^"\n]*"', 'nl': r'\n'}, skip=' +')
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    # Keep a count instead of a tree, so nothing grows with the input.
+    actions = {}
+    for data in grammar._data:
+        name = data._lhs._data()._name
+        if name == 'Line':
+            actions[data._id._number] = lambda key, eq, value, nl: 1
+        elif name == 'Lines':
+            actions[data._id._number] = lambda *children: sum(children)
+
+    def parse(path):
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            runtime = CompiledRuntime(compiled, actions)
+            tracemalloc.start()
+            try:
+                for batch in lexer.stream(source, 4096):
+                    runtime.feed_all(batch.spans())
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            return runtime.get(), peak
+
+    sizes = []
+    for num_lines in [1000, 10000]:
+        path = tmpdir.join('%d.conf' % num_lines)
+        path.write_binary(b'some.key = "a value"\n' * num_lines)
+        count, peak = parse(str(path))
+        assert count == num_lines
+        sizes.append(peak)
+    # Ten times the input, but about the same peak.
+    assert sizes[1] < sizes[0] * 2
+
+def _bit_names(symbols, bits):
+    return [d._name for d in symbols._data if bits >> d._id._number & 1]
+
+def test_expected_bits():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    symbols = grammar._symbols
+    automaton = compute_automaton(grammar)
+    runtime = Runtime(automaton)
+    compiled = CompiledRuntime(CompiledAutomaton(automaton))
+    assert _bit_names(symbols, runtime.expected_bits()) == ['+', 'int', 'id', '(']
+
+    seen = []
+    for tok in ex.good_inputs[0][0]:
+        bits = runtime.expected_bits()
+        assert compiled.expected_bits() == bits
+        assert bits >> tok._sym._number & 1
+        seen.append(_bit_names(symbols, bits))
+        runtime.feed(tok)
+        compiled.feed(tok)
+    # After `( int`, default reductions lead to `Sums: Products .`, whose
+    # SLR lookaheads are not exact.
+    assert seen[2] == ['$eof', '+', '*', ')']
+    assert seen[-1] == ['$eof', '+', '*', ')']
+
+def test_expected_bits_final():
+    # LR(0) tables accept by a default reduction of rule 0 in the final
+    # state, which is not followed after $eof.
+    ex = grammar_examples.lr0.ex_kern
+    automaton = lr0.compute_automaton(ex.grammar)
+    runtime = Runtime(automaton)
+    compiled = CompiledRuntime(CompiledAutomaton(automaton))
+    toks = ex.good_inputs[0][0]
+    runtime.feed_all(toks)
+    compiled.feed_all(toks)
+    assert runtime.expected_bits() == compiled.expected_bits() == 0
+
+def test_lexer_context():
+    grammar = grammar_parse('''
+            Stmts: Stmts Stmt;
+            Stmts: Stmt;
+            Stmt: print Expr ';';
+            Stmt: id '=' Expr ';';
+            Expr: id;
+            Expr: int;
+    ''')
+    lexer = Lexer(grammar._symbols, {'id': '[a-z]+', 'int': '[0-9]+'}, skip=' +')
+    automaton = compute_automaton(grammar)
+    source = 'print print; x = print; print 1;'
+
+    # A keyword everywhere, so `print print` is not valid.
+    runtime = Runtime(automaton)
+    with pytest.raises(InputError):
+        runtime.feed_all(lexer.tokenize(source))
+
+    for runtime in [Runtime(automaton), CompiledRuntime(CompiledAutomaton(automaton))]:
+        runtime.feed_all(lexer.context(runtime, source))
+        assert repr(runtime.get()) == "Stmts0(Stmts0(.Stmt0('print', .id('print'), ';'), Stmt1(id('x'), '=', .id('print'), ';')), Stmt0('print', .int('1'), ';'))"
+    assert len(lexer._restricted) == 5
+
+    # With nothing allowed matching, the full DFA lexes the bad token.
+    runtime = Runtime(automaton)
+    with pytest.raises(InputError) as e:
+        runtime.feed_all(lexer.context(runtime, 'x = 1 ='))
+    assert str(e.value) == "got =; expected one of ;"
+    with pytest.raises(LexError):
+        runtime.feed_all(lexer.context(Runtime(automaton), '+'))
+    runtime = Runtime(automaton)
+    with pytest.raises(LexError) as e:
+        runtime.feed_all(lexer.context(runtime, 'x = 日'))
+    assert e.value._pos == 4
+
+@pytest.mark.parametrize('pattern', ['(a', 'a)', '*a', '[a', '[z-a]', r'\q', r'\xzz', 'a{2}'])
+def test_lexer_bad_regex(pattern):
+    grammar = grammar_parse('''
+            Words: word;
+    ''')
+    with pytest.raises(GrammarError):
+        Lexer(grammar._symbols, {'word': pattern})
+    with pytest.raises(GrammarError):
+        Lexer(grammar._symbols, {'other': 'x'})
@@ -67,13 +67,13 @@ def test_lr0_repr_automaton():
   <lr0.ItemSet #0, kernel 1/2, ← () [initial]
   * < $accept → • Root $eof >
   + < Root → • term >
->>, <StateData #1 with 2 actions, 0 gotos
+>>, <StateData #1 with 0 actions, 0 gotos
   <lr0.ItemSet #1, kernel 1/1, ← (0)
   * < Root → term • >
 >>, <StateData #2 with 1 actions, 0 gotos
   <lr0.ItemSet #2, kernel 1/1, ← (0) [penultimate]
   * < $accept → Root • $eof >
->>, <StateData #3 with 2 actions, 0 gotos
+>>, <StateData #3 with 0 actions, 0 gotos
   <lr0.ItemSet #3, kernel 1/1, ← (2) [final]
   * < $accept → Root $eof • >
 >>]
@@ -86,7 +86,8 @@ def test_lr0_repr_automaton():
 >>>
 '''.strip().replace('•', _mdot)
     assert repr(next(iter(automaton._data[0]._actions.values()))) == 'Shift(<state 1>)'
-    assert repr(next(iter(automaton._data[1]._actions.values()))) == 'Reduce(<rule 1>)'
+    assert repr(automaton._data[1]._default) == 'Reduce(<rule 1>)'
+    assert repr(automaton._data[3]._default) == 'Reduce(<rule 0>)'
     assert repr(next(iter(automaton._data[0]._gotos.values()))) == 'Goto(<state 2>)'
 
 def test_lr0_repr_runtime():
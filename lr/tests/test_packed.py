@@ -0,0 +1,90 @@
+import pytest
+
+from lr.error import GrammarError, InputError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.fallback import compute_automaton
+from lr.packed import PackedAutomaton, PackedRuntime
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import grammar_parse, input_split
+from .test_runtime import calc_actions
+
+
+def _check_tables(compiled, packed):
+    for state, (action_row, goto_row) in enumerate(zip(compiled._action, compiled._goto)):
+        assert [packed.action(state, t) for t in range(len(action_row))] == action_row
+        for nonterminal, goto in enumerate(goto_row):
+            if goto:
+                assert packed.goto(state, nonterminal) == goto
+
+def _check(grammar_and_inputs):
+    grammar = grammar_and_inputs.grammar
+    automaton = compute_automaton(grammar)
+
+    for unit_bypass in [False, True]:
+        compiled = CompiledAutomaton(automaton, unit_bypass)
+        for layout in ['dense', 'comb']:
+            packed = PackedAutomaton(compiled, layout)
+            _check_tables(compiled, packed)
+            for input, output in grammar_and_inputs.good_inputs:
+                expected = CompiledRuntime(compiled)
+                expected.feed_all(input)
+                runtime = PackedRuntime(packed)
+                runtime.feed_all(input)
+                assert repr(runtime.get()) == repr(expected.get())
+
+            for input in grammar_and_inputs.bad_inputs:
+                expected = CompiledRuntime(compiled)
+                with pytest.raises(InputError) as e:
+                    expected.feed_all(input)
+                runtime = PackedRuntime(packed)
+                runtime.feed_all(input[:-1])
+                with pytest.raises(InputError) as e2:
+                    runtime.feed(input[-1])
+                assert str(e2.value) == str(e.value)
+
+@parm_tests(grammar_examples.lr0)
+def test_packed_lr0(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+@parm_tests(grammar_examples.slr)
+def test_packed_slr(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+def test_packed_actions():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    toks = input_split(grammar, '( int:2 ) + + int:3 * id:a', ':')
+    for layout in ['dense', 'comb']:
+        runtime = PackedRuntime(PackedAutomaton(compute_automaton(grammar), layout), calc_actions)
+        runtime.feed_all(toks[:2])
+        assert repr(runtime) == '<PackedRuntime in state #2/16 with 2 values>'
+        runtime.feed_all(toks[2:])
+        assert runtime.get() == 23
+
+def test_packed_layout():
+    ex = grammar_examples.slr.ex1
+    packed = PackedAutomaton(compute_automaton(ex.grammar))
+    assert repr(packed) == '<PackedAutomaton with 6 states, dense layout, 1.0x smaller>'
+
+    # Many keywords make wide, mostly empty rows.
+    lines = ['Stmts: Stmts Stmt;', 'Stmts: Stmt;']
+    for i in range(50):
+        lines.append("Stmt: kw%s Expr ';';" % ''.join(chr(ord('a') + int(d)) for d in str(i)))
+    lines += ["Expr: Expr '+' Atom;", 'Expr: Atom;', 'Atom: id;', "Atom: '(' Expr ')';"]
+    grammar = grammar_parse('\n'.join(lines))
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    packed = PackedAutomaton(compiled)
+    assert packed._layout == 'comb'
+    assert packed.compression_ratio() > 5
+    assert packed._comb_nbytes() * packed.compression_ratio() == pytest.approx(packed._dense_nbytes())
+    _check_tables(compiled, packed)
+
+    toks = input_split(grammar, "kwb ( id + id ) ; kwea id ;", None)
+    runtime = PackedRuntime(packed, {grammar._data[-2]._id._number: lambda tok: tok._text})
+    runtime.feed_all(toks)
+    assert repr(runtime.get()) == "Stmts0(.Stmt1('kwb', .Atom1('(', Expr0(.'id', '+', 'id'), ')'), ';'), Stmt40('kwea', .'id', ';'))"
+
+    with pytest.raises(GrammarError):
+        PackedRuntime(PackedAutomaton(CompiledAutomaton(compute_automaton(grammar), unit_bypass=True)), {grammar._data[-2]._id._number: len})
@@ -0,0 +1,98 @@
+import pickle
+
+import pytest
+
+from lr.error import InputError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.fallback import compute_automaton
+from lr.parallel import parse_many, TREE, SUMMARY, VALUE
+
+from . import grammar_examples
+from .grammar_examples import input_split
+from .test_runtime import calc_actions
+
+
+def _int(tok):
+    return int(tok._text)
+
+def _add(a, op, b):
+    return a + b
+
+def _same(a):
+    return a
+
+_actions = {1: _add, 2: _same, 4: _same, 6: _int}
+
+
+def _inputs(grammar):
+    return [input_split(grammar, ' + '.join(['int:%d' % i] * (i % 7 + 1)), ':') for i in range(40)]
+
+def test_compiled_pickle():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    input, output = ex.good_inputs[0]
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+
+    clone = pickle.loads(pickle.dumps(compiled))
+    assert repr(clone) == repr(compiled)
+    assert clone._action == compiled._action
+    assert clone._goto == compiled._goto
+    assert repr(clone._grammar) == repr(grammar)
+    runtime = CompiledRuntime(clone, calc_actions)
+    runtime.feed_all(input_split(clone._grammar, '( int:2 ) + + int:3 * id:a', ':'))
+    assert runtime.get() == 23
+
+def test_input_error_pickle():
+    e = pickle.loads(pickle.dumps(InputError('a', ['b', 'c'])))
+    assert str(e) == 'got a; expected one of b, c'
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_parallel_modes(workers):
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    automaton = compute_automaton(grammar)
+    inputs = _inputs(grammar)
+
+    expected = []
+    for input in inputs:
+        runtime = CompiledRuntime(CompiledAutomaton(automaton))
+        runtime.feed_all(input)
+        expected.append(repr(runtime.get()))
+
+    trees = parse_many(automaton, inputs, workers, chunksize=3)
+    assert [repr(t) for t in trees] == expected
+    # The trees come back from the workers, but with the caller's grammar.
+    leaf = trees[1]._children[0]._children[0]._children[0]._children[0]
+    assert leaf._sym is inputs[1][0]._sym
+    assert trees[1]._rule._info() is grammar
+
+    summaries = parse_many(automaton, inputs, workers, SUMMARY)
+    assert list(summaries[0]) == [0, 0, 1, 0, 1, 0, 1, 0, 0]
+    assert list(summaries[6]) == [0, 6, 1, 0, 7, 0, 7, 0, 0]
+
+    values = parse_many(automaton, inputs, workers, VALUE, _actions)
+    assert values == [i * (i % 7 + 1) for i in range(40)]
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_parallel_errors(workers):
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    compiled = CompiledAutomaton(compute_automaton(grammar), True)
+    inputs = [ex.good_inputs[0][0]] + ex.bad_inputs
+
+    with pytest.raises(InputError):
+        parse_many(compiled, inputs, workers)
+    results = parse_many(compiled, inputs, workers, return_errors=True)
+    assert repr(results[0]) == "Sums0(Value3('(', int('0'), ')'), '+', Products0(Value0('+', int('1')), '*', id('a')))"
+    assert all(isinstance(r, InputError) for r in results[1:])
+    summaries = parse_many(compiled, inputs, workers, SUMMARY, return_errors=True)
+    assert [str(r) for r in summaries[1:]] == [str(r) for r in results[1:]]
+
+    # An input that stops before its $eof is an error in every mode.
+    truncated = [ex.good_inputs[0][0][:-1]]
+    for mode, actions in [(TREE, None), (SUMMARY, None), (VALUE, {})]:
+        with pytest.raises(InputError) as e:
+            parse_many(compiled, truncated, workers, mode, actions)
+        assert str(e.value) == 'got end of input; expected one of $eof, +, *, int, id, (, )'
+        [result] = parse_many(compiled, truncated, workers, mode, actions, return_errors=True)
+        assert str(result) == str(e.value)
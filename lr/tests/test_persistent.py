@@ -0,0 +1,85 @@
+import pytest
+
+from lr.error import InputError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.fallback import compute_automaton
+from lr.persistent import PersistentRuntime
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import input_split
+from .test_runtime import calc_actions
+
+
+def _check(grammar_and_inputs, unit_bypass=False):
+    grammar = grammar_and_inputs.grammar
+    compiled = CompiledAutomaton(compute_automaton(grammar), unit_bypass)
+
+    for input, output in grammar_and_inputs.good_inputs:
+        if unit_bypass:
+            reference = CompiledRuntime(compiled)
+            reference.feed_all(input)
+            output = repr(reference.get())
+        runtime = PersistentRuntime(compiled)
+        runtime.feed_all(input)
+        assert repr(runtime.get()) == output
+
+    for input in grammar_and_inputs.bad_inputs:
+        runtime = PersistentRuntime(compiled)
+        runtime.feed_all(input[:-1])
+        with pytest.raises(InputError):
+            runtime.feed(input[-1])
+
+@parm_tests(grammar_examples.lr0)
+def test_persistent_lr0(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+@parm_tests(grammar_examples.slr)
+def test_persistent_slr(grammar_and_inputs):
+    _check(grammar_and_inputs)
+
+@parm_tests(grammar_examples.slr)
+def test_persistent_unit_bypass(grammar_and_inputs):
+    _check(grammar_and_inputs, True)
+
+def test_persistent_fork():
+    ex = grammar_examples.lr0.ex_kern
+    grammar = ex.grammar
+    a_c_a = ex.good_inputs[0][0]
+
+    runtime = PersistentRuntime(CompiledAutomaton(compute_automaton(grammar)))
+    runtime.feed_all(a_c_a[:2])
+    assert repr(runtime) == '<PersistentRuntime in state #2/10 with 2 values>'
+    other = runtime.fork()
+    before = runtime.snapshot()
+
+    # A failed speculative token leaves the runtime as it was.
+    with pytest.raises(InputError):
+        runtime.feed(input_split(grammar, 'b', None)[0])
+    assert runtime.snapshot() is before
+
+    runtime.feed_all(a_c_a[2:])
+    assert repr(runtime.get()) == "S0('a', .'c', 'a')"
+    # The fork shares the prefix but is unaffected.
+    assert other.snapshot() is before
+    runtime.restore(before)
+    runtime.feed_all(a_c_a[2:])
+    assert repr(runtime.get()) == "S0('a', .'c', 'a')"
+
+def test_persistent_speculate():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    toks = input_split(grammar, '( int:2 ) + + int:3 * id:a', ':')
+    runtime = PersistentRuntime(CompiledAutomaton(compute_automaton(grammar)), calc_actions)
+
+    # Try both readings of every token; only the real one sticks.
+    wrong = input_split(grammar, ')', None)[0]
+    for tok in toks:
+        snapshot = runtime.snapshot()
+        try:
+            runtime.feed(wrong)
+        except InputError:
+            pass
+        runtime.restore(snapshot)
+        runtime.feed(tok)
+    assert runtime.get() == 23
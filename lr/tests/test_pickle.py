@@ -0,0 +1,192 @@
+import gc
+import multiprocessing
+import pickle
+import weakref
+
+import pytest
+
+from lr import grammar as grammar_mod
+from lr.error import InputError
+from lr.compiled import CompiledAutomaton
+from lr.fallback import compute_automaton
+from lr.incremental import IncrementalParser, IncrementalNonterminal
+from lr.repair import Repairer
+from lr.runtime import Runtime
+from lr.value import Nonterminal
+from lr import lr0
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import grammar_parse, input_split
+
+
+def _loads_elsewhere(data):
+    # As if unpickling in another process.
+    grammar_mod._registry.clear()
+    return pickle.loads(data)
+
+def _parse(automaton, toks):
+    runtime = Runtime(automaton)
+    runtime.feed_all(toks)
+    return runtime.get()
+
+def _walk(tree):
+    # repr() would recurse too deeply.
+    todo = [tree]
+    while todo:
+        value = todo.pop()
+        if isinstance(value, Nonterminal):
+            yield value._rule._number
+            todo.extend(value._children)
+        else:
+            yield (value._sym._number, value._text)
+
+def _check(grammar_and_inputs, compute):
+    grammar = grammar_and_inputs.grammar
+    automaton = compute(grammar)
+    clone = pickle.loads(pickle.dumps(automaton))
+    assert clone._grammar is grammar
+    assert [repr(s._actions) for s in clone._data] == [repr(s._actions) for s in automaton._data]
+    assert [repr(s._gotos) for s in clone._data] == [repr(s._gotos) for s in automaton._data]
+    assert [repr(s._default) for s in clone._data] == [repr(s._default) for s in automaton._data]
+    for input, output in grammar_and_inputs.good_inputs:
+        assert repr(_parse(clone, input)) == output
+    for input in grammar_and_inputs.bad_inputs:
+        runtime = Runtime(clone)
+        with pytest.raises(InputError):
+            runtime.feed_all(input)
+            runtime.get()
+    return automaton, clone
+
+@parm_tests(grammar_examples.lr0)
+def test_pickle_lr0(grammar_and_inputs):
+    automaton, clone = _check(grammar_and_inputs, lr0.compute_automaton)
+    # The item sets come back as they were.
+    assert [repr(s) for s in clone._data] == [repr(s) for s in automaton._data]
+
+@parm_tests(grammar_examples.slr)
+def test_pickle_slr(grammar_and_inputs):
+    _check(grammar_and_inputs, compute_automaton)
+
+def test_pickle_grammar():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    assert pickle.loads(pickle.dumps(grammar)) is grammar
+    assert pickle.loads(pickle.dumps(grammar._data[3]._id)) is grammar._data[3]._id
+
+    data = pickle.dumps(grammar)
+    clone = _loads_elsewhere(data)
+    assert clone is not grammar
+    assert repr(clone) == repr(grammar)
+    assert pickle.loads(data) is clone
+    # In the same process, the one last pickled is given back.
+    assert pickle.loads(pickle.dumps(grammar)) is grammar
+
+    # A lone Terminal keeps working, though nothing else holds its symbol.
+    tok = _loads_elsewhere(pickle.dumps(ex.good_inputs[0][0][0]))
+    del clone
+    gc.collect()
+    assert repr(tok) == "'('"
+    assert tok._sym._info()._data[tok._sym._number]._id is tok._sym
+
+    # ... but only for as long as something uses it.
+    symbols = weakref.ref(tok._sym._info())
+    del tok
+    gc.collect()
+    assert symbols() is None
+    automaton = _loads_elsewhere(pickle.dumps(compute_automaton(grammar)))
+    runtime = Runtime(automaton)
+    state = pickle.loads(pickle.dumps(runtime._state_stack[0]))
+    grammar_ref = weakref.ref(automaton._grammar)
+    del automaton, runtime
+    gc.collect()
+    assert grammar_ref() is not None
+    assert repr(state._data()).startswith('<StateData #0 ')
+    del state
+    gc.collect()
+    assert grammar_ref() is None
+
+def test_pickle_conflicts():
+    grammar = grammar_examples.ambiguous.evil1_grammar
+    automaton = compute_automaton(grammar, keep_conflicts=True)
+    clone = _loads_elsewhere(pickle.dumps(automaton))
+    assert clone._grammar is not grammar
+    assert [repr(s._conflicts) for s in clone._data] == [repr(s._conflicts) for s in automaton._data]
+    assert any(s._conflicts for s in clone._data)
+    assert clone.expected_bits() == automaton.expected_bits()
+
+    # Shifts in conflicts, and states without item sets.
+    grammar = grammar_parse("E: E '+' E;\nE: x;")
+    automaton = compute_automaton(grammar, keep_conflicts=True)
+    for state in automaton._data[1:]:
+        state._creator = None
+    clone = pickle.loads(pickle.dumps(automaton))
+    assert [repr(s._conflicts) for s in clone._data] == [repr(s._conflicts) for s in automaton._data]
+    assert "Shift(<state " in repr([s._conflicts for s in clone._data])
+    assert clone._data[1]._creator is None
+    assert clone._data[0]._creator._prev_states == []
+
+def test_pickle_repair():
+    ex = grammar_examples.slr.example
+    automaton = pickle.loads(pickle.dumps(compute_automaton(ex.grammar)))
+    toks = input_split(ex.grammar, '( int:2 + ', ':')
+    repairer = Repairer(automaton)
+    assert repr(repairer.parse(toks)) == repr(Repairer(compute_automaton(ex.grammar)).parse(toks))
+
+def test_pickle_tree():
+    grammar = grammar_parse('''
+        Lines: Lines Line;
+        Lines: Line;
+        Line: Words nl;
+        Words: Words word;
+        Words: word;
+    ''')
+    automaton = compute_automaton(grammar)
+    toks = input_split(grammar, ' '.join(['word:a word:b nl:.'] * 10000), ':')
+    tree = _parse(automaton, toks)
+
+    # Deep trees do not hit the recursion limit, and cost a few bytes a node.
+    data = pickle.dumps(tree)
+    assert len(data) < 20 * len(toks)
+    clone = _loads_elsewhere(data)
+    assert list(_walk(clone)) == list(_walk(tree))
+    assert clone._rule._info() is not grammar
+    assert repr(clone._rule._info()) == repr(grammar)
+
+    # The results of semantic actions are pickled as they are.
+    runtime = Runtime(automaton, {3: lambda words, nl: len(words._children)})
+    runtime.feed_all(input_split(grammar, 'word:a word:b nl:. word:c nl:.', ':'))
+    tree = runtime.get()
+    assert repr(tree) == 'Lines0(.2, 1)'
+    assert repr(pickle.loads(pickle.dumps(tree))) == 'Lines0(.2, 1)'
+
+def test_pickle_incremental():
+    ex = grammar_examples.slr.example
+    parser = IncrementalParser(CompiledAutomaton(compute_automaton(ex.grammar)))
+    toks = input_split(ex.grammar, ' + '.join(['( int:1 * id:a )'] * 1000), ':')
+    tree = parser.parse(toks)
+
+    clone = _loads_elsewhere(pickle.dumps(tree))
+    assert list(_walk(clone)) == list(_walk(tree))
+    nodes = [tree, clone]
+    while isinstance(nodes[0], IncrementalNonterminal):
+        assert type(nodes[1]) is IncrementalNonterminal
+        assert (nodes[1]._state, nodes[1]._num_tokens) == (nodes[0]._state, nodes[0]._num_tokens)
+        nodes = [nodes[0]._children[-1], nodes[1]._children[-1]]
+
+    # The clone can be reparsed like the original.
+    new_toks = input_split(ex.grammar, 'id:b', ':')[:-1]
+    expected = parser.reparse(tree, 3, 4, new_toks)
+    assert list(_walk(parser.reparse(clone, 3, 4, new_toks))) == list(_walk(expected))
+
+def _worker(automaton, toks):
+    return _parse(automaton, toks)
+
+def test_pickle_process_pool():
+    ex = grammar_examples.slr.example
+    automaton = compute_automaton(ex.grammar)
+    # A fresh interpreter, not a fork that already has the grammar.
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        trees = pool.starmap(_worker, [(automaton, input) for input, output in ex.good_inputs])
+    assert [repr(t) for t in trees] == [output for input, output in ex.good_inputs]
+    assert trees[0]._rule._info() is ex.grammar
@@ -0,0 +1,85 @@
+import pytest
+
+from lr.error import InputError
+from lr.fallback import compute_automaton
+from lr.repair import Repairer, INSERT, DELETE, REPLACE
+from lr.value import Terminal
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import input_split
+from .test_runtime import calc_actions
+
+
+def _edits(edits):
+    return [(kind, pos, old and repr(old), new and repr(new)) for kind, pos, old, new in edits]
+
+@parm_tests(grammar_examples.slr)
+def test_repair_slr(grammar_and_inputs):
+    grammar = grammar_and_inputs.grammar
+    repairer = Repairer(compute_automaton(grammar))
+
+    for input, output in grammar_and_inputs.good_inputs:
+        value, edits = repairer.parse(input)
+        assert repr(value) == output
+        assert edits == []
+
+    # Anything can be repaired, if only by deleting everything and then
+    # inserting the shortest sentence.
+    eof = Terminal(grammar._symbols.get('$eof', True), '')
+    for input in grammar_and_inputs.bad_inputs:
+        if input[-1]._sym is not eof._sym:
+            input = input + [eof]
+        value, edits = repairer.parse(input)
+        assert edits
+
+def test_repair_edits():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    repairer = Repairer(compute_automaton(grammar))
+    assert repr(repairer) == '<Repairer for <CompiledAutomaton with 16 states, 7 terminals, 9 rules>>'
+
+    def repair(source):
+        value, edits = repairer.parse(input_split(grammar, source, ':'))
+        return repr(value), _edits(edits)
+
+    assert repair('int:1 + * int:2') == ("Sums0(...int('1'), '+', ..int('2'))", [(DELETE, 2, "'*'", None)])
+    assert repair('* int:1 )') == ("..Value3('(', ...int('1'), ')')", [(REPLACE, 0, "'*'", "'('")])
+    assert repair('( ( int:1 + int:2') == ("..Value3('(', ..Value3('(', Sums0(...int('1'), '+', ..int('2')), ')'), ')')", [(INSERT, 5, None, "')'"), (INSERT, 5, None, "')'")])
+    assert repair('int:1 + + ) * id:a') == ("Sums0(...int('1'), '+', Products0(.Value0('+', .'int'), '*', .id('a')))", [(REPLACE, 3, "')'", "'int'")])
+    # Errors far apart are repaired separately.
+    value, edits = repair(' + '.join(['int:1 * ( id:a )'] * 20 + ['int:2 ) * id:b'] + ['int:3'] * 20 + ['* * id:c']))
+    assert edits == [(DELETE, 121, "')'", None), (REPLACE, 165, "'*'", "'int'")]
+
+def test_repair_make_token():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    made = []
+
+    def make_token(sym):
+        tok = Terminal(sym, {'int': '0', 'id': 'a'}.get(sym._data()._name, sym._data()._name))
+        made.append(tok)
+        return tok
+
+    repairer = Repairer(compute_automaton(grammar), calc_actions, make_token)
+    value, edits = repairer.parse(input_split(grammar, 'int:2 * ( int:3 + id:a', ':'))
+    assert value == 20
+    assert _edits(edits) == [(INSERT, 6, None, "')'")]
+    assert edits[0][3] in made
+
+def test_repair_limits():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    toks = input_split(grammar, 'int:1 ) ) ) ) int:2', ':')
+
+    repairer = Repairer(compute_automaton(grammar), max_cost=3)
+    with pytest.raises(InputError):
+        repairer.parse(toks)
+    repairer = Repairer(compute_automaton(grammar), max_cost=4)
+    value, edits = repairer.parse(toks)
+    assert len(edits) == 4
+
+    repairer = Repairer(compute_automaton(grammar), max_nodes=1)
+    with pytest.raises(InputError) as e:
+        repairer.parse(toks)
+    assert str(e.value) == 'got ); expected one of $eof, +'
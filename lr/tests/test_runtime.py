@@ -0,0 +1,112 @@
+import pytest
+
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.error import InputError
+from lr.glr import GlrRuntime
+from lr.runtime import Runtime
+from lr.slr import compute_automaton
+from lr.value import Nonterminal
+from lr import fallback, lr0, slr
+
+from . import grammar_examples
+from .grammar_examples import input_split, grammar_parse
+
+
+calc_actions = {
+        1: lambda a, op, b: a + b,
+        2: lambda a: a,
+        3: lambda a, op, b: a * b,
+        4: lambda a: a,
+        5: lambda op, a: +a,
+        6: lambda tok: int(tok._text),
+        7: lambda tok: {'a': 7}[tok._text],
+        8: lambda open, a, close: a,
+}
+
+def test_runtime_actions():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    automaton = compute_automaton(grammar)
+    toks = input_split(grammar, '( int:2 ) + + int:3 * id:a * ( int:1 + int:1 )', ':')
+
+    runtime = Runtime(automaton, calc_actions)
+    runtime.feed_all(toks)
+    assert runtime.get() == 44
+
+    runtime = Runtime(automaton, calc_actions)
+    for tok in toks:
+        runtime.feed(tok)
+    assert runtime.get() == 44
+
+def test_runtime_actions_partial():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    automaton = compute_automaton(grammar)
+    toks = input_split(grammar, 'int:2 * int:3', ':')
+
+    runtime = Runtime(automaton, {6: lambda tok: int(tok._text)})
+    runtime.feed_all(toks)
+    tree = runtime.get()
+    assert isinstance(tree, Nonterminal)
+    assert repr(tree) == ".Products0(.2, '*', 3)"
+
+stmts_grammar = grammar_parse('''
+    Stmts: Stmts Stmt;
+    Stmts: Stmt;
+    Stmt: x ';';
+    Stmt: x '=' x ';';
+    Stmt: error ';';
+''')
+
+nested_grammar = grammar_parse('''
+    S: '(' Items ')';
+    Items: Items x;
+    Items: error;
+''')
+
+def test_runtime_error_recovery():
+    grammar = stmts_grammar
+    for compute_automaton in [lr0.compute_automaton, slr.compute_automaton]:
+        automaton = compute_automaton(grammar)
+
+        runtime = Runtime(automaton)
+        runtime.feed_all(input_split(grammar, 'x ; x x = ; x = x ; = = ; x ;', None))
+        assert repr(runtime.get()) == "Stmts0(Stmts0(Stmts0(Stmts0(.Stmt0('x', ';'), Stmt2('error', ';')), Stmt1('x', '=', 'x', ';')), Stmt2('error', ';')), Stmt0('x', ';'))"
+        assert [str(e) for e in runtime.get_errors()] == ['got x; expected one of ;, =', 'got =; expected one of $eof, x, error']
+
+        # Errors less than 3 tokens apart are reported once.
+        runtime = Runtime(automaton)
+        for tok in input_split(grammar, 'x x ; = ; x ;', None):
+            runtime.feed(tok)
+        assert repr(runtime.get()) == "Stmts0(Stmts0(.Stmt2('error', ';'), Stmt2('error', ';')), Stmt0('x', ';'))"
+        assert len(runtime.get_errors()) == 1
+
+        runtime = Runtime(automaton)
+        with pytest.raises(InputError):
+            runtime.feed_all(input_split(grammar, 'x ; x', None))
+        assert len(runtime.get_errors()) == 1
+
+    # With no state below that can shift `error`, the error is raised.
+    for compute_automaton in [lr0.compute_automaton, slr.compute_automaton]:
+        runtime = Runtime(compute_automaton(nested_grammar))
+        with pytest.raises(InputError) as e:
+            runtime.feed_all(input_split(nested_grammar, ') x', None))
+        assert str(e.value) == "got ); expected one of ("
+        assert runtime.get_errors() == [e.value]
+
+def test_runtime_empty_rule():
+    # The deterministic runtimes refuse empty rules (see test_glr for the
+    # GLR runtime, which supports them).
+    grammar = grammar_parse('''
+        A: A x;
+        A: ;
+    ''')
+    automaton = fallback.compute_automaton(grammar)
+    toks = input_split(grammar, 'x x', None)
+    for feed in ['feed', 'feed_all']:
+        runtime = Runtime(automaton)
+        with pytest.raises(AssertionError):
+            getattr(runtime, feed)(toks if feed == 'feed_all' else toks[0])
+    compiled = CompiledAutomaton(automaton)
+    with pytest.raises(AssertionError):
+        CompiledRuntime(compiled)
@@ -77,7 +77,7 @@ def test_slr_repr_automaton():
   <slr.ItemSet #0, kernel 1/2, ← () [initial]
   * < $accept → • Root $eof >
   + < Root → • term >
->>, <StateData #1 with 1 actions, 0 gotos
+>>, <StateData #1 with 0 actions, 0 gotos
   <slr.ItemSet #1, kernel 1/1, ← (0)
   * < Root → term • >
 >>, <StateData #2 with 1 actions, 0 gotos
@@ -96,7 +96,7 @@ def test_slr_repr_automaton():
 >>>
 '''.strip().replace('•', _mdot)
     assert repr(next(iter(automaton._data[0]._actions.values()))) == 'Shift(<state 1>)'
-    assert repr(next(iter(automaton._data[1]._actions.values()))) == 'Reduce(<rule 1>)'
+    assert repr(automaton._data[1]._default) == 'Reduce(<rule 1>)'
     assert repr(next(iter(automaton._data[0]._gotos.values()))) == 'Goto(<state 2>)'
 
 def test_slr_repr_runtime():
@@ -112,3 +112,13 @@ def test_slr_repr_runtime():
     runtime.feed(input[1])
     # Goes to state 2 internally
     assert repr(runtime) == '<Runtime in state #3/4 with 2 values>'
+
+def test_slr_default_reductions():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+
+    automaton = compute_automaton(grammar)
+    defaults = [s for s in automaton._data if s._default is not None]
+    assert len(defaults) == 6
+    assert all(not s._actions for s in defaults)
+    assert sum(len(s._actions) for s in automaton._data) == 32
@@ -0,0 +1,163 @@
+import itertools
+
+import pytest
+
+from lr.error import AmbiguityError, InputError
+from lr.compiled import CompiledAutomaton
+from lr import fallback, lr0
+from lr.glr import GlrRuntime
+from lr.sppf import SppfRuntime, SymbolNode, count_trees, is_ambiguous, iter_trees, disambiguate, collapse
+
+from ._util import parm_tests
+from . import grammar_examples
+from .grammar_examples import grammar_parse, input_split
+
+
+def _forest(compiled, toks):
+    runtime = SppfRuntime(compiled)
+    runtime.feed_all(toks)
+    return runtime.get()
+
+def _count_nodes(node, seen):
+    if not isinstance(node, SymbolNode) or id(node) in seen:
+        return
+    seen.add(id(node))
+    for family in node._families:
+        for child in family._children:
+            _count_nodes(child, seen)
+
+@parm_tests(grammar_examples.slr)
+def test_sppf_slr(grammar_and_inputs):
+    grammar = grammar_and_inputs.grammar
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+
+    for input, output in grammar_and_inputs.good_inputs:
+        forest = _forest(compiled, input)
+        assert repr(forest) == output
+        assert not is_ambiguous(forest)
+        assert repr(collapse(forest)) == output
+        assert [repr(t) for t in iter_trees(forest)] == [output]
+
+    for input in grammar_and_inputs.bad_inputs:
+        runtime = SppfRuntime(compiled)
+        runtime.feed_all(input[:-1])
+        with pytest.raises(InputError):
+            runtime.feed(input[-1])
+
+def test_sppf_ambiguous():
+    grammar = grammar_examples.ambiguous.evil2_grammar
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+    toks = input_split(grammar, 'Val + Val + Val * Val * Val', None)
+
+    runtime = SppfRuntime(compiled)
+    runtime.feed_all(toks[:3])
+    assert repr(runtime) == '<SppfRuntime in states #1>'
+    forest = _forest(compiled, toks)
+    assert count_trees(forest) == 6
+    runtime = GlrRuntime(compiled)
+    runtime.feed_all(toks)
+    expected = sorted(repr(v) for v in runtime.get_all())
+    assert sorted(repr(t) for t in iter_trees(forest)) == expected
+    with pytest.raises(AmbiguityError) as e:
+        collapse(forest)
+    assert str(e.value) == '6 parses'
+
+    forest = _forest(compiled, input_split(grammar, 'Val + Val * Val', None))
+    assert repr(forest) == "{Expr0(Expr1('Val', '+', .'Val'), '*', 'Val') | Expr1('Val', '+', Expr0(.'Val', '*', 'Val'))}"
+
+def test_sppf_shared():
+    grammar = grammar_examples.ambiguous.evil2_grammar
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+    n = 20
+    toks = input_split(grammar, ' '.join(['Val +'] * n + ['Val'] + ['* Val'] * n), None)
+
+    forest = _forest(compiled, toks)
+    # C(40, 20) trees, but only a quadratic number of nodes.
+    assert count_trees(forest) == 137846528820
+    seen = set()
+    _count_nodes(forest, seen)
+    assert len(seen) <= 2 * (2 * n + 1) ** 2
+    first = next(iter_trees(forest))
+    assert not isinstance(first, SymbolNode)
+
+def test_sppf_disambiguate():
+    grammar = grammar_examples.ambiguous.evil2_grammar
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+    toks = input_split(grammar, 'Val + Val + Val * Val * Val', None)
+    calls = []
+
+    # Make `*` bind tighter: prefer taking a `+` off the front.
+    def prefer_plus(node):
+        calls.append(node)
+        return [f for f in node._families if f._rule._number == 2]
+
+    forest = disambiguate(_forest(compiled, toks), prefer_plus)
+    assert repr(collapse(forest)) == "Expr1('Val', '+', Expr1('Val', '+', Expr0(Expr0(.'Val', '*', 'Val'), '*', 'Val')))"
+    assert len(calls) == len(set(id(c) for c in calls))
+
+    num_calls = len(calls)
+    forest = _forest(compiled, input_split(grammar, 'Val', None))
+    assert disambiguate(forest, prefer_plus) is forest
+    assert len(calls) == num_calls
+
+    grammar = grammar_examples.ambiguous.evil1_grammar
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+    forest = _forest(compiled, input_split(grammar, 'term', None))
+    assert len(forest._families) == 2
+    forest = disambiguate(forest, lambda node: node._families[:1])
+    assert repr(collapse(forest)) == "..'term'"
+
+def test_sppf_deep():
+    grammar = grammar_parse('''
+        Items: Item Items;
+        Items: Item;
+        Item: x;
+        Item: x x;
+    ''')
+    compiled = CompiledAutomaton(fallback.compute_automaton(grammar, keep_conflicts=True))
+
+    # Nothing here recurses on the depth of the forest.
+    forest = _forest(compiled, input_split(grammar, ' '.join(['x'] * 3000), None))
+    # Splits of 3000 into ones and twos.
+    a, b = 1, 1
+    for i in range(3000):
+        a, b = b, a + b
+    assert count_trees(forest) == a
+    first, second = itertools.islice(iter_trees(forest), 2)
+    assert first is not second
+    forest = disambiguate(forest, lambda node: node._families[:1])
+    assert not is_ambiguous(forest)
+    items = collapse(forest)
+    num_toks = len(items._children[0]._children)
+    while len(items._children) == 2:
+        items = items._children[1]
+        num_toks += len(items._children[0]._children)
+    assert num_toks == 3000
+
+    # A terminal is a tree of its own.
+    tok = input_split(grammar, 'x', None)[0]
+    assert count_trees(tok) == 1
+    assert list(iter_trees(tok)) == [tok]
+    assert collapse(tok) is tok
+
+def test_sppf_empty_rules():
+    grammar = grammar_parse('''
+        S: E E E x;
+        S: F x;
+        E: ;
+        F: ;
+        F: E E;
+    ''')
+    compiled = CompiledAutomaton(lr0.compute_automaton(grammar, keep_conflicts=True))
+    forest = _forest(compiled, input_split(grammar, 'x', None))
+    assert count_trees(forest) == 3
+    assert [repr(t) for t in iter_trees(forest)] == ["S0(E0(), E0(), E0(), 'x')", "S1(F0(), 'x')", "S1(F1(E0(), E0()), 'x')"]
+
+    # Subtrees shared within a tree stay shared.
+    forest = disambiguate(forest, lambda node: node._families[:1])
+    [family] = forest._families
+    e = family._children[0]
+    family._children[1:3] = [e, e]
+    tree = collapse(forest)
+    assert repr(tree) == "S0(E0(), E0(), E0(), 'x')"
+    assert tree._children[0] is tree._children[1] is tree._children[2]
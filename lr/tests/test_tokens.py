@@ -0,0 +1,82 @@
+from array import array
+import re
+
+import pytest
+
+from lr.error import InputError
+from lr.compiled import CompiledAutomaton, CompiledRuntime
+from lr.fallback import compute_automaton
+from lr.flat import FlatRuntime
+from lr.tokens import TokenArrays
+
+from . import grammar_examples
+from .grammar_examples import input_split
+
+
+_token_re = re.compile(br'\s*(?:(?P<int>[0-9]+)|(?P<id>[a-z]+)|(?P<op>[+*()]))')
+
+def _lex(symbols, source):
+    numbers = {name: symbols.get(name, True)._number for name in ['int', 'id', "'+'", "'*'", "'('", "')'"]}
+    for m in _token_re.finditer(source):
+        kind = m.lastgroup
+        if kind == 'op':
+            yield numbers[repr(m.group('op').decode())], m.start(kind), m.end(kind)
+        else:
+            yield numbers[kind], m.start(kind), m.end(kind)
+
+def test_token_arrays():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    symbols = grammar._symbols
+    compiled = CompiledAutomaton(compute_automaton(grammar))
+    source = b'(0) + +1 * a'
+    tokens = TokenArrays.from_matches(symbols, source, _lex(symbols, source))
+    assert repr(tokens) == '<TokenArrays with 9 tokens>'
+    assert list(tokens._syms) == [t._sym._number for t in ex.good_inputs[0][0]]
+    assert repr(tokens[1]) == "int('0')"
+    assert repr(tokens[8]) == "'$eof'"
+
+    expected = ex.good_inputs[0][1]
+    runtime = CompiledRuntime(compiled)
+    runtime.feed_all(tokens)
+    assert repr(runtime.get()) == expected
+
+    runtime = FlatRuntime(compiled)
+    runtime.feed_arrays(tokens)
+    tree = runtime.get()
+    assert tree._tokens is tokens
+    root = tree.root()
+    assert repr(root) == expected
+    assert root._source_span() == (0, 12)
+    assert root._children[2]._source_span() == (6, 12)
+    assert source[slice(*root._children[0]._source_span())] == b'(0)'
+
+def test_token_arrays_buffers():
+    ex = grammar_examples.slr.example
+    grammar = ex.grammar
+    symbols = grammar._symbols
+    compiled = CompiledAutomaton(compute_automaton(grammar), unit_bypass=True)
+    toks = input_split(grammar, '( int:0 ) + + int:1 * id:ä', ':')
+
+    # Any int-indexable buffers will do, e.g. one block cast three ways.
+    source = '(0) + +1 * ä'.encode('utf-8')
+    syms = [t._sym._number for t in toks]
+    starts = [0, 1, 2, 4, 6, 7, 9, 11, 13]
+    ends = [1, 2, 3, 5, 7, 8, 10, 13, 13]
+    n = len(syms)
+    view = memoryview(array('i', syms + starts + ends).tobytes()).cast('i')
+    tokens = TokenArrays(symbols, view[:n], view[n:2 * n], view[2 * n:], source)
+    assert [repr(t) for t in tokens] == [repr(t) for t in toks]
+
+    expected = CompiledRuntime(compiled)
+    expected.feed_all(toks)
+    runtime = FlatRuntime(compiled)
+    runtime.feed_arrays(tokens)
+    root = runtime.get().root()
+    assert repr(root) == repr(expected.get())
+    assert root._children[2]._source_span() == (6, 13)
+
+    int_sym = symbols.get('int', True)._number
+    runtime = FlatRuntime(compiled)
+    with pytest.raises(InputError):
+        runtime.feed_arrays(TokenArrays(symbols, array('i', [int_sym, int_sym]), array('i', [0, 2]), array('i', [1, 3]), '1 2'))
@@ -0,0 +1,89 @@
+from array import array
+
+from .value import Terminal
+
+
+# Tokens as parallel buffers instead of a Terminal each: terminal numbers,
+# and start/end offsets into `source` (a str, bytes or memoryview). The
+# buffers are used as given, so anything that indexes to ints works: an
+# array, a memoryview.cast('i'), or a NumPy array from a vectorized lexer.
+#
+# Indexing makes the Terminal for that one token (decoding bytes with
+# `encoding`), so a TokenArrays can be passed anywhere a list of tokens
+# is; FlatRuntime.feed_arrays reads the numbers directly and never makes
+# a Terminal at all.
+#
+# spans() instead makes SpanTerminals, which keep the offsets and only
+# slice `source` when their text is asked for; for a large mmap that keeps
+# tokens from holding copies of it.
+#
+# As with lists of tokens, the last one should be $eof (terminal 0).
+
+def _slice(source, start, end, encoding):
+    text = source[start:end]
+    if not isinstance(text, str):
+        text = bytes(text).decode(encoding)
+    return text
+
+class TokenArrays:
+    __slots__ = ('_symbols', '_syms', '_starts', '_ends', '_source', '_encoding')
+
+    def __init__(self, symbols, syms, starts, ends, source, encoding='utf-8'):
+        assert len(syms) == len(starts) == len(ends)
+        self._symbols = symbols
+        self._syms = syms
+        self._starts = starts
+        self._ends = ends
+        self._source = source
+        self._encoding = encoding
+
+    @staticmethod
+    def from_matches(symbols, source, matches, encoding='utf-8'):
+        # `matches` yields (terminal number, start, end), e.g. from a loop
+        # over re.finditer; $eof is added at the end of the source.
+        syms = array('i')
+        starts = array('i')
+        ends = array('i')
+        for sym, start, end in matches:
+            syms.append(sym)
+            starts.append(start)
+            ends.append(end)
+        syms.append(0)
+        starts.append(len(source))
+        ends.append(len(source))
+        return TokenArrays(symbols, syms, starts, ends, source, encoding)
+
+    def __repr__(self):
+        return '<TokenArrays with %d tokens>' % len(self._syms)
+
+    def __len__(self):
+        return len(self._syms)
+
+    def __getitem__(self, i):
+        return Terminal(self._symbols._data[self._syms[i]]._id, self._text(i))
+
+    def __iter__(self):
+        for i in range(len(self._syms)):
+            yield self[i]
+
+    def spans(self):
+        data = self._symbols._data
+        for i in range(len(self._syms)):
+            yield SpanTerminal(data[self._syms[i]]._id, self._source, self._starts[i], self._ends[i], self._encoding)
+
+    def _text(self, i):
+        return _slice(self._source, self._starts[i], self._ends[i], self._encoding)
+
+class SpanTerminal(Terminal):
+    __slots__ = ('_source', '_start', '_end', '_encoding')
+
+    def __init__(self, sym, source, start, end, encoding='utf-8'):
+        self._sym = sym
+        self._source = source
+        self._start = start
+        self._end = end
+        self._encoding = encoding
+
+    @property
+    def _text(self):
+        return _slice(self._source, self._start, self._end, self._encoding)
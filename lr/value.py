@@ -1,6 +1,67 @@
+from array import array
+
 from .grammar import SymbolId, RuleId
 
 
+# A Nonterminal pickles as its whole tree, flattened in postorder into an
+# array of codes, so deep trees do not hit the recursion limit and each
+# node costs a few bytes:
+#   >= 0: a Terminal of that symbol; its text is the next object
+#   -1: anything else (e.g. the result of a semantic action), the next object
+#   <= -2: a Nonterminal of rule -2 - code, over the next count of children
+# A count below 0 is -1 - count for a subclass of Nonterminal (such as
+# lr.incremental's), and the next object is its class and the values of
+# its own slots.
+# A Terminal pickles as its symbol and text, so a SpanTerminal becomes a
+# plain Terminal rather than pickling its source buffer.
+
+# key: subclass of Nonterminal, value: the slots it adds
+_extra_slots = {}
+
+def _get_extra_slots(cls):
+    try:
+        return _extra_slots[cls]
+    except KeyError:
+        rv = []
+        for c in cls.__mro__:
+            if c is Nonterminal:
+                break
+            rv.extend(c.__dict__.get('__slots__', ()))
+        _extra_slots[cls] = rv
+        return rv
+
+def _unpickle_tree(grammar, codes, counts, objects):
+    symbol_ids = [d._id for d in grammar._symbols._data]
+    rules = grammar._data
+    objects = iter(objects)
+    counts = iter(counts)
+    stack = []
+    for code in codes:
+        if code >= 0:
+            stack.append(Terminal(symbol_ids[code], next(objects)))
+        elif code == -1:
+            stack.append(next(objects))
+        else:
+            rule = rules[-2 - code]
+            n = next(counts)
+            if n >= 0:
+                children = stack[len(stack) - n:]
+                del stack[len(stack) - n:]
+                stack.append(Nonterminal(rule._id, children, rule._lhs))
+                continue
+            n = -1 - n
+            children = stack[len(stack) - n:]
+            del stack[len(stack) - n:]
+            cls, extra = next(objects)
+            node = cls.__new__(cls)
+            Nonterminal.__init__(node, rule._id, children, rule._lhs)
+            for name, value in zip(_get_extra_slots(cls), extra):
+                setattr(node, name, value)
+            stack.append(node)
+    [rv] = stack
+    return rv
+
+
 class Value:
     __slots__ = ('_sym',)
 
@@ -11,6 +72,9 @@ class Terminal(Value):
         self._sym = sym
         self._text = text
 
+    def __reduce__(self):
+        return (Terminal, (self._sym, self._text))
+
     def __repr__(self):
         sym = self._sym._data()._name
         text = self._text
@@ -21,11 +85,43 @@ class Terminal(Value):
 class Nonterminal(Value):
     __slots__ = ('_rule', '_children')
 
-    def __init__(self, rule, children):
-        self._sym = rule._data()._lhs
+    def __init__(self, rule, children, sym=None):
+        # Runtimes that already know the lhs pass it to skip the lookup.
+        if sym is None:
+            sym = rule._data()._lhs
+        self._sym = sym
         self._rule = rule
         self._children = children
 
+    def __reduce__(self):
+        grammar = self._rule._info()
+        symbols = grammar._symbols
+        codes = array('i')
+        counts = array('i')
+        objects = []
+        # (value, whether its children are done)
+        todo = [(self, False)]
+        while todo:
+            value, done = todo.pop()
+            if done:
+                codes.append(-2 - value._rule._number)
+                cls = value.__class__
+                if cls is Nonterminal:
+                    counts.append(len(value._children))
+                else:
+                    counts.append(-1 - len(value._children))
+                    objects.append((cls, [getattr(value, name) for name in _get_extra_slots(cls)]))
+            elif isinstance(value, Nonterminal) and value._rule._info() is grammar:
+                todo.append((value, True))
+                todo.extend([(child, False) for child in reversed(value._children)])
+            elif isinstance(value, Terminal) and value._sym._info() is symbols:
+                codes.append(value._sym._number)
+                objects.append(value._text)
+            else:
+                codes.append(-1)
+                objects.append(value)
+        return (_unpickle_tree, (grammar, codes, counts, objects))
+
     def __repr__(self):
         if len(self._children) == 1:
             return '.%r' % (self._children[0],)